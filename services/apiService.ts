@@ -68,6 +68,63 @@ export const api = {
     return response.json();
   },
 
+  /**
+   * Filter several diseases in one request (column-oriented response)
+   */
+  async filterDiseases(params: {
+    diseases?: string[];
+    year?: number;
+    demographics?: Record<string, string>;
+  }) {
+    const response = await fetch(`${getApiBaseUrl()}/filter/diseases`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(params),
+    });
+
+    if (!response.ok) {
+      throw new Error(`Filter API error: ${response.statusText}`);
+    }
+
+    return response.json();
+  },
+
+  /**
+   * Per-state trends over every year (column-oriented response with
+   * year-over-year change, rolling mean and slope)
+   */
+  async trends(params: {
+    disease: string;
+    demographics?: Record<string, string>;
+    window?: number;
+  }) {
+    const response = await fetch(`${getApiBaseUrl()}/trends`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(params),
+    });
+
+    if (!response.ok) {
+      throw new Error(`Trends API error: ${response.statusText}`);
+    }
+
+    return response.json();
+  },
+
+  /**
+   * Disparity metrics for every year and demographic slice (column-oriented response)
+   */
+  async disparities(params: { disease?: string } = {}) {
+    const query = params.disease ? `?disease=${encodeURIComponent(params.disease)}` : '';
+    const response = await fetch(`${getApiBaseUrl()}/disparities${query}`);
+
+    if (!response.ok) {
+      throw new Error(`Disparities API error: ${response.statusText}`);
+    }
+
+    return response.json();
+  },
+
   /**
    * Mine patterns using association rules (ML-only)
    */
@@ -0,0 +1,104 @@
+"""
+Response compression middleware.
+Compresses response bodies with the best encoding both sides support (zstd, then brotli, then gzip),
+as negotiated from the request's `Accept-Encoding` header. gzip comes from the standard library;
+zstd and brotli are used only when the `zstandard`/`brotli` packages are installed.
+"""
+import gzip
+from typing import Callable, Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+def _compressors(gzip_level: int, zstd_level: int, brotli_quality: int) -> Dict[str, Callable[[bytes], bytes]]:
+    """Available encoders in order of preference."""
+    encoders = {}
+    if ZSTD_AVAILABLE:
+        encoders['zstd'] = zstandard.ZstdCompressor(level=zstd_level).compress
+    if BROTLI_AVAILABLE:
+        encoders['br'] = lambda body: brotli.compress(body, quality=brotli_quality)
+    encoders['gzip'] = lambda body: gzip.compress(body, compresslevel=gzip_level)
+    return encoders
+
+
+def choose_encoding(accept_encoding: Optional[str], available) -> Optional[str]:
+    """First encoding from `available` (in preference order) the client accepts with q > 0."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for entry in accept_encoding.split(','):
+        name, *params = [part.strip() for part in entry.split(';')]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.lower()] = q
+    for encoding in available:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete responses of at least `minimum_size` bytes.
+    The body is buffered before compressing, so it is meant for the API's non-streaming responses;
+    responses that already carry a Content-Encoding are passed through unchanged.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, zstd_level: int = 3,
+                 brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders = _compressors(gzip_level, zstd_level, brotli_quality)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding'), list(self.encoders))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        chunks = []
+
+        async def send_compressed(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                start = message
+                return
+            if message['type'] != 'http.response.body':
+                await send(message)
+                return
+            chunks.append(message.get('body', b''))
+            if message.get('more_body', False):
+                return
+
+            body = b''.join(chunks)
+            headers = MutableHeaders(raw=start['headers'])
+            if len(body) >= self.minimum_size and 'content-encoding' not in headers:
+                body = self.encoders[encoding](body)
+                headers['Content-Encoding'] = encoding
+                headers['Content-Length'] = str(len(body))
+                headers.add_vary_header('Accept-Encoding')
+            await send(start)
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, send_compressed)
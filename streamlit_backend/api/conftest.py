@@ -0,0 +1,62 @@
+"""
+Shared pytest fixtures for the backend test suite
+"""
+import numpy as np
+import pytest
+import pandas as pd
+
+from streamlit_backend.data_loader import DEFAULT_DATA_PATH
+from streamlit_backend.generate_synthetic import generate_dataset
+
+
+@pytest.fixture(scope='session', autouse=True)
+def synthetic_dataset():
+    """The API's dataset, generated like `generate_synthetic.py` does when it is not on disk"""
+    if not DEFAULT_DATA_PATH.exists():
+        generate_dataset(n=100000, seed=42, out_path=str(DEFAULT_DATA_PATH))
+    return DEFAULT_DATA_PATH
+
+
+@pytest.fixture
+def patient_frame():
+    """Small patient-level frame with two states, two years and mixed demographics"""
+    n = 40
+    return pd.DataFrame({
+        'patient_id': range(1, n + 1),
+        'state': ['CA', 'TX'] * (n // 2),
+        'year': [2022] * (n // 2) + [2023] * (n // 2),
+        'age_group': ['65+', '18-34', '50-64', '0-17'] * (n // 4),
+        'sex': ['Female', 'Male'] * (n // 2),
+        'race_ethnicity': ['White', 'Black', 'Hispanic', 'Asian'] * (n // 4),
+        'income_group': ['Low', 'Middle', 'High', 'Low'] * (n // 4),
+        'heart_disease': [1, 0, 0, 1] * (n // 4),
+        'diabetes': [0, 1, 0, 0] * (n // 4),
+        'cancer': [0, 0, 1, 0] * (n // 4),
+    })
+
+
+@pytest.fixture
+def csv_dataset(tmp_path, patient_frame):
+    """`patient_frame` written to a CSV file"""
+    path = tmp_path / 'synthetic_health.csv'
+    patient_frame.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def sparse_patients():
+    """Random patients spread thinly enough over the cube that many cells fall under 11"""
+    rng = np.random.default_rng(1)
+    n = 3000
+    return pd.DataFrame({
+        'patient_id': np.arange(n),
+        'state': rng.choice(['CA', 'NY', 'TX', 'WA'], n),
+        'year': rng.choice([2021, 2022, 2023], n),
+        'age_group': rng.choice(['0-17', '18-34', '65+'], n),
+        'sex': rng.choice(['Female', 'Male', 'Other'], n, p=[0.48, 0.48, 0.04]),
+        'race_ethnicity': rng.choice(['Black', 'White'], n),
+        'income_group': rng.choice(['Low', 'High'], n),
+        'heart_disease': rng.binomial(1, 0.3, n),
+        'diabetes': rng.binomial(1, 0.1, n),
+        'cancer': rng.binomial(1, 0.05, n),
+    })
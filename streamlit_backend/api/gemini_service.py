@@ -3,12 +3,21 @@ Google Gemini AI Service for XAM HEID
 Provides AI-driven healthcare insights with fallback to ML-only mode.
 """
 import os
+import asyncio
+import inspect
 import logging
+import weakref
+from functools import partial
 from typing import Optional, Dict, Any, List
 import pandas as pd
 from pathlib import Path
 from dotenv import load_dotenv
 
+try:
+    from streamlit_backend.api.response_cache import PromptResponseCache
+except ImportError:
+    from response_cache import PromptResponseCache
+
 # Load environment variables from .env file
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
@@ -29,6 +38,8 @@ class GeminiAIService:
     """
     Service class for Google Gemini AI integration.
     Implements fallback logic to ML-only mode if API is unavailable.
+    The async variants enforce a per-call deadline and cap in-flight requests, falling back to
+    ML-only answers when the deadline expires.
     """
     
     def __init__(self):
@@ -36,6 +47,12 @@ class GeminiAIService:
         self.api_key = os.getenv('GEMINI_API_KEY')
         self.model_name = os.getenv('GEMINI_MODEL', 'gemini-pro')
         self.fallback_enabled = os.getenv('FALLBACK_TO_ML', 'true').lower() == 'true'
+        self.timeout = float(os.getenv('GEMINI_TIMEOUT_SECONDS', '20'))
+        self.max_concurrency = int(os.getenv('GEMINI_MAX_CONCURRENCY', '8'))
+        # asyncio semaphores belong to one event loop; keep one per running loop
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        # Deterministic prompts -> reusable responses (memory LRU, optional SQLite tier)
+        self.response_cache = PromptResponseCache.from_env()
         self.model = None
         
         if self.enabled and GEMINI_AVAILABLE and self.api_key:
@@ -86,12 +103,12 @@ class GeminiAIService:
             prompt = self._build_insight_prompt(data_summary, disease, year, ml_patterns)
             
             # Generate response with timeout and error handling
-            response = self.model.generate_content(prompt)
+            text = self._generate_text(prompt)
             
-            if response.text:
+            if text:
                 return {
                     "source": "gemini_ai",
-                    "insights": response.text,
+                    "insights": text,
                     "ml_patterns": ml_patterns,
                     "data_summary": data_summary,
                     "success": True
@@ -138,13 +155,154 @@ class GeminiAIService:
             # Build context-aware prompt
             prompt = self._build_qa_prompt(query, context_data, disease, year)
             
-            response = self.model.generate_content(prompt)
+            text = self._generate_text(prompt)
+            
+            if text:
+                return text
+            else:
+                return self._ml_only_qa(query, context_data, disease, year)
+                
+        except Exception as e:
+            logger.error(f"Gemini QA error: {str(e)}")
+            if self.fallback_enabled:
+                return self._ml_only_qa(query, context_data, disease, year)
+            else:
+                return f"Error processing query: {str(e)}"
+    
+    def _generate_text(self, prompt: str) -> str:
+        """Response text for `prompt`, served from the response cache when the same prompt was seen."""
+        key = self.response_cache.fingerprint(self.model_name, prompt)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return cached
+        text = self.model.generate_content(prompt, request_options={'timeout': self.timeout}).text
+        if text:
+            self.response_cache.set(key, text)
+        return text
+
+    async def _generate_text_async(self, prompt: str) -> str:
+        """Async counterpart of `_generate_text`; disk-tier cache access runs off the event loop."""
+        key = self.response_cache.fingerprint(self.model_name, prompt)
+        cached = await self.response_cache.get_async(key)
+        if cached is not None:
+            return cached
+        text = (await self._generate_async(prompt)).text
+        if text:
+            await self.response_cache.set_async(key, text)
+        return text
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def _generate_async(self, prompt: str):
+        """Call Gemini without blocking the event loop, bounded by the semaphore and the deadline.
+        Uses the client's native async API when present, otherwise runs the sync call in an executor.
+        Raises asyncio.TimeoutError once `self.timeout` seconds have passed (including queueing).
+        A sync call that times out keeps its concurrency slot until its thread returns, so the cap bounds
+        the requests actually in flight upstream.
+        """
+        semaphore = self._semaphore()
+
+        def release(future):
+            semaphore.release()
+            if not future.cancelled():
+                # Retrieved so a call failing after its deadline is not logged as an unhandled error
+                future.exception()
+
+        async def call():
+            await semaphore.acquire()
+            native = getattr(self.model, 'generate_content_async', None)
+            if native is not None and inspect.iscoroutinefunction(native):
+                try:
+                    return await native(prompt, request_options={'timeout': self.timeout})
+                finally:
+                    semaphore.release()
+            loop = asyncio.get_running_loop()
+            call_sync = partial(self.model.generate_content, prompt, request_options={'timeout': self.timeout})
+            future = loop.run_in_executor(None, call_sync)
+            future.add_done_callback(release)
+            # Cancelling the wait (deadline) must not detach the slot from the still-running thread
+            return await asyncio.shield(future)
+
+        return await asyncio.wait_for(call(), timeout=self.timeout)
+
+    async def generate_health_insights_async(
+        self,
+        data_summary: Dict[str, Any],
+        disease: str,
+        year: Optional[int] = None,
+        ml_patterns: Optional[List[Dict]] = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of `generate_health_insights` with a per-call deadline.
+        Falls back to ML-only analysis when the deadline expires.
+        """
+        if not self.is_available():
+            logger.info("Gemini AI not available, using ML-only analysis")
+            return self._ml_only_analysis(data_summary, disease, year, ml_patterns)
+        
+        try:
+            prompt = self._build_insight_prompt(data_summary, disease, year, ml_patterns)
+            text = await self._generate_text_async(prompt)
+            
+            if text:
+                return {
+                    "source": "gemini_ai",
+                    "insights": text,
+                    "ml_patterns": ml_patterns,
+                    "data_summary": data_summary,
+                    "success": True
+                }
+            else:
+                logger.warning("Empty response from Gemini AI, falling back to ML")
+                return self._ml_only_analysis(data_summary, disease, year, ml_patterns)
+                
+        except asyncio.TimeoutError:
+            logger.warning(f"Gemini API exceeded {self.timeout}s deadline, falling back to ML-only analysis")
+            return self._ml_only_analysis(data_summary, disease, year, ml_patterns)
+        except Exception as e:
+            logger.error(f"Gemini API error: {str(e)}")
+            if self.fallback_enabled:
+                logger.info("Falling back to ML-only analysis")
+                return self._ml_only_analysis(data_summary, disease, year, ml_patterns)
+            else:
+                return {
+                    "source": "error",
+                    "error": str(e),
+                    "success": False
+                }
+    
+    async def answer_health_query_async(
+        self,
+        query: str,
+        context_data: pd.DataFrame,
+        disease: str,
+        year: Optional[int] = None
+    ) -> str:
+        """
+        Async variant of `answer_health_query` with a per-call deadline.
+        Falls back to the statistical answer when the deadline expires.
+        """
+        if not self.is_available():
+            return self._ml_only_qa(query, context_data, disease, year)
+        
+        try:
+            prompt = self._build_qa_prompt(query, context_data, disease, year)
+            text = await self._generate_text_async(prompt)
             
-            if response.text:
-                return response.text
+            if text:
+                return text
             else:
                 return self._ml_only_qa(query, context_data, disease, year)
                 
+        except asyncio.TimeoutError:
+            logger.warning(f"Gemini QA exceeded {self.timeout}s deadline, falling back to ML-only answer")
+            return self._ml_only_qa(query, context_data, disease, year)
         except Exception as e:
             logger.error(f"Gemini QA error: {str(e)}")
             if self.fallback_enabled:
@@ -14,30 +14,42 @@ load_dotenv()
 # Add the project root to the Python path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi import FastAPI, Query, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import math
-import numpy as np
-from typing import Optional, Dict, Any
+from functools import partial
+from typing import Optional, Dict, Any, List
 import pandas as pd
 
 try:
-    from streamlit_backend.data_loader import load_data, filter_dataset, aggregate_by_state, apply_rule_of_11
-    from streamlit_backend.pattern_mining import make_transactions, run_apriori, summarize_rules
+    from streamlit_backend.data_loader import load_data, filter_dataset, aggregate_by_state, iter_dataset_chunks, apply_rule_of_11, resolve_demographic_column, aggregate_diseases, suppress_diseases, trend_statistics, DISEASE_COLUMNS, EXPECTED_COLUMNS
+    from streamlit_backend.pattern_mining import make_transactions, run_apriori, summarize_rules, MINING_ALGORITHMS
+    from streamlit_backend.cache import DatasetCache, ResultCache
+    from streamlit_backend.cube import CountCube, CUBE_DIMENSIONS
+    from streamlit_backend.indexing import RowIndex
+    from streamlit_backend.suppression import apply_complementary_suppression, CubeSuppression
+    from streamlit_backend.utils import disparity_table, disparity_row, slice_disparity, DISPARITY_DIMENSIONS, ALL_PATIENTS
 except ImportError:
     # Fallback: load local implementations if streamlit_backend not available
     import sys
     sys.path.insert(0, str(Path(__file__).parent.parent))
-    from data_loader import load_data, filter_dataset, aggregate_by_state, apply_rule_of_11
-    from pattern_mining import make_transactions, run_apriori, summarize_rules
+    from data_loader import load_data, filter_dataset, aggregate_by_state, iter_dataset_chunks, apply_rule_of_11, resolve_demographic_column, aggregate_diseases, suppress_diseases, trend_statistics, DISEASE_COLUMNS, EXPECTED_COLUMNS
+    from pattern_mining import make_transactions, run_apriori, summarize_rules, MINING_ALGORITHMS
+    from cache import DatasetCache, ResultCache
+    from cube import CountCube, CUBE_DIMENSIONS
+    from indexing import RowIndex
+    from suppression import apply_complementary_suppression, CubeSuppression
+    from utils import disparity_table, disparity_row, slice_disparity, DISPARITY_DIMENSIONS, ALL_PATIENTS
 
 try:
     from streamlit_backend.api.gemini_service import get_gemini_service
+    from streamlit_backend.api.serialization import negotiated_response, frame_columns
+    from streamlit_backend.api.compression import CompressionMiddleware
 except ImportError:
     from gemini_service import get_gemini_service
+    from serialization import negotiated_response, frame_columns
+    from compression import CompressionMiddleware
 
 app = FastAPI(
     title="XAM HEID ML & AI Backend",
@@ -59,13 +71,85 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses (zstd/br/gzip, negotiated from Accept-Encoding) above a minimum size
+if os.getenv('RESPONSE_COMPRESSION', 'true').lower() == 'true':
+    app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', '1024')))
+
 DATA_PATH = Path(__file__).parent.parent / 'data' / 'synthetic_health.csv'
 
+# Opt-in compact mode keeps demographic columns as categoricals and disease flags as uint8
+COMPACT_DATA = os.getenv('COMPACT_DATA', 'false').lower() == 'true'
+
+# Out-of-core mode: the patient table is never loaded. Aggregate endpoints answer from a count cube built by
+# streaming the file chunk by chunk; rule mining, which needs patient rows, is unavailable
+OUT_OF_CORE = os.getenv('OUT_OF_CORE', 'false').lower() == 'true'
+OUT_OF_CORE_CHUNK_ROWS = int(os.getenv('OUT_OF_CORE_CHUNK_ROWS', '1000000'))
+
+# Worker processes for group-by aggregation (count cube build, scan-path aggregates, mining transactions)
+AGG_WORKERS = int(os.getenv('AGG_WORKERS', '1'))
+
+# Hide extra cells so Rule-of-11 suppressed counts cannot be recovered from row/column totals
+COMPLEMENTARY_SUPPRESSION = os.getenv('COMPLEMENTARY_SUPPRESSION', 'true').lower() == 'true'
+
+# Loaded once per process; reloaded automatically when the dataset file changes
+dataset_cache = DatasetCache(str(DATA_PATH), loader=partial(load_data, compact=COMPACT_DATA))
+
+def stream_cube(path: str) -> CountCube:
+    """Count cube of the dataset at `path`, read `OUT_OF_CORE_CHUNK_ROWS` rows at a time."""
+    chunks = iter_dataset_chunks(path, chunk_rows=OUT_OF_CORE_CHUNK_ROWS, columns=CUBE_DIMENSIONS + DISEASE_COLUMNS)
+    return CountCube.from_chunks(chunks)
+
+# Out-of-core counterpart of dataset_cache: holds only the count cube; appended rows are added to it
+cube_cache = DatasetCache(str(DATA_PATH), loader=stream_cube, append=CountCube.add)
+
+# Summarized mining rules per (normalized request, dataset version); emptied when the dataset reloads
+mining_cache = ResultCache(
+    maxsize=int(os.getenv('MINING_CACHE_SIZE', '256')),
+    ttl=float(os.getenv('MINING_CACHE_TTL', '600')) or None,
+)
+dataset_cache.on_reload(mining_cache.clear)
+
+# Suppressed /filter aggregates per (normalized request, dataset version); emptied when the dataset reloads
+aggregate_cache = ResultCache(
+    maxsize=int(os.getenv('AGGREGATE_CACHE_SIZE', '512')),
+    ttl=float(os.getenv('AGGREGATE_CACHE_TTL', '600')) or None,
+)
+dataset_cache.on_reload(aggregate_cache.clear)
+cube_cache.on_reload(aggregate_cache.clear)
+
 # Initialize Gemini AI service
 gemini_service = get_gemini_service()
 
 def get_data():
-    return load_data(str(DATA_PATH))
+    return dataset_cache.get()
+
+def require_rows(feature: str) -> None:
+    """Reject features that need the patient table when it is never loaded (OUT_OF_CORE)."""
+    if OUT_OF_CORE:
+        raise HTTPException(status_code=501, detail=f"{feature} needs patient-level rows and is not available with OUT_OF_CORE=true")
+
+def dataset_version() -> tuple:
+    """Version of the data behind aggregates: the loaded table, or the streamed cube out of core."""
+    return (OUT_OF_CORE, (cube_cache if OUT_OF_CORE else dataset_cache).snapshot()[1])
+
+def get_cube() -> CountCube:
+    """Count cube for the current dataset, built once per dataset load and updated on appends."""
+    if OUT_OF_CORE:
+        return cube_cache.get()
+    # Appended rows are added to the existing cube rather than rebuilding it
+    return dataset_cache.derived('count_cube', partial(CountCube.from_frame, workers=AGG_WORKERS), update=CountCube.add)
+
+def get_index() -> RowIndex:
+    """Bitmap index over the current dataset, built once per dataset load."""
+    return dataset_cache.derived('row_index', RowIndex.from_frame)
+
+def get_suppression() -> CubeSuppression:
+    """Suppression pattern over every slice of the count cube, decided once per dataset version so
+    responses for different demographic filters cannot be differenced to recover hidden cells.
+    """
+    cube = get_cube()
+    return (cube_cache if OUT_OF_CORE else dataset_cache).derived(
+        'cube_suppression', lambda _: CubeSuppression.from_cube(cube, complementary=COMPLEMENTARY_SUPPRESSION))
 
 def normalize_disease_name(disease_name: str) -> str:
     """Converts 'Heart Disease' to 'heart_disease'."""
@@ -75,6 +159,17 @@ class FilterRequest(BaseModel):
     disease: str
     year: Optional[int] = None
     demographics: Optional[Dict[str, Any]] = None
+    shape: str = 'records'  # 'records' (list of rows) or 'columns' ({"rows": n, "columns": {name: [...]}})
+
+class MultiFilterRequest(BaseModel):
+    diseases: Optional[List[str]] = None  # defaults to every disease in the dataset
+    year: Optional[int] = None  # None aggregates every year in the same pass
+    demographics: Optional[Dict[str, Any]] = None
+
+class TrendsRequest(BaseModel):
+    disease: str
+    demographics: Optional[Dict[str, Any]] = None
+    window: int = 3  # years in the rolling mean
 
 class MiningRequest(BaseModel):
     disease: str
@@ -82,6 +177,116 @@ class MiningRequest(BaseModel):
     demographics: Optional[Dict[str, Any]] = None
     min_support: float = 0.05
     min_confidence: float = 0.6
+    algorithm: str = 'apriori'  # 'apriori', 'fpgrowth' or 'bitset'
+
+def demographics_key(demographics: Optional[Dict[str, Any]], columns) -> tuple:
+    """Demographic filters as a hashable key shared by equivalent spellings (e.g. 'Age' vs 'age_group').
+    Values keep their type: 5 and '5' select different rows.
+    Raises ValueError for a non-scalar value (e.g. a list), which no filter accepts.
+    """
+    for k, v in (demographics or {}).items():
+        if v is not None and not pd.api.types.is_scalar(v):
+            raise ValueError(f"Demographic filter '{k}' must be a single value, got {type(v).__name__}")
+    return tuple(sorted(
+        ((resolve_demographic_column(k, columns) or k), type(v).__name__, v)
+        for k, v in (demographics or {}).items() if v is not None
+    ))
+
+def mining_cache_key(req: MiningRequest, columns, version: int) -> tuple:
+    """Normalize a mining request so equivalent requests share a key."""
+    year = int(req.year) if req.year is not None else None
+    return (version, normalize_disease_name(req.disease), year, demographics_key(req.demographics, columns),
+            float(req.min_support), float(req.min_confidence), req.algorithm)
+
+def mine_rules(req: MiningRequest, df: pd.DataFrame, version: int) -> list:
+    """Summarized top rules for a mining request, memoized in `mining_cache`.
+    Raises ValueError for invalid filters or algorithms.
+    """
+    # Checked up front: an empty selection returns before run_apriori would reject the name
+    if req.algorithm not in MINING_ALGORITHMS:
+        raise ValueError(f"Unknown mining algorithm '{req.algorithm}'. Choose one of: {list(MINING_ALGORITHMS)}")
+
+    def compute():
+        disease_normalized = normalize_disease_name(req.disease)
+        filtered = filter_dataset(df, disease=disease_normalized, year=req.year, demographics=req.demographics, index=get_index())
+        # The make_transactions function now handles the Rule of 11 internally
+        tx = make_transactions(filtered, disease=disease_normalized, workers=AGG_WORKERS)
+        if tx.empty:
+            return []
+        fi, rules = run_apriori(tx, min_support=req.min_support, min_threshold=req.min_confidence, algorithm=req.algorithm)
+        return summarize_rules(rules, top_n=10)
+
+    return mining_cache.get_or_compute(mining_cache_key(req, df.columns, version), compute)
+
+def suppress_aggregate(agg: pd.DataFrame) -> pd.DataFrame:
+    """Rule of 11 on a freshly built state/year aggregate (in place), plus complementary suppression
+    across its per-state, per-year and overall totals when enabled. Only for filters the count cube
+    cannot answer; cube slices share the pattern of `get_suppression`.
+    """
+    agg = apply_rule_of_11(agg, inplace=True)
+    if COMPLEMENTARY_SUPPRESSION:
+        agg = apply_complementary_suppression(agg, ['state', 'year'], inplace=True)
+    return agg
+
+def filtered_aggregate(disease: str, year: Optional[int], demographics: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    """Suppressed state/year aggregate for one disease, memoized per dataset version in `aggregate_cache`.
+    The returned frame is shared between requests and must not be modified.
+    Raises ValueError for invalid filters.
+    """
+    version = dataset_version()
+
+    def compute():
+        cube = get_cube()
+        # Out of core the cube is all there is; it rejects filter keys that are not cube dimensions
+        if OUT_OF_CORE or cube.supports(demographics):
+            # Answer from the precomputed cube: cost depends on cell count, not patient count
+            agg = apply_rule_of_11(cube.query(disease, year=year, demographics=demographics), inplace=True)
+            return get_suppression().apply(agg, disease, demographics, inplace=True)
+        filtered = filter_dataset(get_data(), disease=disease, year=year, demographics=demographics, index=get_index())
+        return suppress_aggregate(aggregate_by_state(filtered, disease=disease, workers=AGG_WORKERS))
+
+    columns = EXPECTED_COLUMNS if OUT_OF_CORE else get_data().columns
+    key = (version, disease, int(year) if year is not None else None, demographics_key(demographics, columns))
+    return aggregate_cache.get_or_compute(key, compute)
+
+def get_disparities() -> pd.DataFrame:
+    """Disparity metrics for every disease, year and demographic slice, computed from the suppression
+    pattern served by /filter once per dataset version and shared by /disparities and /api/ai_insights.
+    """
+    return aggregate_cache.get_or_compute((dataset_version(), 'disparity_table'), lambda: disparity_table(get_suppression()))
+
+def disparity_summary(disease: str, year: Optional[int], demographics: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Disparity fields for an insights summary. A request selecting at most one demographic slice reads
+    the precomputed table; combined filters get the same metrics from their slice of the suppression
+    pattern, so every year is pooled per state either way. Empty when no cell is visible or the filters
+    are not cube dimensions.
+    """
+    filters = [(k, v) for k, v in (demographics or {}).items() if v is not None]
+    dimension, value = ALL_PATIENTS, ALL_PATIENTS
+    if len(filters) == 1:
+        dimension = resolve_demographic_column(filters[0][0], DISPARITY_DIMENSIONS)
+        value = filters[0][1]
+    if len(filters) <= 1 and dimension in DISPARITY_DIMENSIONS + [ALL_PATIENTS]:
+        metrics = disparity_row(get_disparities(), disease, year, dimension, value)
+    elif get_cube().supports(demographics):
+        metrics = slice_disparity(get_suppression(), disease, year, demographics)
+    else:
+        return {}
+    if metrics is None or not metrics['states']:
+        return {}
+    return {
+        # Percent, as the insight thresholds expect
+        "disparity_index": float(metrics['disparity_index'] * 100),
+        "max_rate": float(metrics['max_rate']),
+        "min_rate": float(metrics['min_rate']),
+        "avg_rate": float(metrics['mean_rate']),
+        "max_state": str(metrics['max_state']),
+        "min_state": str(metrics['min_state']),
+        "rate_ratio": float(metrics['rate_ratio']),
+        "gini": float(metrics['gini']),
+        "theil": float(metrics['theil']),
+        "between_group_variance": float(metrics['between_group_variance']),
+    }
 
 class QARequest(BaseModel):
     disease: str
@@ -94,42 +299,13 @@ def health():
     return {"status": "ok"}
 
 @app.post("/filter")
-def filter_endpoint(req: FilterRequest):
+def filter_endpoint(req: FilterRequest, accept: Optional[str] = Header(None)):
     try:
-        df = get_data()
         # normalize the disease name to match dataframe column names
         disease_normalized = normalize_disease_name(req.disease)
-        filtered = filter_dataset(df, disease=disease_normalized, year=req.year, demographics=req.demographics)
-
-        agg = aggregate_by_state(filtered, disease=disease_normalized)
-        agg = apply_rule_of_11(agg)
-        # Convert NaN (numpy) to JSON-friendly None
-        agg_clean = agg.where(pd.notnull(agg), None)
-
-        # Prepare records and sanitize values (replace NaN/inf with None, convert numpy scalars)
-        records = agg_clean.to_dict(orient='records')
-
-        def sanitize_value(v):
-            # convert numpy scalar to native
-            if isinstance(v, (np.integer, np.int64, np.int32)):
-                return int(v)
-            if isinstance(v, (np.floating, np.float64, np.float32)):
-                fv = float(v)
-                return None if not math.isfinite(fv) else fv
-            if isinstance(v, (np.bool_,)):
-                return bool(v)
-            # native floats
-            if isinstance(v, float):
-                return None if not math.isfinite(v) else v
-            return v
-
-        sanitized = []
-        for r in records:
-            newr = {k: sanitize_value(v) for k, v in r.items()}
-            sanitized.append(newr)
-
-        encoded = jsonable_encoder(sanitized)
-        return JSONResponse(content=encoded)
+        agg = filtered_aggregate(disease_normalized, req.year, req.demographics)
+        # JSON (NaN/inf -> null, vectorized per column), Arrow IPC or MessagePack depending on Accept
+        return negotiated_response(agg, accept, shape=req.shape)
     except ValueError as e:
         # Expected validation error from filter_dataset mapping/validation
         raise HTTPException(status_code=400, detail=str(e))
@@ -137,41 +313,106 @@ def filter_endpoint(req: FilterRequest):
         # Unexpected error: include the error text in the response for debugging
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/mine_patterns")
-def mine_patterns_endpoint(req: MiningRequest):
-    df = get_data()
+@app.post("/filter/diseases")
+def filter_diseases_endpoint(req: MultiFilterRequest, accept: Optional[str] = Header(None)):
+    """Cases, population and rate for several diseases from one aggregation pass.
+    Each disease is suppressed with the same pattern /filter serves; the payload is column-oriented:
+    {"groupby": [...], "diseases": [...], "rows": n, "columns": {name: [values...]}}
+    (or the frame itself as an Arrow IPC stream when the client accepts it).
+    """
+    # Spellings normalizing to the same column are served once, in first-seen order
+    diseases = list(dict.fromkeys(normalize_disease_name(d) for d in req.diseases)) if req.diseases else list(DISEASE_COLUMNS)
+    groupby = ['state', 'year']
+    try:
+        cube = get_cube()
+        if OUT_OF_CORE or cube.supports(req.demographics):
+            agg = cube.query_diseases(diseases, year=req.year, demographics=req.demographics, groupby=groupby)
+            agg = get_suppression().apply(suppress_diseases(agg, diseases), diseases, req.demographics, inplace=True)
+        else:
+            filtered = filter_dataset(get_data(), year=req.year, demographics=req.demographics, index=get_index())
+            agg = suppress_diseases(aggregate_diseases(filtered, diseases, groupby=groupby), diseases)
+            if COMPLEMENTARY_SUPPRESSION:
+                agg = apply_complementary_suppression(agg, groupby, case_col=[f'{d}_cases' for d in diseases], inplace=True)
+        return negotiated_response(agg, accept, content=lambda: {
+            "groupby": groupby, "diseases": diseases, "rows": int(len(agg)), "columns": frame_columns(agg)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        # Unexpected error: include the error text in the response for debugging
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/trends")
+def trends_endpoint(req: TrendsRequest, accept: Optional[str] = Header(None)):
+    """Per-state time series over every year in the dataset, from the same suppressed aggregate /filter
+    serves for all years. Adds year-over-year change, a rolling mean and a per-state slope; statistics
+    touching a suppressed cell are null. Column-oriented payload:
+    {"disease": ..., "years": [...], "window": w, "rows": n, "columns": {name: [values...]}}
+    """
     disease_normalized = normalize_disease_name(req.disease)
     try:
-        filtered = filter_dataset(df, disease=disease_normalized, year=req.year, demographics=req.demographics)
+        agg = filtered_aggregate(disease_normalized, None, req.demographics)
+        trends = trend_statistics(agg, years=get_cube().levels['year'].tolist(), window=req.window)
+        return negotiated_response(trends, accept, content=lambda: {
+            "disease": disease_normalized, "years": [int(y) for y in trends['year'].unique()], "window": req.window,
+            "rows": int(len(trends)), "columns": frame_columns(trends)})
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    
-    # The make_transactions function now handles the Rule of 11 internally
-    tx = make_transactions(filtered, disease=disease_normalized)
-    
-    if tx.empty:
-        return {"rules": []}
+    except Exception as e:
+        # Unexpected error: include the error text in the response for debugging
+        raise HTTPException(status_code=500, detail=str(e))
 
-    fi, rules = run_apriori(tx, min_support=req.min_support, min_threshold=req.min_confidence)
-    summarized = summarize_rules(rules, top_n=10)
-    return {"rules": summarized}
+@app.get("/disparities")
+def disparities_endpoint(disease: Optional[str] = None, accept: Optional[str] = Header(None)):
+    """Disparity across states for every disease, year and demographic slice (optionally one disease):
+    rate ratio, disparity index, Gini/Theil indexes and between-state variance over unsuppressed cells.
+    `year` is null on rows pooling every year. Column-oriented payload: {"rows": n, "columns": {...}}.
+    """
+    try:
+        table = get_disparities()
+        if disease is not None:
+            disease_normalized = normalize_disease_name(disease)
+            if disease_normalized not in set(table['disease']):
+                raise HTTPException(status_code=400, detail=f"Unknown disease '{disease}'")
+            table = table[table['disease'] == disease_normalized]
+        return negotiated_response(table, accept, shape='columns')
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        # Unexpected error: include the error text in the response for debugging
+        raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/qa")
-def qa_endpoint(req: QARequest):
-    df = get_data()
-    disease_normalized = normalize_disease_name(req.disease)
+@app.post("/api/mine_patterns")
+def mine_patterns_endpoint(req: MiningRequest, accept: Optional[str] = Header(None)):
+    require_rows("Pattern mining")
+    df, version = dataset_cache.snapshot()
     try:
-        filtered = filter_dataset(df, disease=disease_normalized, year=req.year, demographics=req.demographics)
+        summarized = mine_rules(req, df, version)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    
-    # Aggregate and apply Rule of 11 before answering
-    agg = aggregate_by_state(filtered, disease=disease_normalized)
-    agg_secure = apply_rule_of_11(agg)
+    rules = pd.DataFrame(summarized, columns=['antecedent', 'consequent', 'support', 'confidence', 'lift'])
+    return negotiated_response(rules, accept, content={"rules": summarized})
+
+@app.post("/qa")
+async def qa_endpoint(req: QARequest):
+    def prepare():
+        disease_normalized = normalize_disease_name(req.disease)
+        # Same suppressed aggregate /filter serves, so answers never reveal a cell /filter hides
+        try:
+            return filtered_aggregate(disease_normalized, req.year, req.demographics)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Data work runs in the threadpool; the Gemini call below is awaited so a slow upstream
+    # never holds a worker thread
+    agg_secure = await run_in_threadpool(prepare)
 
     # Enhanced: Use Gemini AI if available, otherwise provide basic response
     if gemini_service.is_available():
-        answer = gemini_service.answer_health_query(
+        answer = await gemini_service.answer_health_query_async(
             query=req.query,
             context_data=agg_secure,
             disease=req.disease,
@@ -185,51 +426,39 @@ def qa_endpoint(req: QARequest):
 
 
 @app.post("/api/ai_insights")
-def ai_insights_endpoint(req: MiningRequest):
+async def ai_insights_endpoint(req: MiningRequest):
     """
     New endpoint: Generate AI-driven insights using Gemini API.
     Combines ML pattern mining with Gemini's natural language understanding.
     Falls back to ML-only analysis if Gemini is unavailable.
     """
-    df = get_data()
-    disease_normalized = normalize_disease_name(req.disease)
-    
-    try:
-        filtered = filter_dataset(df, disease=disease_normalized, year=req.year, demographics=req.demographics)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    
-    # Run ML pattern mining
-    tx = make_transactions(filtered, disease=disease_normalized)
-    ml_patterns = []
-    
-    if not tx.empty:
-        fi, rules = run_apriori(tx, min_support=req.min_support, min_threshold=req.min_confidence)
-        ml_patterns = summarize_rules(rules, top_n=10)
-    
-    # Generate data summary
-    agg = aggregate_by_state(filtered, disease=disease_normalized)
-    agg_secure = apply_rule_of_11(agg)
-    
-    data_summary = {
-        "total_states": len(agg_secure),
-        "total_cases": int(filtered.shape[0]) if not filtered.empty else 0,
-        "disease": req.disease,
-        "year": req.year,
-    }
-    
-    # Calculate disparity index if we have valid data
-    if not agg_secure.empty and 'rate' in agg_secure.columns:
-        valid_rates = agg_secure['rate'].dropna()
-        if len(valid_rates) > 0:
-            disparity_index = ((valid_rates.max() - valid_rates.min()) / valid_rates.max() * 100)
-            data_summary["disparity_index"] = float(disparity_index)
-            data_summary["max_rate"] = float(valid_rates.max())
-            data_summary["min_rate"] = float(valid_rates.min())
-            data_summary["avg_rate"] = float(valid_rates.mean())
+    def prepare():
+        disease_normalized = normalize_disease_name(req.disease)
+        
+        try:
+            # Generate data summary
+            agg_secure = filtered_aggregate(disease_normalized, req.year, req.demographics)
+            # Run ML pattern mining; out of core there are no patient rows to mine
+            ml_patterns = [] if OUT_OF_CORE else mine_rules(req, *dataset_cache.snapshot())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        data_summary = {
+            "total_states": len(agg_secure),
+            # Patients matching the filters (population is never suppressed)
+            "total_cases": int(agg_secure['population'].sum()),
+            "disease": req.disease,
+            "year": req.year,
+        }
+        
+        # Disparity metrics from the shared disparity engine
+        data_summary.update(disparity_summary(disease_normalized, req.year, req.demographics))
+        return data_summary, ml_patterns
+
+    data_summary, ml_patterns = await run_in_threadpool(prepare)
     
     # Generate AI insights
-    insights_result = gemini_service.generate_health_insights(
+    insights_result = await gemini_service.generate_health_insights_async(
         data_summary=data_summary,
         disease=req.disease,
         year=req.year,
@@ -252,6 +481,10 @@ def enhanced_health_check():
             "gemini_ai": "active" if gemini_service.is_available() else "inactive",
             "data_loader": "active"
         },
+        "dataset_cache": dataset_cache.stats(),
+        "mining_cache": mining_cache.stats(),
+        "aggregate_cache": aggregate_cache.stats(),
+        "gemini_cache": gemini_service.response_cache.stats(),
         "features": {
             "pattern_mining": True,
             "ai_insights": gemini_service.is_available(),
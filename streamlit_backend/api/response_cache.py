@@ -0,0 +1,158 @@
+"""
+Content-addressed cache for Gemini responses.
+Prompts built from aggregated data are deterministic, so a response can be reused whenever the same
+prompt is sent to the same model. Entries live in an in-memory LRU and, optionally, in a SQLite file
+shared by every worker on the node. The async accessors answer memory hits on the event loop and run
+SQLite work in a worker thread.
+"""
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any
+
+try:
+    from streamlit_backend.cache import ResultCache
+except ImportError:
+    from cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+
+class PromptResponseCache:
+    """Two-tier (memory LRU + optional SQLite) cache of response text keyed by prompt fingerprint."""
+
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = 3600, sqlite_path: Optional[str] = None,
+                 disk_maxsize: int = 10000):
+        self.ttl = ttl
+        self.memory = ResultCache(maxsize=maxsize, ttl=ttl)
+        self.disk_maxsize = disk_maxsize
+        self.sqlite_path = sqlite_path
+        self._conn = None
+        self._disk_lock = threading.Lock()
+        self.disk_hits = 0
+        self.misses = 0
+        if sqlite_path:
+            try:
+                self._conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to open response cache at {sqlite_path}: {str(e)}")
+                self._conn = None
+
+    @classmethod
+    def from_env(cls) -> 'PromptResponseCache':
+        return cls(
+            maxsize=int(os.getenv('GEMINI_CACHE_SIZE', '512')),
+            ttl=float(os.getenv('GEMINI_CACHE_TTL', '3600')) or None,
+            sqlite_path=os.getenv('GEMINI_CACHE_PATH') or None,
+            disk_maxsize=int(os.getenv('GEMINI_CACHE_DISK_SIZE', '10000')),
+        )
+
+    @staticmethod
+    def fingerprint(model_name: str, prompt: str) -> str:
+        """SHA-256 of the model name and prompt text."""
+        return hashlib.sha256(f"{model_name}\x00{prompt}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        text = self.memory.get(key)
+        if text is not None:
+            return text
+        text = self._disk_get(key)
+        if text is not None:
+            self.disk_hits += 1
+            self.memory.set(key, text)
+            return text
+        self.misses += 1
+        return None
+
+    def set(self, key: str, text: str) -> None:
+        self.memory.set(key, text)
+        self._disk_set(key, text)
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """`get` for coroutines: the SQLite lookup (a SELECT plus an UPDATE and commit) runs off the loop."""
+        text = self.memory.get(key)
+        if text is not None:
+            return text
+        text = await asyncio.to_thread(self._disk_get, key) if self._conn is not None else None
+        if text is not None:
+            self.disk_hits += 1
+            self.memory.set(key, text)
+            return text
+        self.misses += 1
+        return None
+
+    async def set_async(self, key: str, text: str) -> None:
+        """`set` for coroutines: the memory tier is updated at once, the SQLite write runs off the loop."""
+        self.memory.set(key, text)
+        if self._conn is not None:
+            await asyncio.to_thread(self._disk_set, key, text)
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        if self._conn is None:
+            return None
+        now = time.time()
+        try:
+            with self._disk_lock:
+                row = self._conn.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                text, created = row
+                if self.ttl and now - created >= self.ttl:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                    return None
+                self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                return text
+        except sqlite3.Error as e:
+            logger.error(f"Response cache read failed: {str(e)}")
+            return None
+
+    def _disk_set(self, key: str, text: str) -> None:
+        if self._conn is None:
+            return
+        now = time.time()
+        try:
+            with self._disk_lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, text, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, text, now, now),
+                )
+                # Keep the most recently used `disk_maxsize` entries
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY accessed DESC LIMIT ?)",
+                    (self.disk_maxsize,),
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Response cache write failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        hits = memory['hits'] + self.disk_hits
+        lookups = hits + self.misses
+        disk_size = None
+        if self._conn is not None:
+            with self._disk_lock:
+                disk_size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            'memory_size': memory['size'],
+            'memory_maxsize': memory['maxsize'],
+            'disk_enabled': self._conn is not None,
+            'disk_size': disk_size,
+            'ttl': self.ttl,
+            'memory_hits': memory['hits'],
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,152 @@
+"""
+Response serialization for aggregate frames.
+Frames are converted column by column: each column becomes a list of native Python values in one
+vectorized step (NaN/inf -> None, numpy scalars -> int/float/bool), and the payload is encoded with
+orjson when it is installed. Payloads can be row-oriented (a list of records, the historical `/filter`
+shape) or column-oriented ({"columns": {name: [values...]}, "rows": n}).
+Clients may instead ask for an Arrow IPC stream or MessagePack through the `Accept` header
+(see `negotiate_media_type`); both are optional dependencies and JSON is always available.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+SHAPES = ('records', 'columns')
+
+JSON_MEDIA_TYPE = 'application/json'
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (falls back to the standard library encoder).
+    Content must already be made of native values, e.g. from `frame_columns`/`frame_records`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+def column_values(series: pd.Series) -> List[Any]:
+    """Native Python values of one column, with missing and non-finite values as None."""
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype) and not series.hasnans:
+        return series.to_numpy(dtype=bool).tolist()
+    if pd.api.types.is_integer_dtype(dtype) and not series.hasnans:
+        return series.to_numpy(dtype=np.int64).tolist()
+    if pd.api.types.is_float_dtype(dtype):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        out = values.astype(object)
+        out[~np.isfinite(values)] = None
+        return out.tolist()
+    values = series.astype(object)
+    return values.where(series.notna(), None).tolist()
+
+
+def frame_columns(df: pd.DataFrame) -> Dict[str, List[Any]]:
+    return {str(col): column_values(df[col]) for col in df.columns}
+
+
+def frame_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    columns = frame_columns(df)
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def frame_payload(df: pd.DataFrame, shape: str = 'records') -> Any:
+    """`df` as a JSON-ready payload in the requested shape. Raises ValueError for an unknown shape."""
+    if shape == 'records':
+        return frame_records(df)
+    if shape == 'columns':
+        return {"rows": int(len(df)), "columns": frame_columns(df)}
+    raise ValueError(f"Unknown response shape '{shape}'. Use one of {SHAPES}.")
+
+
+def available_media_types() -> List[str]:
+    """Media types this process can produce, JSON first."""
+    types = [JSON_MEDIA_TYPE]
+    if PYARROW_AVAILABLE:
+        types.append(ARROW_MEDIA_TYPE)
+    if MSGPACK_AVAILABLE:
+        types.extend(MSGPACK_MEDIA_TYPES)
+    return types
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """Pick the response media type from an `Accept` header.
+    Entries are tried in order of decreasing q-value; the first one we can produce wins. Anything else
+    (no header, wildcards, unsupported or unavailable types) gets JSON.
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+    candidates = []
+    for position, entry in enumerate(accept.split(',')):
+        media, *params = [part.strip() for part in entry.split(';')]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            candidates.append((-q, position, media.lower()))
+    available = available_media_types()
+    for _, _, media in sorted(candidates):
+        if media in available:
+            return media
+    return JSON_MEDIA_TYPE
+
+
+def arrow_stream(df: pd.DataFrame) -> bytes:
+    """`df` as an Arrow IPC stream; NaN becomes null and categoricals stay dictionary-encoded."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def negotiated_response(df: pd.DataFrame, accept: Optional[str], shape: str = 'records',
+                        content: Any = None) -> Response:
+    """Response for `df` in the media type negotiated from `accept`.
+    JSON and MessagePack carry `content` when given (a payload, or a callable building it only when
+    needed), otherwise `frame_payload(df, shape)`; Arrow carries the frame itself.
+    Raises ValueError for an unknown shape.
+    """
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown response shape '{shape}'. Use one of {SHAPES}.")
+    media_type = negotiate_media_type(accept)
+    if media_type == ARROW_MEDIA_TYPE:
+        return Response(content=arrow_stream(df), media_type=ARROW_MEDIA_TYPE)
+    if content is None:
+        content = frame_payload(df, shape)
+    elif callable(content):
+        content = content()
+    if media_type in MSGPACK_MEDIA_TYPES:
+        return Response(content=msgpack.packb(content, use_bin_type=True), media_type=media_type)
+    return FastJSONResponse(content=content)
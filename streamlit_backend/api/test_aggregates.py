@@ -0,0 +1,213 @@
+"""
+Unit tests for precomputed aggregates
+Tests that the count cube answers filters exactly like a scan of patient rows
+and that multi-process aggregation matches the single-threaded groupby
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from streamlit_backend import parallel
+from streamlit_backend.data_loader import (
+    filter_dataset, aggregate_by_state, aggregate_diseases, apply_rule_of_11, compact_dtypes,
+)
+from streamlit_backend.cube import CountCube
+from streamlit_backend.pattern_mining import make_transactions
+from streamlit_backend.suppression import CubeSuppression
+from streamlit_backend.utils import disparity_metrics, disparity_table, disparity_row, slice_disparity, summary_disparity
+
+
+class TestCountCube:
+    """Test cases for CountCube"""
+
+    @pytest.mark.parametrize('year,demographics', [
+        (None, None),
+        (2023, None),
+        (2022, {'Age': '65+'}),
+        (None, {'Race': 'Black', 'income_group': 'Middle'}),
+        (2023, {'sex': 'Other'}),
+    ])
+    @pytest.mark.parametrize('compact', [False, True])
+    def test_query_matches_scan(self, patient_frame, year, demographics, compact):
+        """Cube slices equal filter_dataset + aggregate_by_state"""
+        df = compact_dtypes(patient_frame) if compact else patient_frame
+        cube = CountCube.from_frame(df)
+
+        expected = aggregate_by_state(filter_dataset(df, year=year, demographics=demographics), 'heart_disease')
+        actual = cube.query('heart_disease', year=year, demographics=demographics)
+
+        assert actual['state'].astype(str).tolist() == expected['state'].astype(str).tolist()
+        assert actual['year'].tolist() == expected['year'].tolist()
+        assert actual['cases'].tolist() == expected['cases'].tolist()
+        assert actual['population'].tolist() == expected['population'].tolist()
+
+    def test_unknown_disease(self, patient_frame):
+        """Unknown disease names raise ValueError"""
+        cube = CountCube.from_frame(patient_frame)
+        with pytest.raises(ValueError):
+            cube.query('invalid_disease')
+
+    def test_supports_only_cube_dimensions(self, patient_frame):
+        """Filters on non-dimension columns fall back to scanning"""
+        cube = CountCube.from_frame(patient_frame)
+        assert cube.supports({'Income Level': 'Low'})
+        assert not cube.supports({'patient_id': 3})
+
+    def test_query_diseases_matches_scan(self, patient_frame):
+        """The multi-disease cube query equals aggregate_diseases over the filtered rows"""
+        cube = CountCube.from_frame(patient_frame)
+        diseases = ['cancer', 'diabetes']
+
+        expected = aggregate_diseases(filter_dataset(patient_frame, year=2022), diseases)
+        actual = cube.query_diseases(diseases, year=2022)
+
+        assert list(actual.columns) == list(expected.columns)
+        for col in ['population', 'cancer_cases', 'diabetes_cases', 'diabetes_rate']:
+            assert actual[col].tolist() == expected[col].tolist()
+
+    @pytest.mark.parametrize('compact', [False, True])
+    def test_add_matches_rebuild(self, patient_frame, compact):
+        """Adding a batch, including a new state and year, equals building from all rows"""
+        df = compact_dtypes(patient_frame) if compact else patient_frame
+        batch = patient_frame.iloc[:10].assign(state='AK', year=2024)
+
+        cube = CountCube.from_frame(df)
+        updated = cube.add(batch)
+        expected = CountCube.from_frame(pd.concat([patient_frame, batch], ignore_index=True))
+
+        assert updated.levels['state'].tolist() == ['AK', 'CA', 'TX']
+        assert updated.levels['year'].tolist() == [2022, 2023, 2024]
+        assert (updated.population == expected.population).all()
+        assert all((updated.cases[d] == expected.cases[d]).all() for d in expected.cases)
+        # The original cube is left untouched
+        assert int(cube.population.sum()) == len(df)
+
+
+class TestParallelAggregation:
+    """Test cases for process-pool aggregation over shared memory"""
+
+    @pytest.fixture(autouse=True)
+    def small_partitions(self, monkeypatch):
+        # Use the process pool even for the tiny test frame
+        monkeypatch.setattr(parallel, 'MIN_ROWS_PER_WORKER', 1)
+
+    @pytest.mark.parametrize('partition', ['rows', 'state'])
+    @pytest.mark.parametrize('compact', [False, True])
+    def test_matches_groupby(self, patient_frame, partition, compact):
+        """Partial sums from every partition add up to the pandas aggregate"""
+        df = compact_dtypes(patient_frame) if compact else patient_frame
+        expected = aggregate_by_state(df, 'diabetes', groupby=['state', 'age_group'])
+        actual = parallel.aggregate_parallel(df, 'diabetes', groupby=['state', 'age_group'], workers=2, partition=partition)
+
+        assert actual[['state', 'age_group']].astype(str).values.tolist() == expected[['state', 'age_group']].astype(str).values.tolist()
+        assert actual['cases'].tolist() == expected['cases'].tolist()
+        assert actual['population'].tolist() == expected['population'].tolist()
+
+    def test_cube_and_transactions_match_serial(self, patient_frame):
+        """The count cube and mining transactions do not depend on the worker count"""
+        serial, pooled = CountCube.from_frame(patient_frame), CountCube.from_frame(patient_frame, workers=3)
+        assert np.array_equal(serial.population, pooled.population)
+        assert all(np.array_equal(serial.cases[d], pooled.cases[d]) for d in serial.cases)
+
+        groupby = ['state', 'sex']
+        assert make_transactions(patient_frame, 'heart_disease', groupby).equals(
+            make_transactions(patient_frame, 'heart_disease', groupby, workers=2))
+
+    def test_state_partition_requires_state_key(self, patient_frame):
+        """Partitioning by state needs state among the group keys"""
+        with pytest.raises(ValueError):
+            parallel.aggregate_parallel(patient_frame, 'diabetes', groupby=['year'], workers=2, partition='state')
+
+
+class TestDisparityEngine:
+    """Test cases for the batch disparity engine"""
+
+    def test_metrics(self):
+        """Rate ratio, Gini, Theil and between-group variance match their definitions"""
+        cases = np.array([20.0, 40.0, 30.0, 5.0])
+        population = np.array([100.0, 100.0, 200.0, 50.0])
+        visible = np.array([True, True, True, False])
+
+        m = disparity_metrics(cases, population, visible)
+
+        rates, weights = np.array([0.2, 0.4, 0.15]), np.array([0.25, 0.25, 0.5])
+        mean = 90 / 400
+        assert m['units'] == 3 and m['max_unit'] == 1 and m['min_unit'] == 2
+        assert np.isclose(m['mean_rate'], mean)
+        assert np.isclose(m['rate_ratio'], 0.4 / 0.15)
+        assert np.isclose(m['between_group_variance'], (weights * (rates - mean) ** 2).sum())
+        assert np.isclose(m['theil'], (weights * rates / mean * np.log(rates / mean)).sum())
+        gini = (weights[:, None] * weights[None] * np.abs(rates[:, None] - rates[None])).sum() / (2 * mean)
+        assert np.isclose(m['gini'], gini)
+
+    def test_no_visible_units(self):
+        """Metrics are NaN when every unit is suppressed"""
+        m = disparity_metrics([[1.0, 2.0]], [[5.0, 5.0]], [[False, False]])
+        assert m['units'].tolist() == [0]
+        assert np.isnan(m['gini']).all() and np.isnan(m['max_rate']).all()
+
+    def test_table_matches_per_slice_metrics(self, patient_frame):
+        """Each row equals the metrics of that slice's state rates; frame and cube sources agree"""
+        df = pd.concat([patient_frame] * 10, ignore_index=True)
+        table = disparity_table(df, complementary=False)
+        assert table.equals(disparity_table(CountCube.from_frame(df), complementary=False))
+
+        slices = 1 + sum(df[d].nunique() for d in ['age_group', 'sex', 'race_ethnicity', 'income_group'])
+        assert len(table) == 3 * 3 * slices  # diseases x (2 years + all years) x slices
+
+        row = disparity_row(table, 'heart_disease', 2023, 'sex', 'Female')
+        agg = aggregate_by_state(filter_dataset(df, year=2023, demographics={'sex': 'Female'}), 'heart_disease')
+        visible = agg[(agg['cases'] >= 11) & (agg['population'] >= 11)]
+        assert row['states'] == len(visible)
+        assert row['max_rate'] == visible['rate'].max()
+        assert row['mean_rate'] == visible['cases'].sum() / visible['population'].sum()
+
+    def test_rows_use_served_cells(self, sparse_patients):
+        """A per-year row sees exactly the cells /filter leaves visible for that slice"""
+        cube = CountCube.from_frame(sparse_patients)
+        suppression = CubeSuppression.from_cube(cube)
+        table = disparity_table(suppression)
+        assert table.equals(disparity_table(sparse_patients))
+
+        for demographics, dimension, value in [(None, 'all', 'all'), ({'sex': 'Other'}, 'sex', 'Other')]:
+            agg = apply_rule_of_11(cube.query('diabetes', year=2022, demographics=demographics))
+            visible = suppression.apply(agg, 'diabetes', demographics).dropna(subset=['rate'])
+            row = disparity_row(table, 'diabetes', 2022, dimension, value)
+            assert row['states'] == len(visible)
+            assert row['cases'] == visible['cases'].sum()
+
+    @pytest.mark.parametrize('year', [2021, None])
+    def test_slice_disparity_matches_table(self, sparse_patients, year):
+        """Any slice is computed like its table row, with all years pooled per state"""
+        suppression = CubeSuppression.from_cube(CountCube.from_frame(sparse_patients))
+        row = disparity_row(disparity_table(suppression), 'heart_disease', year, 'income_group', 'Low')
+
+        metrics = slice_disparity(suppression, 'heart_disease', year, {'Income Level': 'Low'})
+
+        assert (metrics['states'], metrics['min_state'], metrics['max_state']) == (row['states'], row['min_state'], row['max_state'])
+        for name in ('cases', 'population', 'mean_rate', 'disparity_index', 'gini', 'theil'):
+            assert metrics[name] == pytest.approx(row[name]), name
+        assert slice_disparity(suppression, 'heart_disease', year, {'sex': 'Unknown'}) is None
+        assert slice_disparity(suppression, 'heart_disease', 1999) is None
+
+    def test_summary_disparity(self, patient_frame):
+        """The single-disease summary reads the engine's all-years row"""
+        df = pd.concat([patient_frame] * 10, ignore_index=True)
+        summary = summary_disparity(df, 'heart_disease')
+        row = disparity_row(disparity_table(df, diseases=['heart_disease'], dimensions=[]), 'heart_disease')
+
+        assert summary['max_state'] == row['max_state']
+        assert summary['disparity_index'] == row['disparity_index']
+        assert 'gini' in summary and 'rate_ratio' in summary
+        assert 'message' in summary_disparity(df, 'heart_disease', year=1999)
+
+    def test_unknown_inputs(self, patient_frame):
+        """Unknown diseases and dimensions raise ValueError"""
+        with pytest.raises(ValueError):
+            disparity_table(patient_frame, diseases=['flu'])
+        with pytest.raises(ValueError):
+            disparity_table(patient_frame, dimensions=['patient_id'])
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -4,9 +4,11 @@ Tests the FastAPI endpoints with Gemini AI integration
 """
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
 import os
 
+import pandas as pd
+
 # Set test environment
 os.environ['GEMINI_API_KEY'] = 'test-key'
 os.environ['ENABLE_GEMINI_AI'] = 'true'
@@ -36,6 +38,8 @@ class TestHealthEndpoints:
         assert 'services' in data
         assert 'features' in data
         assert data['services']['ml_engine'] == 'active'
+        for cache in ('dataset_cache', 'mining_cache', 'aggregate_cache'):
+            assert 'hits' in data[cache]
 
 
 class TestFilterEndpoint:
@@ -61,6 +65,148 @@ class TestFilterEndpoint:
         
         assert response.status_code == 400
 
+    def test_filter_columnar_shape(self):
+        """The columnar shape carries the same values as the records shape"""
+        body = {"disease": "Cancer", "year": 2022}
+        records = client.post("/filter", json=body).json()
+        response = client.post("/filter", json={**body, "shape": "columns"})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['rows'] == len(records)
+        assert data['columns']['rate'] == [row['rate'] for row in records]
+        assert client.post("/filter", json={**body, "shape": "nested"}).status_code == 400
+
+    def test_filter_arrow_response(self):
+        """Clients accepting Arrow get an IPC stream with the same rows"""
+        pa = pytest.importorskip('pyarrow')
+        body = {"disease": "Cancer", "year": 2022}
+        records = client.post("/filter", json=body).json()
+        response = client.post("/filter", json=body, headers={"Accept": "application/vnd.apache.arrow.stream"})
+
+        assert response.headers['content-type'] == 'application/vnd.apache.arrow.stream'
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.column('rate').to_pylist() == [row['rate'] for row in records]
+
+    def test_filter_out_of_core_matches_in_memory(self):
+        """Streaming aggregation returns the same payload as the in-memory path"""
+        body = {"disease": "Diabetes", "year": 2022, "demographics": {"Race": "Black"}}
+        in_memory = client.post("/filter", json=body).json()
+        with patch('streamlit_backend.api.main.OUT_OF_CORE', True), \
+                patch('streamlit_backend.api.main.OUT_OF_CORE_CHUNK_ROWS', 5000):
+            response = client.post("/filter", json=body)
+
+        assert response.status_code == 200
+        assert response.json() == in_memory
+
+    def test_out_of_core_never_loads_the_table(self):
+        """Out of core, aggregate endpoints answer from the streamed cube and mining is refused"""
+        from streamlit_backend.api import main
+        requests = [
+            ("/filter", {"disease": "Cancer", "demographics": {"sex": "Female"}}),
+            ("/filter/diseases", {"year": 2021, "demographics": {"Age": "65+"}}),
+            ("/trends", {"disease": "Diabetes"}),
+        ]
+        in_memory = [client.post(url, json=body).json() for url, body in requests]
+        with patch('streamlit_backend.api.main.OUT_OF_CORE', True), \
+                patch('streamlit_backend.api.main.OUT_OF_CORE_CHUNK_ROWS', 5000), \
+                patch.object(main.dataset_cache, 'snapshot', side_effect=AssertionError("table loaded")), \
+                patch.object(main.dataset_cache, 'get', side_effect=AssertionError("table loaded")):
+            for (url, body), expected in zip(requests, in_memory):
+                response = client.post(url, json=body)
+                assert response.status_code == 200
+                assert response.json() == expected
+            assert client.get("/disparities", params={"disease": "Cancer"}).status_code == 200
+            mining = client.post("/api/mine_patterns", json={"disease": "Cancer"})
+
+        assert mining.status_code == 501
+        assert main.cube_cache.stats()['loaded']
+
+    def test_cache_key_keeps_value_types(self):
+        """Filter values that only match as strings do not share a cached aggregate with numbers"""
+        from streamlit_backend.api.main import demographics_key
+        columns = ['age_group', 'sex']
+        assert demographics_key({'Age': '5'}, columns) == demographics_key({'age_group': '5'}, columns)
+        assert demographics_key({'Age': 5}, columns) != demographics_key({'Age': '5'}, columns)
+
+    @pytest.mark.parametrize('url', ["/filter", "/trends", "/api/mine_patterns", "/qa"])
+    def test_list_valued_filter_rejected(self, url):
+        """Non-scalar filter values are a client error, not an unhashable cache key"""
+        body = {"disease": "Diabetes", "demographics": {"sex": ["Male"]}, "query": "Which state is highest?"}
+        response = client.post(url, json=body)
+        assert response.status_code == 400
+        assert 'single value' in response.json()['detail']
+
+
+class TestMultiDiseaseFilterEndpoint:
+    """Test the combined multi-disease filter endpoint"""
+
+    def test_matches_single_disease_calls(self):
+        """Each disease's columns equal the corresponding /filter response"""
+        response = client.post("/filter/diseases", json={"diseases": ["Diabetes", "Cancer"], "year": 2023})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['diseases'] == ['diabetes', 'cancer']
+        columns = data['columns']
+        assert all(len(values) == data['rows'] for values in columns.values())
+
+        single = client.post("/filter", json={"disease": "Diabetes", "year": 2023}).json()
+        assert columns['diabetes_rate'] == [row['rate'] for row in single]
+        assert columns['diabetes_suppressed'] == [row['suppressed'] for row in single]
+
+    def test_defaults_to_all_diseases(self):
+        """Omitting diseases aggregates every disease column"""
+        data = client.post("/filter/diseases", json={}).json()
+        assert data['diseases'] == ['heart_disease', 'diabetes', 'cancer']
+
+    def test_invalid_disease(self):
+        """Unknown diseases return 400"""
+        response = client.post("/filter/diseases", json={"diseases": ["Flu"]})
+        assert response.status_code == 400
+
+    def test_duplicate_diseases_served_once(self):
+        """Spellings of the same disease collapse to one set of columns"""
+        response = client.post("/filter/diseases", json={"diseases": ["Diabetes", "Cancer", "diabetes"], "year": 2023})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['diseases'] == ['diabetes', 'cancer']
+        assert list(data['columns']).count('diabetes_cases') == 1
+
+
+class TestTrendsEndpoint:
+    """Test the multi-year trends endpoint"""
+
+    def test_matches_filter_over_all_years(self):
+        """Cells equal the all-years /filter response, with every state covering every year"""
+        response = client.post("/trends", json={"disease": "Diabetes", "demographics": {"Race": "Black"}})
+
+        assert response.status_code == 200
+        data = response.json()
+        columns = data['columns']
+        assert data['disease'] == 'diabetes'
+        assert data['rows'] == len(set(columns['state'])) * len(data['years'])
+        for name in ('yoy_change', 'rolling_mean', 'slope', 'suppressed'):
+            assert len(columns[name]) == data['rows']
+
+        single = client.post("/filter", json={"disease": "Diabetes", "demographics": {"Race": "Black"}}).json()
+        trend_rates = dict(zip(zip(columns['state'], columns['year']), columns['rate']))
+        assert all(trend_rates[(row['state'], row['year'])] == row['rate'] for row in single)
+
+    def test_invalid_requests(self):
+        """Unknown diseases and bad windows return 400"""
+        assert client.post("/trends", json={"disease": "Flu"}).status_code == 400
+        assert client.post("/trends", json={"disease": "Cancer", "window": 0}).status_code == 400
+
+    def test_unexpected_error(self):
+        """Unexpected failures return 500 with a detail message"""
+        with patch('streamlit_backend.api.main.trend_statistics', side_effect=RuntimeError("boom")):
+            response = client.post("/trends", json={"disease": "Cancer"})
+
+        assert response.status_code == 500
+        assert response.json()['detail'] == "boom"
+
 
 class TestPatternMiningEndpoint:
     """Test ML pattern mining endpoint"""
@@ -93,6 +239,29 @@ class TestPatternMiningEndpoint:
         data = response.json()
         assert 'rules' in data
 
+    def test_mine_patterns_fpgrowth(self):
+        """Test pattern mining with the FP-Growth engine"""
+        response = client.post("/api/mine_patterns", json={
+            "disease": "Diabetes",
+            "min_support": 0.05,
+            "algorithm": "fpgrowth"
+        })
+
+        assert response.status_code == 200
+        assert 'rules' in response.json()
+
+    @pytest.mark.parametrize('endpoint', ["/api/mine_patterns", "/api/ai_insights"])
+    def test_unknown_algorithm_rejected(self, endpoint):
+        """An unknown engine is a 400 even when the selection holds no transactions"""
+        response = client.post(endpoint, json={
+            "disease": "Diabetes",
+            "year": 1900,
+            "algorithm": "nope"
+        })
+
+        assert response.status_code == 400
+        assert 'nope' in response.json()['detail']
+
 
 class TestAIInsightsEndpoint:
     """Test new AI insights endpoint"""
@@ -101,12 +270,12 @@ class TestAIInsightsEndpoint:
     def test_ai_insights_with_gemini(self, mock_service):
         """Test AI insights when Gemini is available"""
         mock_service.is_available.return_value = True
-        mock_service.generate_health_insights.return_value = {
+        mock_service.generate_health_insights_async = AsyncMock(return_value={
             'source': 'gemini_ai',
             'insights': 'AI-generated insights',
             'ml_patterns': [],
             'success': True
-        }
+        })
         
         response = client.post("/api/ai_insights", json={
             "disease": "Heart Disease",
@@ -122,12 +291,12 @@ class TestAIInsightsEndpoint:
     def test_ai_insights_fallback_to_ml(self, mock_service):
         """Test AI insights falls back to ML when Gemini unavailable"""
         mock_service.is_available.return_value = False
-        mock_service.generate_health_insights.return_value = {
+        mock_service.generate_health_insights_async = AsyncMock(return_value={
             'source': 'ml_only',
             'insights': 'ML-based insights',
             'ml_patterns': [],
             'success': True
-        }
+        })
         
         response = client.post("/api/ai_insights", json={
             "disease": "Diabetes",
@@ -138,6 +307,71 @@ class TestAIInsightsEndpoint:
         data = response.json()
         assert data['source'] == 'ml_only'
 
+    @pytest.mark.parametrize('year,demographics', [
+        (2023, None),
+        (2023, {"sex": "Male"}),
+        (None, {"Race": "White", "Income Level": "Low"}),  # combined filters: computed from their suppression slice
+    ])
+    @patch('streamlit_backend.api.main.gemini_service')
+    def test_ai_insights_disparity_summary(self, mock_service, year, demographics):
+        """The data summary carries the disparity engine's metrics for the selected slice"""
+        mock_service.generate_health_insights_async = AsyncMock(return_value={'success': True})
+
+        response = client.post("/api/ai_insights", json={"disease": "Diabetes", "year": year, "demographics": demographics})
+
+        assert response.status_code == 200
+        summary = mock_service.generate_health_insights_async.call_args.kwargs['data_summary']
+        for key in ('disparity_index', 'max_rate', 'min_rate', 'avg_rate', 'rate_ratio', 'gini', 'theil'):
+            assert key in summary
+        assert summary['min_rate'] <= summary['avg_rate'] <= summary['max_rate']
+        assert 0 <= summary['disparity_index'] <= 100
+
+    @pytest.mark.parametrize('demographics', [None, {"Race": "White", "Income Level": "Low"}])
+    @patch('streamlit_backend.api.main.gemini_service')
+    def test_all_years_disparity_pools_states(self, mock_service, demographics):
+        """Without a year, single and combined filters both compare states over their pooled counts"""
+        from streamlit_backend.api import main
+        from streamlit_backend.data_loader import filter_dataset
+        mock_service.generate_health_insights_async = AsyncMock(return_value={'success': True})
+
+        client.post("/api/ai_insights", json={"disease": "Heart Disease", "demographics": demographics})
+
+        summary = mock_service.generate_health_insights_async.call_args.kwargs['data_summary']
+        counts = filter_dataset(main.get_data(), demographics=demographics).groupby('state', observed=True)['heart_disease']
+        states = counts.agg(['sum', 'count'])
+        rates = states.loc[(states['sum'] >= 11) & (states['count'] >= 11), 'sum'] / states['count']
+        assert summary['max_state'] == rates.idxmax() and summary['min_state'] == rates.idxmin()
+        assert summary['disparity_index'] == pytest.approx(100 * (rates.max() - rates.min()) / rates.max())
+
+
+class TestDisparitiesEndpoint:
+    """Test the precomputed disparity table endpoint"""
+
+    def test_disparity_table(self):
+        """Every year and slice of one disease is returned column-oriented"""
+        response = client.get("/disparities", params={"disease": "Heart Disease"})
+
+        assert response.status_code == 200
+        data = response.json()
+        columns = data['columns']
+        assert set(columns['disease']) == {'heart_disease'}
+        assert None in columns['year']  # all-years rows
+        assert {'all', 'age_group', 'sex', 'race_ethnicity', 'income_group'} <= set(columns['dimension'])
+        assert all(len(values) == data['rows'] for values in columns.values())
+
+    def test_unknown_disease(self):
+        """Unknown diseases return 400"""
+        assert client.get("/disparities", params={"disease": "Flu"}).status_code == 400
+
+    @pytest.mark.parametrize('error,status', [(ValueError("bad table"), 400), (RuntimeError("boom"), 500)])
+    def test_computation_errors(self, error, status):
+        """Validation errors map to 400 and unexpected errors to 500, both with a detail message"""
+        with patch('streamlit_backend.api.main.get_disparities', side_effect=error):
+            response = client.get("/disparities")
+
+        assert response.status_code == status
+        assert response.json()['detail'] == str(error)
+
 
 class TestQAEndpoint:
     """Test question answering endpoint"""
@@ -146,7 +380,7 @@ class TestQAEndpoint:
     def test_qa_with_gemini(self, mock_service):
         """Test QA with Gemini AI"""
         mock_service.is_available.return_value = True
-        mock_service.answer_health_query.return_value = "The disparity is 30%"
+        mock_service.answer_health_query_async = AsyncMock(return_value="The disparity is 30%")
         
         response = client.post("/qa", json={
             "disease": "Cancer",
@@ -256,6 +490,34 @@ class TestDataPrivacy:
         )
         # Note: May or may not have suppression depending on synthetic data
 
+    def test_no_recoverable_suppressed_cells(self):
+        """No state or year line holds exactly one suppressed cell"""
+        response = client.post("/filter", json={"disease": "Cancer", "demographics": {"Age": "0-17"}})
+
+        assert response.status_code == 200
+        agg = pd.DataFrame(response.json())
+        for key in ('state', 'year'):
+            sizes = agg.groupby(key)['suppressed'].agg(['sum', 'size'])
+            assert not ((sizes['sum'] == 1) & (sizes['size'] >= 2)).any()
+        assert agg['suppressed'].sum() != 1
+
+    @pytest.mark.parametrize('disease', ['Heart Disease', 'Diabetes'])
+    @pytest.mark.parametrize('key,levels', [
+        ('sex', ['Female', 'Male', 'Other']),
+        ('Income Level', ['High', 'Low', 'Middle']),
+    ])
+    def test_responses_cannot_be_differenced(self, disease, key, levels):
+        """The unfiltered response minus every level's response never isolates one hidden cell"""
+        responses = [client.post("/filter", json={"disease": disease}).json()]
+        responses += [client.post("/filter", json={"disease": disease, "demographics": {key: level}}).json()
+                      for level in levels]
+
+        flags = pd.concat([pd.DataFrame(r).set_index(['state', 'year'])['suppressed'] for r in responses], axis=1)
+        # A cell missing from a response has no patients, which is public
+        hidden = flags.fillna(False).astype(bool).sum(axis=1)
+        assert hidden.max() > 0
+        assert not (hidden == 1).any()
+
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -0,0 +1,387 @@
+"""
+Unit tests for the data loading layer
+Tests columnar conversion and canonical dtypes
+"""
+import os
+import pytest
+import pandas as pd
+import numpy as np
+
+from streamlit_backend.data_loader import (
+    load_data, resolve_data_path, convert_to_columnar, aggregate_by_state, memory_footprint,
+    filter_dataset, apply_rule_of_11, aggregate_streaming, iter_dataset_chunks, aggregate_diseases, suppress_diseases,
+    validate_batch, append_batch, append_frame, compact_dtypes, trend_statistics,
+)
+from streamlit_backend.cube import CountCube
+from streamlit_backend.indexing import RowIndex
+
+
+class TestCompactSchema:
+    """Test cases for the compact in-memory schema"""
+
+    def test_compact_dtypes(self, csv_dataset):
+        """Compact mode uses categoricals, uint8 flags and a small year dtype"""
+        df = load_data(str(csv_dataset), compact=True)
+
+        for col in ['state', 'age_group', 'sex', 'race_ethnicity', 'income_group']:
+            assert isinstance(df[col].dtype, pd.CategoricalDtype)
+        for col in ['heart_disease', 'diabetes', 'cancer']:
+            assert df[col].dtype == 'uint8'
+        assert df['year'].dtype == 'int16'
+
+    def test_compact_aggregates_match(self, csv_dataset):
+        """Compact and default schemas produce the same aggregates"""
+        default = aggregate_by_state(load_data(str(csv_dataset)), 'diabetes')
+        compact = aggregate_by_state(load_data(str(csv_dataset), compact=True), 'diabetes')
+
+        assert len(compact) == len(default)
+        assert compact['cases'].tolist() == default['cases'].tolist()
+        assert compact['population'].tolist() == default['population'].tolist()
+
+    def test_memory_footprint_report(self, csv_dataset):
+        """Footprint report covers every column and shrinks in compact mode"""
+        default = memory_footprint(load_data(str(csv_dataset)))
+        compact = memory_footprint(load_data(str(csv_dataset), compact=True))
+
+        assert set(compact['columns']) == set(default['columns'])
+        assert compact['rows'] == default['rows'] == 40
+        assert compact['total_bytes'] < default['total_bytes']
+
+
+class TestColumnarFormat:
+    """Test cases for columnar conversion and loading"""
+
+    @pytest.mark.parametrize('fmt', ['feather', 'parquet'])
+    def test_roundtrip_matches_csv(self, csv_dataset, fmt):
+        """A converted file is picked up automatically and aggregates identically"""
+        pytest.importorskip('pyarrow')
+        from_csv = load_data(str(csv_dataset))
+
+        out = convert_to_columnar(str(csv_dataset), fmt=fmt)
+        assert resolve_data_path(str(csv_dataset)) == out
+
+        from_columnar = load_data(str(csv_dataset))
+        assert isinstance(from_columnar['state'].dtype, pd.CategoricalDtype)
+        assert from_columnar['heart_disease'].dtype == 'uint8'
+        assert from_columnar['year'].dtype == 'int16'
+
+        expected = aggregate_by_state(from_csv, 'heart_disease')
+        actual = aggregate_by_state(from_columnar, 'heart_disease')
+        assert actual['state'].astype(str).tolist() == expected['state'].tolist()
+        assert actual['cases'].tolist() == expected['cases'].tolist()
+        assert actual['population'].tolist() == expected['population'].tolist()
+
+    def test_stale_columnar_file_is_ignored(self, csv_dataset):
+        """A columnar file older than the CSV is not used"""
+        pytest.importorskip('pyarrow')
+        out = convert_to_columnar(str(csv_dataset))
+        st = os.stat(out)
+        os.utime(out, ns=(st.st_atime_ns, st.st_mtime_ns - 10_000_000_000))
+
+        assert resolve_data_path(str(csv_dataset)) == csv_dataset
+
+
+class TestMultiDiseaseAggregation:
+    """Test cases for single-pass multi-disease aggregation"""
+
+    def test_matches_per_disease_aggregates(self, patient_frame):
+        """One pass yields the same cases/rates as one aggregate_by_state call per disease"""
+        diseases = ['heart_disease', 'diabetes', 'cancer']
+        combined = aggregate_diseases(patient_frame, diseases, groupby=['state', 'age_group'])
+
+        for d in diseases:
+            single = aggregate_by_state(patient_frame, d, groupby=['state', 'age_group'])
+            assert combined[f'{d}_cases'].tolist() == single['cases'].tolist()
+            assert combined[f'{d}_rate'].tolist() == single['rate'].tolist()
+            assert combined['population'].tolist() == single['population'].tolist()
+
+    def test_suppression_is_per_disease(self, patient_frame):
+        """Each disease gets its own suppressed flag and masked cells"""
+        agg = suppress_diseases(aggregate_diseases(patient_frame, ['heart_disease', 'cancer'], groupby=['state']),
+                                ['heart_disease', 'cancer'])
+
+        # 10 heart disease cases per state are suppressed; cancer likewise, population (20) is not
+        assert agg['heart_disease_suppressed'].tolist() == [True, True]
+        assert agg['heart_disease_rate'].isna().all()
+        assert agg['population'].tolist() == [20, 20]
+        assert list(agg.columns) == ['state', 'population', 'heart_disease_cases', 'heart_disease_rate',
+                                     'heart_disease_suppressed', 'cancer_cases', 'cancer_rate', 'cancer_suppressed']
+
+    def test_unknown_disease(self, patient_frame):
+        """Unknown disease columns raise ValueError"""
+        with pytest.raises(ValueError):
+            aggregate_diseases(patient_frame, ['flu'])
+
+
+class TestStreamingAggregation:
+    """Test cases for out-of-core aggregation"""
+
+    @pytest.mark.parametrize('year,demographics,groupby', [
+        (None, None, ['state', 'year']),
+        (2023, {'Age': '65+'}, ['state', 'year']),
+        (2022, {'income_group': 'Low'}, ['state']),
+    ])
+    def test_matches_in_memory_aggregate(self, csv_dataset, year, demographics, groupby):
+        """Merged per-chunk sums equal the in-memory filter + aggregate"""
+        expected = aggregate_by_state(
+            filter_dataset(load_data(str(csv_dataset)), year=year, demographics=demographics), 'heart_disease', groupby)
+        actual = aggregate_streaming(str(csv_dataset), 'heart_disease', year=year, demographics=demographics,
+                                     groupby=groupby, chunk_rows=7)
+
+        assert actual[groupby].astype(str).values.tolist() == expected[groupby].astype(str).values.tolist()
+        assert actual['cases'].tolist() == expected['cases'].tolist()
+        assert actual['population'].tolist() == expected['population'].tolist()
+
+    @pytest.mark.parametrize('fmt', ['feather', 'parquet'])
+    def test_columnar_chunks(self, csv_dataset, fmt):
+        """Columnar files are read in bounded batches and aggregate like the CSV"""
+        pytest.importorskip('pyarrow')
+        expected = aggregate_streaming(str(csv_dataset), 'cancer')
+        out = convert_to_columnar(str(csv_dataset), fmt=fmt)
+
+        assert max(len(c) for c in iter_dataset_chunks(str(out), chunk_rows=6)) == 6
+        actual = aggregate_streaming(str(out), 'cancer', chunk_rows=6)
+        assert actual['cases'].tolist() == expected['cases'].tolist()
+
+    def test_csv_chunks_use_compact_schema(self, csv_dataset):
+        """CSV chunks come back with the same dtypes as a compact load"""
+        expected = load_data(str(csv_dataset), compact=True).dtypes
+        for chunk in iter_dataset_chunks(str(csv_dataset), chunk_rows=7):
+            assert isinstance(chunk['state'].dtype, pd.CategoricalDtype)
+            assert chunk['heart_disease'].dtype == np.uint8
+            assert chunk['year'].dtype == expected['year']
+
+    def test_cube_from_chunks_matches_in_memory(self, csv_dataset):
+        """A cube counted chunk by chunk equals one built from the loaded table"""
+        expected = CountCube.from_frame(load_data(str(csv_dataset), compact=True))
+        actual = CountCube.from_chunks(iter_dataset_chunks(str(csv_dataset), chunk_rows=7))
+
+        assert len(actual) == len(expected)
+        for disease in ('heart_disease', 'cancer'):
+            assert actual.query(disease).equals(expected.query(disease))
+
+    def test_no_matching_rows(self, csv_dataset):
+        """An empty selection yields an empty frame with the aggregate columns"""
+        out = aggregate_streaming(str(csv_dataset), 'diabetes', year=1999)
+        assert out.empty
+        assert list(out.columns) == ['state', 'year', 'cases', 'population', 'rate']
+
+    def test_invalid_requests(self, csv_dataset):
+        """Unknown diseases and filter keys raise ValueError"""
+        with pytest.raises(ValueError):
+            aggregate_streaming(str(csv_dataset), 'flu')
+        with pytest.raises(ValueError):
+            aggregate_streaming(str(csv_dataset), 'diabetes', demographics={'nope': 1})
+
+
+class TestIngestion:
+    """Test cases for batch validation and appends"""
+
+    def test_validate_batch(self, patient_frame):
+        """Batches are checked against the expected schema"""
+        batch = validate_batch(patient_frame.assign(extra=1, year=patient_frame['year'].astype(float)))
+        assert 'extra' not in batch.columns
+        assert batch['year'].dtype == 'int64'
+
+        with pytest.raises(ValueError, match='missing expected columns'):
+            validate_batch(patient_frame.drop(columns=['sex']))
+        with pytest.raises(ValueError, match='missing values'):
+            validate_batch(patient_frame.assign(state=None))
+        with pytest.raises(ValueError, match='0 or 1'):
+            validate_batch(patient_frame.assign(cancer=2))
+        with pytest.raises(ValueError, match='integers'):
+            validate_batch(patient_frame.assign(year='2023a'))
+
+    def test_append_csv(self, csv_dataset, patient_frame):
+        """Appending to a CSV yields the concatenated dataset"""
+        batch = patient_frame.assign(year=2024, patient_id=patient_frame['patient_id'] + 100)
+        append_batch(batch, str(csv_dataset))
+
+        df = load_data(str(csv_dataset))
+        assert len(df) == 80
+        assert df['year'].tolist() == patient_frame['year'].tolist() + [2024] * 40
+
+    def test_append_shard_directory(self, tmp_path, patient_frame):
+        """A directory of shards gets one new shard per batch"""
+        shards = tmp_path / 'shards'
+        shards.mkdir()
+        patient_frame.to_csv(shards / 'part-00000.csv', index=False)
+
+        written = append_batch(patient_frame.assign(year=2024), str(shards))
+
+        assert written.name == 'part-00001.csv'
+        out = aggregate_streaming(str(shards), 'heart_disease', groupby=['year'])
+        assert out['year'].tolist() == [2022, 2023, 2024]
+
+    def test_append_frame_extends_categories(self, patient_frame):
+        """New categorical values extend the sorted categories and dtypes are kept"""
+        df = compact_dtypes(patient_frame)
+        batch = validate_batch(patient_frame.assign(state='AK'))
+
+        out = append_frame(df, batch)
+
+        assert len(out) == 80
+        assert list(out['state'].cat.categories) == ['AK', 'CA', 'TX']
+        assert out['year'].dtype == df['year'].dtype
+        assert out['heart_disease'].dtype == df['heart_disease'].dtype
+
+
+class TestTrendStatistics:
+    """Test cases for per-state trend statistics"""
+
+    @staticmethod
+    def _aggregate(rates, state='CA'):
+        years = list(range(2015, 2015 + len(rates)))
+        cases = [None if r is None else int(r * 1000) for r in rates]
+        agg = pd.DataFrame({'state': state, 'year': years, 'cases': [5 if c is None else c for c in cases],
+                            'population': 1000})
+        agg['rate'] = agg['cases'] / agg['population']
+        return apply_rule_of_11(agg)
+
+    def test_statistics(self):
+        """Year-over-year change, rolling mean and slope match their definitions"""
+        out = trend_statistics(self._aggregate([0.10, 0.12, 0.14, 0.16]), window=2)
+
+        assert out['yoy_change'].round(6).tolist()[1:] == [0.02, 0.02, 0.02]
+        assert pd.isna(out['yoy_change'].iloc[0])
+        assert out['rolling_mean'].round(6).tolist()[1:] == [0.11, 0.13, 0.15]
+        assert out['slope'].round(6).unique().tolist() == [0.02]
+
+    def test_suppressed_cells_do_not_leak(self):
+        """Changes and windows touching a suppressed year are null; the slope uses visible years only"""
+        out = trend_statistics(self._aggregate([0.10, None, 0.14, 0.16, 0.18]), window=2)
+
+        assert out['suppressed'].tolist() == [False, True, False, False, False]
+        assert out['yoy_change'].isna().tolist() == [True, True, True, False, False]
+        assert out['rolling_mean'].isna().tolist() == [True, True, True, False, False]
+        assert round(out['slope'].iloc[0], 6) == 0.02
+
+    def test_missing_years_filled(self):
+        """States lacking a year get a suppressed, zero-population cell"""
+        agg = pd.concat([self._aggregate([0.10, 0.12]), self._aggregate([0.20], state='TX')], ignore_index=True)
+        out = trend_statistics(agg, years=[2015, 2016, 2017])
+
+        assert out['state'].tolist() == ['CA'] * 3 + ['TX'] * 3
+        tx_2016 = out[(out['state'] == 'TX') & (out['year'] == 2016)].iloc[0]
+        assert tx_2016['suppressed'] and tx_2016['population'] == 0 and pd.isna(tx_2016['rate'])
+        assert out.loc[out['state'] == 'TX', 'slope'].isna().all()
+
+    def test_invalid_window(self):
+        """A non-positive window raises ValueError"""
+        with pytest.raises(ValueError):
+            trend_statistics(self._aggregate([0.10, 0.12]), window=0)
+
+
+class TestRowIndex:
+    """Test cases for bitmap-indexed filtering"""
+
+    @pytest.mark.parametrize('year,demographics', [
+        (None, None),
+        (2023, None),
+        (2022, {'Age': '65+'}),
+        (None, {'Race': 'Black', 'income_group': 'Middle'}),
+        (2023, {'sex': 'Other'}),
+    ])
+    def test_indexed_filter_matches_scan(self, patient_frame, year, demographics):
+        """Bitmap intersection selects exactly the rows the mask path does"""
+        index = RowIndex.from_frame(patient_frame)
+
+        expected = filter_dataset(patient_frame, year=year, demographics=demographics)
+        actual = filter_dataset(patient_frame, year=year, demographics=demographics, index=index)
+
+        assert actual.equals(expected)
+        assert index.count(year=year, demographics=demographics) == len(expected)
+
+    def test_index_for_other_frame_is_ignored(self, patient_frame):
+        """An index built from a different frame is not used"""
+        index = RowIndex.from_frame(patient_frame.head(10))
+        out = filter_dataset(patient_frame, year=2023, index=index)
+        assert len(out) == 20
+
+    def test_unindexed_key_falls_back(self, patient_frame):
+        """Filters on unindexed columns use the scan path and still validate keys"""
+        index = RowIndex.from_frame(patient_frame)
+        assert index.rows(demographics={'patient_id': 3}) is None
+        with pytest.raises(ValueError):
+            filter_dataset(patient_frame, demographics={'nope': 1}, index=index)
+
+
+class TestRuleOf11:
+    """Test cases for Rule-of-11 suppression"""
+
+    def test_suppresses_small_cells_without_mutating_input(self):
+        """Small cells are suppressed in the output and the input frame is unchanged"""
+        agg = pd.DataFrame({'cases': [5, 20], 'population': [30, 40], 'rate': [5 / 30, 0.5]}, index=[3, 7])
+        before = agg.copy()
+
+        out = apply_rule_of_11(agg)
+
+        assert out['suppressed'].tolist() == [True, False]
+        assert pd.isna(out.loc[0, 'rate']) and pd.isna(out.loc[0, 'cases'])
+        assert out.loc[1, 'rate'] == 0.5
+        assert list(out.index) == [0, 1]
+        assert agg.equals(before)
+
+    def test_multiple_case_columns(self):
+        """Several case columns are suppressed independently against one population"""
+        agg = pd.DataFrame({'population': [30, 40, 5], 'a_cases': [5, 20, 3], 'b_cases': [12, 9, 4]})
+
+        out = apply_rule_of_11(agg, case_col=['a_cases', 'b_cases'])
+
+        assert out['a_suppressed'].tolist() == [True, False, True]
+        assert out['b_suppressed'].tolist() == [False, True, True]
+        assert out['a_cases'].isna().tolist() == [True, False, True]
+        assert out['b_rate'].isna().all()
+        assert 'a_cases' in agg and 'a_suppressed' not in agg
+
+    def test_inplace_matches_copy(self):
+        """In-place suppression yields the copy result on the caller's frame"""
+        agg = pd.DataFrame({'cases': [5, 20], 'population': [30, 40], 'rate': [5 / 30, 0.5]}, index=[3, 7])
+        expected = apply_rule_of_11(agg)
+
+        out = apply_rule_of_11(agg, inplace=True)
+
+        assert out is agg
+        assert list(out.index) == [3, 7]
+        assert out.reset_index(drop=True).equals(expected)
+
+    def test_unsuppressed_cases_keep_dtype(self):
+        """Integer case columns are only converted when a cell is masked"""
+        out = apply_rule_of_11(pd.DataFrame({'cases': [12, 20], 'population': [30, 40], 'rate': [0.4, 0.5]}))
+        assert out['cases'].dtype == 'int64'
+        assert out['suppressed'].tolist() == [False, False]
+
+    def test_missing_case_column_keeps_column_order(self):
+        """A missing case column is added (fully suppressed) before the suppressed flag"""
+        out = apply_rule_of_11(pd.DataFrame({'state': ['CA', 'NY'], 'population': [30, 40], 'rate': [0.4, 0.5]}))
+        assert list(out.columns) == ['state', 'population', 'rate', 'cases', 'suppressed']
+        assert out['cases'].dtype == 'float64' and out['cases'].isna().all()
+        assert out['rate'].isna().all()
+
+    def test_nullable_columns_keep_dtypes(self):
+        """Nullable integer input keeps its dtype, with a nullable boolean flag"""
+        agg = pd.DataFrame({
+            'cases': pd.array([5, 20, None], dtype='Int64'),
+            'population': pd.array([30, 40, 50], dtype='Int64'),
+            'rate': [5 / 30, 0.5, None],
+        })
+
+        out = apply_rule_of_11(agg)
+
+        assert out['cases'].dtype == 'Int64' and out['suppressed'].dtype == 'boolean'
+        assert out['suppressed'].tolist() == [True, False, False]
+        assert out['cases'].isna().tolist() == [True, False, True]
+        assert out['rate'].isna().tolist() == [True, False, True]
+
+    def test_mismatched_column_lists(self):
+        """Rate and suppressed column lists must match the case columns"""
+        with pytest.raises(ValueError):
+            apply_rule_of_11(pd.DataFrame({'population': [20]}), case_col=['a', 'b'], rate_col=['a_rate'])
+
+    def test_filter_without_predicates_returns_frame(self, patient_frame):
+        """No predicates means no copy"""
+        assert filter_dataset(patient_frame) is patient_frame
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
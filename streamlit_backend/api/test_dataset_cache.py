@@ -0,0 +1,206 @@
+"""
+Unit tests for the process-wide caches
+Tests load-once behaviour, file-change invalidation, LRU/TTL bounds and single-flight
+"""
+import os
+import threading
+import time
+import pytest
+import pandas as pd
+
+from streamlit_backend.cache import DatasetCache, ResultCache
+
+
+def _write_dataset(path, n=20):
+    df = pd.DataFrame({
+        'patient_id': range(1, n + 1),
+        'state': ['CA'] * n,
+        'year': [2023] * n,
+        'age_group': ['65+'] * n,
+        'sex': ['Female'] * n,
+        'race_ethnicity': ['White'] * n,
+        'income_group': ['Low'] * n,
+        'heart_disease': [1] * n,
+        'diabetes': [0] * n,
+        'cancer': [0] * n,
+    })
+    df.to_csv(path, index=False)
+
+
+class TestDatasetCache:
+    """Test cases for DatasetCache"""
+
+    def test_loads_once(self, tmp_path):
+        """Repeated gets reuse the same DataFrame"""
+        path = tmp_path / 'data.csv'
+        _write_dataset(path)
+        cache = DatasetCache(str(path))
+
+        first = cache.get()
+        second = cache.get()
+
+        assert first is second
+        stats = cache.stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == 1
+        assert stats['reloads'] == 0
+        assert stats['version'] == 1
+
+    def test_reloads_when_file_changes(self, tmp_path):
+        """A changed file size/mtime triggers a reload and bumps the version"""
+        path = tmp_path / 'data.csv'
+        _write_dataset(path, n=30)
+        cache = DatasetCache(str(path))
+        assert len(cache.get()) == 30
+
+        # Shrinking rules out an append, so the whole file is re-read
+        _write_dataset(path, n=20)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+        assert len(cache.get()) == 20
+        assert cache.reloads == 1
+        assert cache.version == 2
+
+    def test_reload_listeners_and_derived(self, tmp_path):
+        """Derived artifacts are rebuilt and listeners notified on reload"""
+        path = tmp_path / 'data.csv'
+        _write_dataset(path, n=20)
+        cache = DatasetCache(str(path))
+        versions = []
+        cache.on_reload(versions.append)
+
+        assert cache.derived('rows', len) == 20
+        assert cache.derived('rows', lambda df: -1) == 20  # memoized per version
+
+        _write_dataset(path, n=25)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+        assert cache.derived('rows', len) == 25
+        assert versions == [1, 2]
+
+    def test_ingest_updates_derived(self, tmp_path):
+        """Ingested rows reach the file, the cached frame and updatable artifacts"""
+        path = tmp_path / 'data.csv'
+        _write_dataset(path, n=20)
+        cache = DatasetCache(str(path))
+        versions = []
+        cache.on_reload(versions.append)
+        assert cache.derived('rows', len, update=lambda rows, batch: rows + len(batch)) == 20
+        assert cache.derived('other', len) == 20
+
+        batch = pd.read_csv(path).assign(year=2024).head(5)
+        assert cache.ingest(batch) == 2
+
+        assert len(cache.get()) == 25
+        assert len(pd.read_csv(path)) == 25
+        assert cache.derived('rows', lambda df: -1) == 25  # updated, not rebuilt
+        assert cache.derived('other', len) == 25
+        assert versions == [1, 2]
+        assert cache.stats()['appends'] == 1
+        assert cache.reloads == 0
+
+    def test_ingest_rejects_invalid_batch(self, tmp_path):
+        """A batch failing validation leaves the file and cache untouched"""
+        path = tmp_path / 'data.csv'
+        _write_dataset(path, n=20)
+        cache = DatasetCache(str(path))
+        cache.get()
+
+        with pytest.raises(ValueError):
+            cache.ingest(pd.read_csv(path).drop(columns=['cancer']))
+        assert len(pd.read_csv(path)) == 20
+        assert cache.version == 1
+
+    def test_external_append_read_incrementally(self, tmp_path):
+        """Rows appended to the CSV by another process are parsed without a full reload"""
+        path = tmp_path / 'data.csv'
+        _write_dataset(path, n=20)
+        cache = DatasetCache(str(path))
+        assert len(cache.get()) == 20
+
+        rows = pd.read_csv(path).head(3).assign(state='TX')
+        rows.to_csv(path, mode='a', header=False, index=False)
+
+        df = cache.get()
+        assert len(df) == 23
+        assert df['state'].tolist()[-3:] == ['TX'] * 3
+        assert cache.stats()['appends'] == 1
+        assert cache.reloads == 0
+
+    def test_rewritten_file_reloads(self, tmp_path):
+        """A file that grew but was not only appended to is reloaded in full"""
+        path = tmp_path / 'data.csv'
+        _write_dataset(path, n=20)
+        cache = DatasetCache(str(path))
+        cache.get()
+
+        df = pd.read_csv(path)
+        pd.concat([df.assign(state='NY'), df.head(5)]).to_csv(path, index=False)
+
+        assert cache.get()['state'].iloc[0] == 'NY'
+        assert cache.reloads == 1
+        assert cache.stats()['appends'] == 0
+
+
+class TestResultCache:
+    """Test cases for ResultCache"""
+
+    def test_lru_eviction(self):
+        """Least recently used entries are evicted past maxsize"""
+        cache = ResultCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.evictions == 1
+
+    def test_ttl_expiry(self):
+        """Entries expire after the TTL"""
+        cache = ResultCache(maxsize=4, ttl=0.01)
+        cache.set('a', 1)
+        time.sleep(0.02)
+        assert cache.get('a') is None
+
+    def test_single_flight(self):
+        """Concurrent identical requests run the computation once"""
+        cache = ResultCache(maxsize=4)
+        calls = []
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            release.wait(1)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join()
+
+        assert results == ['value'] * 5
+        assert len(calls) == 1
+        assert cache.stats()['coalesced'] == 4
+
+    def test_errors_are_not_cached(self):
+        """A failed computation is retried on the next call"""
+        cache = ResultCache(maxsize=4)
+
+        def fail():
+            raise ValueError('boom')
+
+        with pytest.raises(ValueError):
+            cache.get_or_compute('k', fail)
+        assert cache.get_or_compute('k', lambda: 1) == 1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
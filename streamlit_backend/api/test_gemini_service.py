@@ -3,6 +3,9 @@ Unit tests for Gemini AI Service
 Tests the AI integration, fallback logic, and error handling
 """
 import os
+import asyncio
+import threading
+import time
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 import pandas as pd
@@ -13,6 +16,7 @@ os.environ['ENABLE_GEMINI_AI'] = 'true'
 os.environ['FALLBACK_TO_ML'] = 'true'
 
 from streamlit_backend.api.gemini_service import GeminiAIService, get_gemini_service
+from streamlit_backend.api.response_cache import PromptResponseCache
 
 
 class TestGeminiAIService:
@@ -217,5 +221,192 @@ class TestGeminiAIService:
         assert 'Pattern 1' in call_args
 
 
+class StubResponse:
+    """Minimal stand-in for a Gemini response"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class SlowAsyncModel:
+    """Local stub exposing the client's async API with a configurable delay"""
+
+    def __init__(self, delay=0.0, text="Stub insight"):
+        self.delay = delay
+        self.text = text
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return StubResponse(self.text)
+        finally:
+            self.in_flight -= 1
+
+
+class SlowSyncModel:
+    """Local stub with only the blocking API"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            return StubResponse("Sync stub answer")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class TestGeminiAsync:
+    """Test cases for async calls, deadlines and concurrency limits"""
+
+    def _service(self, model, timeout=1.0, max_concurrency=8):
+        service = GeminiAIService()
+        service.model = model
+        service.timeout = timeout
+        service.max_concurrency = max_concurrency
+        return service
+
+    def test_async_insights_success(self):
+        """Native async API result is returned as Gemini insights"""
+        service = self._service(SlowAsyncModel(text="Async insight"))
+        result = asyncio.run(service.generate_health_insights_async({'total_cases': 10}, 'Diabetes', 2023, []))
+
+        assert result['source'] == 'gemini_ai'
+        assert result['insights'] == "Async insight"
+
+    def test_async_insights_deadline_falls_back(self):
+        """A call past the deadline returns the ML-only analysis"""
+        service = self._service(SlowAsyncModel(delay=1.0), timeout=0.05)
+        result = asyncio.run(service.generate_health_insights_async({'total_cases': 10}, 'Diabetes', 2023, []))
+
+        assert result['source'] == 'ml_only'
+
+    def test_sync_model_runs_in_executor(self):
+        """Models without an async API are called off the event loop"""
+        service = self._service(SlowSyncModel(delay=0.01))
+        answer = asyncio.run(service.answer_health_query_async("q?", pd.DataFrame({'rate': [1]}), 'Cancer', 2023))
+        assert answer == "Sync stub answer"
+
+    def test_async_qa_deadline_falls_back(self):
+        """A QA call past the deadline returns the statistical answer"""
+        service = self._service(SlowSyncModel(delay=0.5), timeout=0.05)
+        df = pd.DataFrame({'state': ['CA'], 'rate': [0.1]})
+        answer = asyncio.run(service.answer_health_query_async("Why?", df, 'Cancer', 2023))
+        assert 'Enhanced AI analysis is temporarily unavailable' in answer
+
+    def test_concurrency_is_bounded(self):
+        """No more than max_concurrency calls are in flight at once"""
+        model = SlowAsyncModel(delay=0.02)
+        service = self._service(model, max_concurrency=2)
+
+        async def run_many():
+            await asyncio.gather(*[
+                service.generate_health_insights_async({'total_cases': i}, 'Diabetes', 2023, [])
+                for i in range(6)
+            ])
+
+        asyncio.run(run_many())
+        assert model.max_in_flight == 2
+
+    def test_timed_out_sync_call_keeps_its_slot(self):
+        """A sync call still running past its deadline keeps later calls from starting"""
+        model = SlowSyncModel(delay=0.2)
+        service = self._service(model, timeout=0.05, max_concurrency=1)
+
+        async def run_many():
+            first = await service.answer_health_query_async("q1?", pd.DataFrame({'rate': [1]}), 'Cancer', 2023)
+            second = await service.answer_health_query_async("q2?", pd.DataFrame({'rate': [1]}), 'Cancer', 2023)
+            return first, second
+
+        answers = asyncio.run(run_many())
+        assert all('temporarily unavailable' in a for a in answers)
+        assert model.max_in_flight == 1
+
+
+class TestResponseCache:
+    """Test cases for the prompt-fingerprint response cache"""
+
+    @patch('streamlit_backend.api.gemini_service.genai')
+    def test_repeat_prompt_served_from_cache(self, mock_genai):
+        """The same prompt and model only reach Gemini once"""
+        mock_model = Mock()
+        mock_model.generate_content.return_value = StubResponse("Cached insight")
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        service = GeminiAIService()
+        for _ in range(3):
+            result = service.generate_health_insights({'total_cases': 5}, 'Diabetes', 2023, [])
+            assert result['insights'] == "Cached insight"
+
+        assert mock_model.generate_content.call_count == 1
+        stats = service.response_cache.stats()
+        assert stats['memory_hits'] == 2
+        assert stats['misses'] == 1
+
+    def test_fingerprint_depends_on_model(self):
+        """Different models never share entries"""
+        a = PromptResponseCache.fingerprint('gemini-pro', 'prompt')
+        b = PromptResponseCache.fingerprint('gemini-2.5-flash', 'prompt')
+        assert a != b
+        assert a == PromptResponseCache.fingerprint('gemini-pro', 'prompt')
+
+    def test_sqlite_tier_survives_new_instance(self, tmp_path):
+        """Entries written to disk are visible to another cache instance"""
+        path = str(tmp_path / 'responses.sqlite')
+        first = PromptResponseCache(maxsize=4, sqlite_path=path)
+        first.set('key', 'text')
+
+        second = PromptResponseCache(maxsize=4, sqlite_path=path)
+        assert second.get('key') == 'text'
+        assert second.stats()['disk_hits'] == 1
+
+    def test_disk_size_bound_and_ttl(self, tmp_path):
+        """The disk tier keeps at most disk_maxsize entries and honours the TTL"""
+        path = str(tmp_path / 'responses.sqlite')
+        cache = PromptResponseCache(maxsize=1, sqlite_path=path, disk_maxsize=2)
+        for i in range(4):
+            cache.set(f'k{i}', f'v{i}')
+        assert cache.stats()['disk_size'] == 2
+
+        expiring = PromptResponseCache(maxsize=1, ttl=0.01, sqlite_path=str(tmp_path / 'ttl.sqlite'))
+        expiring.set('k', 'v')
+        time.sleep(0.02)
+        assert expiring.get('k') is None
+
+    def test_async_disk_access_runs_off_loop(self, tmp_path):
+        """Async lookups and writes reach SQLite from a worker thread, not the event loop's"""
+        path = str(tmp_path / 'responses.sqlite')
+        PromptResponseCache(maxsize=4, sqlite_path=path).set('key', 'text')
+        cache = PromptResponseCache(maxsize=4, sqlite_path=path)
+        threads = []
+        for name in ('_disk_get', '_disk_set'):
+            method = getattr(cache, name)
+            setattr(cache, name, lambda *args, method=method: threads.append(threading.get_ident()) or method(*args))
+
+        async def run():
+            loop_thread = threading.get_ident()
+            text = await cache.get_async('key')
+            await cache.set_async('other', 'value')
+            return loop_thread, text
+
+        loop_thread, text = asyncio.run(run())
+        assert text == 'text'
+        assert cache.stats()['disk_hits'] == 1
+        assert len(threads) == 2 and loop_thread not in threads
+        assert PromptResponseCache(maxsize=4, sqlite_path=path).get('other') == 'value'
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
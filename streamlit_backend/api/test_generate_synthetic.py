@@ -0,0 +1,96 @@
+"""
+Unit tests for the synthetic data generator
+Tests the vectorized generator against the per-record reference
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from streamlit_backend.data_loader import load_data
+from streamlit_backend.generate_synthetic import (
+    generate_dataset, generate_patient_record, write_dataset, COLUMNS, STATES, YEARS, DISEASES,
+)
+
+
+class TestVectorizedGenerator:
+    """Test cases for the vectorized dataset generator"""
+
+    def test_schema_and_ids(self):
+        """Columns, ids and category values match the original layout"""
+        df = generate_dataset(n=5000, seed=1)
+
+        assert list(df.columns) == COLUMNS
+        assert df['patient_id'].tolist() == list(range(1, 5001))
+        assert set(df['state']) <= set(STATES)
+        assert set(df['year']) <= set(YEARS)
+        for disease in DISEASES:
+            assert set(df[disease].unique()) <= {0, 1}
+
+    def test_seeded_output_is_reproducible(self):
+        """The same seed yields the same dataset"""
+        assert generate_dataset(n=2000, seed=7).equals(generate_dataset(n=2000, seed=7))
+        assert not generate_dataset(n=2000, seed=7).equals(generate_dataset(n=2000, seed=8))
+
+    def test_rates_match_reference_generator(self):
+        """Disease rates by age group agree with the per-record generator"""
+        n = 40000
+        vectorized = generate_dataset(n=n, seed=3)
+        rng = np.random.default_rng(3)
+        reference = pd.DataFrame([generate_patient_record(rng) for _ in range(n)])
+
+        for disease in DISEASES:
+            expected = reference.groupby('age_group')[disease].mean()
+            actual = vectorized.groupby('age_group')[disease].mean()
+            assert np.allclose(actual, expected, atol=0.015)
+
+    def test_chunked_output_streams_to_csv(self, tmp_path):
+        """Chunked generation writes every row once with a single header"""
+        out = tmp_path / 'synthetic.csv'
+        assert generate_dataset(n=2500, seed=5, out_path=str(out), chunk_size=1000) is None
+
+        df = pd.read_csv(out)
+        assert list(df.columns) == COLUMNS
+        assert df['patient_id'].tolist() == list(range(1, 2501))
+
+
+class TestChunkedWriter:
+    """Test cases for the parallel chunked writer"""
+
+    def test_output_does_not_depend_on_worker_count(self, tmp_path):
+        """Chunks are seeded independently, so one and two workers write the same file"""
+        serial = write_dataset(3000, seed=9, out_path=str(tmp_path / 'serial.csv'), chunk_size=700)
+        parallel = write_dataset(3000, seed=9, out_path=str(tmp_path / 'parallel.csv'), chunk_size=700, workers=2)
+
+        assert serial.read_bytes() == parallel.read_bytes()
+
+    @pytest.mark.parametrize('fmt', ['parquet', 'feather'])
+    def test_columnar_output_loads_in_compact_schema(self, tmp_path, fmt):
+        """Streamed columnar files are read by load_data with the compact dtypes"""
+        pytest.importorskip('pyarrow')
+        out = write_dataset(2500, seed=2, out_path=str(tmp_path / f'synthetic.{fmt}'), chunk_size=1000)
+        csv = write_dataset(2500, seed=2, out_path=str(tmp_path / 'synthetic.csv'), chunk_size=1000)
+
+        df = load_data(str(out))
+        assert len(df) == 2500
+        assert isinstance(df['state'].dtype, pd.CategoricalDtype)
+        assert df['cancer'].dtype == 'uint8'
+        assert df['heart_disease'].sum() == pd.read_csv(csv)['heart_disease'].sum()
+
+    def test_sharded_output(self, tmp_path):
+        """Sharded mode writes one file per chunk with contiguous patient ids"""
+        out = write_dataset(2500, seed=4, out_path=str(tmp_path / 'shards'), chunk_size=1000, fmt='csv',
+                            shards=True, workers=2)
+
+        shards = sorted(out.glob('part-*.csv'))
+        assert len(shards) == 3
+        ids = pd.concat([pd.read_csv(p) for p in shards])['patient_id']
+        assert ids.tolist() == list(range(1, 2501))
+
+    def test_unknown_format_rejected(self, tmp_path):
+        """Unsupported output formats raise ValueError"""
+        with pytest.raises(ValueError):
+            write_dataset(10, out_path=str(tmp_path / 'out.json'))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,89 @@
+"""
+Unit tests for pattern mining utilities
+Tests transaction encoding and frequent-itemset mining
+"""
+import pytest
+import numpy as np
+import pandas as pd
+
+from streamlit_backend.pattern_mining import make_transactions, run_apriori, bitset_apriori, MINING_ALGORITHMS
+
+
+@pytest.fixture
+def mining_frame():
+    """Patient frame large enough that most groups survive Rule-of-11 suppression"""
+    rng = np.random.default_rng(0)
+    n = 6000
+    return pd.DataFrame({
+        'patient_id': np.arange(n),
+        'state': rng.choice(['CA', 'TX'], n),
+        'year': rng.choice([2022, 2023], n),
+        'age_group': rng.choice(['18-34', '65+'], n),
+        'sex': rng.choice(['Female', 'Male'], n),
+        'race_ethnicity': rng.choice(['White', 'Black'], n),
+        'income_group': rng.choice(['Low', 'High'], n),
+        'diabetes': rng.binomial(1, 0.4, n),
+    })
+
+
+class TestMakeTransactions:
+    """Test cases for transaction encoding"""
+
+    def test_one_hot_encoding(self, mining_frame):
+        """Each transaction has exactly one item per demographic column"""
+        tx = make_transactions(mining_frame, disease='diabetes')
+
+        assert not tx.empty
+        assert all(dtype == bool for dtype in tx.dtypes)
+        assert list(tx.columns) == sorted(tx.columns)
+        for col in ['income_group', 'age_group', 'sex', 'race_ethnicity']:
+            item_cols = [c for c in tx.columns if c.startswith(f'{col}=')]
+            assert (tx[item_cols].sum(axis=1) == 1).all()
+        assert 'has_diabetes' in tx.columns
+
+    def test_all_suppressed_returns_empty(self, mining_frame):
+        """Groups below the Rule-of-11 threshold never become transactions"""
+        tx = make_transactions(mining_frame.head(20), disease='diabetes')
+        assert tx.empty
+
+
+class TestMiningEngines:
+    """Test cases for the pluggable frequent-itemset engines"""
+
+    @pytest.mark.parametrize('min_support', [0.3, 0.1, 0.02])
+    def test_engines_agree(self, min_support):
+        """All engines find the same itemsets with the same support"""
+        rng = np.random.default_rng(1)
+        tx = pd.DataFrame(rng.random((500, 10)) < np.linspace(0.1, 0.7, 10),
+                          columns=[f'item{i}' for i in range(10)])
+
+        results = {}
+        for name, engine in MINING_ALGORITHMS.items():
+            fi = engine(tx, min_support=min_support, use_colnames=True)
+            results[name] = {itemset: round(sup, 9) for sup, itemset in zip(fi['support'], fi['itemsets'])}
+
+        assert results['bitset'] == results['apriori'] == results['fpgrowth']
+
+    def test_bitset_max_len(self):
+        """max_len caps the itemset size"""
+        tx = pd.DataFrame({'a': [True] * 4, 'b': [True] * 4, 'c': [True] * 4})
+        fi = bitset_apriori(tx, min_support=0.5, use_colnames=True, max_len=2)
+        assert fi['itemsets'].map(len).max() == 2
+
+    def test_unknown_algorithm(self, mining_frame):
+        """Unknown engines are rejected"""
+        tx = make_transactions(mining_frame, disease='diabetes')
+        with pytest.raises(ValueError):
+            run_apriori(tx, algorithm='eclat')
+
+    @pytest.mark.parametrize('algorithm', ['apriori', 'fpgrowth', 'bitset'])
+    def test_run_apriori_rules(self, mining_frame, algorithm):
+        """Every engine feeds association_rules"""
+        tx = make_transactions(mining_frame, disease='diabetes')
+        fi, rules = run_apriori(tx, min_support=0.05, min_threshold=0.3, algorithm=algorithm)
+        assert not fi.empty
+        assert {'antecedents', 'consequents', 'lift'} <= set(rules.columns)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
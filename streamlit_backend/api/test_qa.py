@@ -0,0 +1,140 @@
+"""
+Unit tests for the transformer QA module
+Tests lazy pipeline loading, batching and context building with a stub pipeline
+"""
+import time
+import pytest
+import pandas as pd
+
+import streamlit_backend.qa as qa
+
+
+class StubPipeline:
+    """Stands in for a Hugging Face question-answering pipeline"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, inputs=None, question=None, context=None, **kwargs):
+        self.calls.append((inputs, question, context, kwargs))
+        if isinstance(inputs, list):
+            return [{'answer': 'mississippi', 'score': 0.9} for _ in inputs]
+        return {'answer': 'mississippi', 'score': 0.9}
+
+
+@pytest.fixture
+def stub_pipeline(monkeypatch):
+    built = []
+
+    def build():
+        pipe = StubPipeline()
+        built.append(pipe)
+        return pipe
+
+    monkeypatch.setattr(qa, '_build_pipeline', build)
+    qa.unload()
+    yield built
+    qa.unload()
+
+
+@pytest.fixture
+def suppressed_agg():
+    return pd.DataFrame({
+        'state': ['MS', 'CA'],
+        'year': [2023, 2023],
+        'cases': [40.0, None],
+        'population': [200, 5],
+        'rate': [0.2, None],
+        'suppressed': [False, True],
+    })
+
+
+class TestLazyPipeline:
+    """Test cases for lazy QA model loading"""
+
+    def test_import_does_not_load_model(self, stub_pipeline):
+        """Nothing is built until the first query"""
+        assert not qa.is_loaded()
+        assert stub_pipeline == []
+
+    def test_pipeline_built_once_and_shared(self, stub_pipeline, suppressed_agg):
+        """Repeated queries reuse one pipeline"""
+        qa.answer_query(suppressed_agg, 'Which state has the highest rate?')
+        qa.answer_query(suppressed_agg, 'Which state has the lowest rate?')
+
+        assert len(stub_pipeline) == 1
+        assert len(stub_pipeline[0].calls) == 2
+
+    def test_warm_up_and_unload(self, stub_pipeline):
+        """warm_up builds the pipeline and unload releases it"""
+        qa.warm_up()
+        assert qa.is_loaded()
+        qa.unload()
+        assert not qa.is_loaded()
+
+    def test_idle_unload(self, stub_pipeline, monkeypatch):
+        """The pipeline is released after the idle timeout"""
+        monkeypatch.setattr(qa, 'IDLE_UNLOAD_SECONDS', 0.05)
+        qa.warm_up()
+        # Poll rather than sleep a fixed time: the timer thread may run late on a busy machine
+        deadline = time.monotonic() + 5
+        while qa.is_loaded() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not qa.is_loaded()
+
+
+class TestBatchedAnswers:
+    """Test cases for batched answering and context building"""
+
+    def test_batch_runs_one_pipeline_call(self, stub_pipeline, suppressed_agg):
+        """All answerable queries go through the model in one call"""
+        answers = qa.answer_queries(suppressed_agg, ['Where is the rate highest?', 'Which state?', 'What in 2023?'],
+                                    batch_size=4, max_seq_len=256)
+
+        assert len(answers) == 3
+        assert all(a.startswith('Mississippi') for a in answers)
+        calls = stub_pipeline[0].calls
+        assert len(calls) == 1
+        inputs, _, _, kwargs = calls[0]
+        assert len(inputs) == 3
+        assert kwargs == {'batch_size': 4, 'max_seq_len': 256}
+
+    def test_all_suppressed(self, stub_pipeline, suppressed_agg):
+        """Fully suppressed data never reaches the model"""
+        df = suppressed_agg.assign(suppressed=True)
+        answers = qa.answer_queries(df, ['a', 'b'])
+        assert all('privacy' in a for a in answers)
+        assert stub_pipeline == []
+
+    def test_context_matches_row_sentences(self, suppressed_agg):
+        """Context describes each unsuppressed row"""
+        context = qa.build_context(suppressed_agg[~suppressed_agg['suppressed']])
+        assert context == ("In MS during the year 2023, there were 40 cases out of a population of 200, "
+                           "resulting in a rate of 20.000%.")
+
+    def test_context_prefiltered_by_mentions(self):
+        """States and years named in the query restrict the context"""
+        df = pd.DataFrame({'state': ['MS', 'CA', 'TX'], 'year': [2023, 2023, 2022],
+                           'cases': [40, 12, 30], 'population': [200, 100, 300], 'rate': [0.2, 0.12, 0.1]})
+
+        context = qa.build_context(df, 'How does Mississippi compare to TX?')
+        assert 'In MS' in context and 'In TX' in context and 'In CA' not in context
+
+        context = qa.build_context(df, 'What happened in 2022?')
+        assert context.count('In ') == 1 and 'In TX' in context
+
+        # Nothing matches: no context rather than other states' rows
+        assert qa.build_context(df, 'And Ohio?') == ""
+        assert qa.build_context(df, 'What about TX in 2023?') == ""
+
+    def test_unmatched_mentions_not_answered(self, stub_pipeline, suppressed_agg):
+        """Questions about a suppressed or absent state get the not-enough-data answer"""
+        answers = qa.answer_queries(suppressed_agg, ['What about CA?', 'And Ohio?', 'What about Mississippi?'])
+
+        assert answers[:2] == [qa.NOT_ENOUGH_DATA] * 2
+        assert answers[2].startswith('Mississippi')
+        assert len(stub_pipeline[0].calls[0][0]) == 1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
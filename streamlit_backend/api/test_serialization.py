@@ -0,0 +1,159 @@
+"""
+Unit tests for response serialization
+Tests vectorized conversion of aggregate frames to JSON payloads, content negotiation
+and response compression
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from streamlit_backend.api import serialization
+from streamlit_backend.api.compression import CompressionMiddleware, choose_encoding
+from streamlit_backend.api.serialization import (
+    FastJSONResponse, column_values, frame_payload, negotiate_media_type, negotiated_response,
+    ARROW_MEDIA_TYPE, JSON_MEDIA_TYPE,
+)
+
+
+@pytest.fixture
+def agg_frame():
+    return pd.DataFrame({
+        'state': pd.Categorical(['CA', 'TX', 'NY']),
+        'year': np.array([2022, 2023, 2023], dtype=np.int16),
+        'cases': [np.nan, 20.0, 15.0],
+        'population': np.array([30, 40, 50], dtype=np.int64),
+        'rate': [np.nan, np.inf, 0.3],
+        'suppressed': [True, False, False],
+    })
+
+
+class TestColumnValues:
+    """Test cases for per-column conversion"""
+
+    def test_native_types_and_nulls(self, agg_frame):
+        """Numpy values become native Python values; NaN and inf become None"""
+        assert column_values(agg_frame['state']) == ['CA', 'TX', 'NY']
+        assert column_values(agg_frame['year']) == [2022, 2023, 2023]
+        assert type(column_values(agg_frame['year'])[0]) is int
+        assert column_values(agg_frame['cases']) == [None, 20.0, 15.0]
+        assert column_values(agg_frame['rate']) == [None, None, 0.3]
+        assert column_values(agg_frame['suppressed']) == [True, False, False]
+
+    def test_missing_values_in_object_columns(self):
+        """Missing strings and nullable integers become None"""
+        assert column_values(pd.Series(['a', None])) == ['a', None]
+        assert column_values(pd.Series([1, None], dtype='Int64')) == [1, None]
+
+
+class TestFramePayload:
+    """Test cases for payload shapes and encoding"""
+
+    def test_records_and_columns_agree(self, agg_frame):
+        """Both shapes carry the same values"""
+        records = frame_payload(agg_frame, 'records')
+        columns = frame_payload(agg_frame, 'columns')
+
+        assert columns['rows'] == 3
+        assert [r['rate'] for r in records] == columns['columns']['rate']
+        assert records[1] == {'state': 'TX', 'year': 2023, 'cases': 20.0, 'population': 40, 'rate': None, 'suppressed': False}
+
+    def test_unknown_shape(self, agg_frame):
+        """Unknown shapes raise ValueError"""
+        with pytest.raises(ValueError):
+            frame_payload(agg_frame, 'nested')
+
+    @pytest.mark.parametrize('use_orjson', [True, False])
+    def test_response_body(self, agg_frame, monkeypatch, use_orjson):
+        """orjson and the json fallback produce the same document"""
+        if use_orjson:
+            pytest.importorskip('orjson')
+        monkeypatch.setattr(serialization, 'ORJSON_AVAILABLE', use_orjson)
+
+        body = FastJSONResponse(content=frame_payload(agg_frame)).body
+        assert json.loads(body) == frame_payload(agg_frame)
+
+
+class TestContentNegotiation:
+    """Test cases for Accept-header negotiation"""
+
+    @pytest.mark.parametrize('accept,expected', [
+        (None, JSON_MEDIA_TYPE),
+        ('*/*', JSON_MEDIA_TYPE),
+        ('text/html, application/xhtml+xml', JSON_MEDIA_TYPE),
+        (ARROW_MEDIA_TYPE, ARROW_MEDIA_TYPE),
+        (f'application/json;q=0.5, {ARROW_MEDIA_TYPE}', ARROW_MEDIA_TYPE),
+        (f'{ARROW_MEDIA_TYPE};q=0, application/json', JSON_MEDIA_TYPE),
+    ])
+    def test_negotiate(self, accept, expected):
+        """Highest-q type we can produce wins, JSON otherwise"""
+        pytest.importorskip('pyarrow')
+        assert negotiate_media_type(accept) == expected
+
+    def test_unavailable_binary_format_falls_back_to_json(self, monkeypatch):
+        """MessagePack is only offered when msgpack is installed"""
+        monkeypatch.setattr(serialization, 'MSGPACK_AVAILABLE', False)
+        assert negotiate_media_type('application/msgpack') == JSON_MEDIA_TYPE
+
+    def test_arrow_roundtrip(self, agg_frame):
+        """The Arrow stream carries the frame with nulls for NaN"""
+        pa = pytest.importorskip('pyarrow')
+        response = negotiated_response(agg_frame, ARROW_MEDIA_TYPE)
+
+        assert response.media_type == ARROW_MEDIA_TYPE
+        table = pa.ipc.open_stream(response.body).read_all()
+        assert table.column_names == list(agg_frame.columns)
+        assert table.column('cases').to_pylist() == [None, 20.0, 15.0]
+
+    def test_msgpack_payload(self, agg_frame):
+        """MessagePack carries the same payload as JSON"""
+        msgpack = pytest.importorskip('msgpack')
+        response = negotiated_response(agg_frame, 'application/msgpack', shape='columns')
+        assert msgpack.unpackb(response.body) == frame_payload(agg_frame, 'columns')
+
+
+class TestCompression:
+    """Test cases for the compression middleware"""
+
+    @pytest.fixture
+    def compressed_client(self):
+        app = FastAPI()
+        app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+        @app.get('/big')
+        def big():
+            return {'values': list(range(500))}
+
+        @app.get('/small')
+        def small():
+            return {'ok': True}
+
+        return TestClient(app)
+
+    def test_choose_encoding(self):
+        """Preference order is respected among accepted encodings"""
+        assert choose_encoding('gzip, br', ['zstd', 'br', 'gzip']) == 'br'
+        assert choose_encoding('gzip;q=0, *', ['zstd', 'gzip']) == 'zstd'
+        assert choose_encoding('identity', ['gzip']) is None
+        assert choose_encoding(None, ['gzip']) is None
+
+    def test_large_responses_are_gzipped(self, compressed_client):
+        """Bodies above the minimum size are compressed and marked"""
+        response = compressed_client.get('/big', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['content-encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['vary']
+        assert int(response.headers['content-length']) < len(json.dumps({'values': list(range(500))}))
+        assert response.json() == {'values': list(range(500))}
+
+    def test_small_or_unaccepted_responses_pass_through(self, compressed_client):
+        """Small bodies and clients without a shared encoding get identity responses"""
+        assert 'content-encoding' not in compressed_client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+        assert 'content-encoding' not in compressed_client.get('/big', headers={'Accept-Encoding': 'identity'}).headers
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,203 @@
+"""
+Tests for complementary (secondary) suppression
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from streamlit_backend.cube import CountCube, CUBE_DIMENSIONS
+from streamlit_backend.data_loader import apply_rule_of_11
+from streamlit_backend.parallel import encode_keys
+from streamlit_backend.suppression import (
+    CubeSuppression, apply_complementary_suppression, complementary_mask, default_margins, line_ids, with_totals,
+)
+
+
+def unsafe_lines(df, dims, flag='suppressed'):
+    """Number of marginal lines holding exactly one suppressed cell among two or more."""
+    codes, _ = encode_keys(df, dims)
+    mask = df[flag].to_numpy(dtype=bool)
+    total = 0
+    for margin in default_margins(dims):
+        ids = line_ids(codes, dims, margin)
+        suppressed = np.bincount(ids, weights=mask)
+        total += int(((suppressed == 1) & (np.bincount(ids) >= 2)).sum())
+    return total
+
+
+def state_year_table(cases):
+    """3 states x 3 years with the given case counts (row-major) and population 100."""
+    states, years = np.meshgrid(['CA', 'NY', 'TX'], [2021, 2022, 2023], indexing='ij')
+    agg = pd.DataFrame({'state': states.ravel(), 'year': years.ravel(), 'cases': cases, 'population': 100})
+    agg['rate'] = agg['cases'] / agg['population']
+    return apply_rule_of_11(agg)
+
+
+class TestMargins:
+    """Test cases for marginal line indexing"""
+
+    def test_default_margins(self):
+        """Every non-empty subset of the dimensions is a marginal"""
+        assert default_margins(['state', 'year']) == [('state',), ('year',), ('state', 'year')]
+
+    def test_line_ids(self):
+        """Cells share a line when every dimension outside the margin matches"""
+        codes = [np.array([0, 0, 1, 1]), np.array([0, 1, 0, 1])]
+        dims = ['state', 'year']
+        per_year = line_ids(codes, dims, ('state',))
+        assert per_year[0] == per_year[2] and per_year[1] == per_year[3] and per_year[0] != per_year[1]
+        assert line_ids(codes, dims, ('state', 'year')).tolist() == [0, 0, 0, 0]
+
+
+class TestComplementaryMask:
+    """Test cases for the greedy complement selection"""
+
+    def test_lone_cell_gets_cheapest_complement(self):
+        """A line with one suppressed cell hides its lowest-cost visible cell"""
+        lines = [np.zeros(4, dtype=np.int64)]
+        mask = complementary_mask(lines, [True, False, False, False], cost=[3, 50, 20, 40])
+        assert mask.tolist() == [True, False, True, False]
+
+    def test_prefers_cell_fixing_several_lines(self):
+        """A complement that also fixes another marginal wins over a cheaper one"""
+        # Cells 0-2 share a line of the first marginal; cells 0-1 and 2-3 share lines of the second
+        lines = [np.array([0, 0, 0, 1]), np.array([0, 0, 1, 1])]
+        mask = complementary_mask(lines, [True, False, False, False], cost=[3, 30, 1, 1])
+        assert mask.tolist() == [True, True, False, False]
+
+    def test_no_primary_cells(self):
+        """Nothing is hidden when no cell is suppressed"""
+        mask = complementary_mask([np.zeros(3, dtype=np.int64)], [False, False, False], cost=[1, 2, 3])
+        assert not mask.any()
+
+
+class TestApplyComplementarySuppression:
+    """Test cases for complementary suppression of aggregate frames"""
+
+    def test_protects_single_suppressed_cell(self):
+        """A lone small cell can no longer be derived from its row and column totals"""
+        agg = state_year_table([5, 40, 60, 30, 70, 80, 90, 20, 50])
+        before = agg.copy()
+
+        out = apply_complementary_suppression(agg, ['state', 'year'])
+
+        assert unsafe_lines(out, ['state', 'year']) == 0
+        # CA 2022 and NY 2021 close the CA row and the 2021 column; NY 2022 then closes both new lines
+        hidden = out.loc[out['suppressed'], ['state', 'year']]
+        assert list(hidden.itertuples(index=False, name=None)) == [('CA', 2021), ('CA', 2022), ('NY', 2021), ('NY', 2022)]
+        assert out.loc[out['suppressed'], 'cases'].isna().all()
+        assert out.loc[out['suppressed'], 'rate'].isna().all()
+        assert agg.equals(before)
+
+    def test_already_safe_table_unchanged(self):
+        """A table whose lines are already safe is returned as is"""
+        agg = state_year_table([5, 8, 60, 3, 7, 80, 90, 20, 50])
+        out = apply_complementary_suppression(agg, ['state', 'year'])
+        pd.testing.assert_frame_equal(out, agg)
+
+    def test_multiple_case_columns(self):
+        """Each disease is protected against its own suppressed column"""
+        agg = state_year_table([5, 40, 60, 30, 70, 80, 90, 20, 50])
+        agg = agg.rename(columns={'cases': 'a_cases', 'rate': 'a_rate', 'suppressed': 'a_suppressed'})
+        agg['b_cases'] = 50
+        agg['b_rate'] = 0.5
+        agg['b_suppressed'] = False
+
+        out = apply_complementary_suppression(agg, ['state', 'year'], case_col=['a_cases', 'b_cases'])
+
+        assert unsafe_lines(out, ['state', 'year'], flag='a_suppressed') == 0
+        assert out['a_suppressed'].sum() == 4
+        assert not out['b_suppressed'].any()
+        assert out['b_cases'].tolist() == [50] * 9
+
+    def test_inplace(self):
+        """In-place suppression modifies and returns the caller's frame"""
+        agg = state_year_table([5, 40, 60, 30, 70, 80, 90, 20, 50])
+        out = apply_complementary_suppression(agg, ['state', 'year'], inplace=True)
+        assert out is agg
+        assert agg['suppressed'].sum() == 4
+
+    def test_empty_frame(self):
+        """An empty aggregate passes through"""
+        agg = apply_rule_of_11(pd.DataFrame(columns=['state', 'year', 'cases', 'population', 'rate']))
+        assert apply_complementary_suppression(agg, ['state', 'year']).empty
+
+    def test_large_table_is_safe(self):
+        """Tens of thousands of cells across five dimensions are all protected"""
+        rng = np.random.default_rng(0)
+        shape = (50, 8, 6, 5, 5)
+        grid = np.indices(shape).reshape(len(shape), -1)
+        dims = ['state', 'year', 'age_group', 'race', 'income']
+        agg = pd.DataFrame(dict(zip(dims, grid)))
+        agg['population'] = rng.integers(5, 400, len(agg))
+        agg['cases'] = rng.binomial(agg['population'], 0.08)
+        agg['rate'] = agg['cases'] / agg['population']
+        agg = apply_rule_of_11(agg)
+
+        out = apply_complementary_suppression(agg, dims)
+
+        assert len(out) == 60000
+        assert unsafe_lines(out, dims) == 0
+        assert out['suppressed'].sum() > agg['suppressed'].sum()
+
+
+class TestCubeSuppression:
+    """Test cases for one suppression pattern shared by every slice of the count cube"""
+
+    def test_with_totals(self):
+        """Each demographic axis gains a trailing 'all' level"""
+        arr = np.arange(2 * 1 * 3 * 2).reshape(2, 1, 3, 2)
+        out = with_totals(arr)
+        assert out.shape == (2, 1, 4, 3)
+        assert (out[:, :, 3, 2] == arr.sum(axis=(2, 3))).all()
+        assert (out[:, :, :3, :2] == arr).all()
+
+    def test_every_line_is_safe(self, sparse_patients):
+        """No line of the extended table (rollups included) holds exactly one hidden cell"""
+        suppression = CubeSuppression.from_cube(CountCube.from_frame(sparse_patients))
+        population = suppression.population.ravel()
+        present = np.flatnonzero(population > 0)
+        codes = list(np.unravel_index(present, suppression.population.shape))
+
+        for disease, mask in suppression.masks.items():
+            hidden = mask.ravel()[present]
+            assert hidden.any()
+            for margin in suppression.margins():
+                ids = line_ids(codes, CUBE_DIMENSIONS, margin)
+                counts = np.bincount(ids, weights=hidden)
+                assert not ((counts == 1) & (np.bincount(ids) >= 2)).any(), (disease, margin)
+
+    def test_slices_cannot_be_differenced(self, sparse_patients):
+        """Served slices for all patients and for each sex never leave one hidden cell per state/year"""
+        cube = CountCube.from_frame(sparse_patients)
+        suppression = CubeSuppression.from_cube(cube)
+
+        def served(demographics):
+            agg = apply_rule_of_11(cube.query('diabetes', demographics=demographics))
+            return suppression.apply(agg, 'diabetes', demographics).set_index(['state', 'year'])['suppressed']
+
+        slices = [served(None)] + [served({'sex': s}) for s in ['Female', 'Male', 'Other']]
+        hidden = pd.concat(slices, axis=1).fillna(False).astype(bool).sum(axis=1)
+        assert hidden.max() > 0
+        assert not (hidden == 1).any()
+
+    def test_matches_rule_of_11_without_complements(self, sparse_patients):
+        """With complementary=False the pattern is the Rule of 11 of each served cell"""
+        cube = CountCube.from_frame(sparse_patients)
+        suppression = CubeSuppression.from_cube(cube, complementary=False)
+        agg = apply_rule_of_11(cube.query('cancer', year=2022, demographics={'Age': '65+'}))
+        out = suppression.apply(agg, 'cancer', {'Age': '65+'})
+        pd.testing.assert_frame_equal(out, agg)
+
+    def test_slice_index(self, sparse_patients):
+        """Filters pick a level; unfiltered axes and unknown values resolve as documented"""
+        suppression = CubeSuppression.from_cube(CountCube.from_frame(sparse_patients))
+        assert suppression.slice_index(None) == (3, 3, 2, 2)
+        assert suppression.slice_index({'Race': 'White', 'sex': None}) == (3, 3, 1, 2)
+        assert suppression.slice_index({'sex': 'Unknown'}) is None
+        with pytest.raises(ValueError):
+            suppression.slice_index({'patient_id': 1})
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1 @@
+"""Benchmark scripts for the ML backend. Run each module with `python -m`."""
@@ -0,0 +1,44 @@
+"""
+Frequent-itemset engine comparison across support thresholds.
+Builds transactions from the dataset with `make_transactions` and times each frequent-itemset
+engine in `MINING_ALGORITHMS` at decreasing `min_support`.
+
+Usage:
+    python -m streamlit_backend.benchmarks.bench_mining --disease diabetes --supports 0.2,0.05,0.01
+"""
+import argparse
+import time
+
+from streamlit_backend.data_loader import load_data
+from streamlit_backend.pattern_mining import make_transactions, MINING_ALGORITHMS
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--src', dest='src', default=None)
+    parser.add_argument('--disease', dest='disease', default='diabetes')
+    parser.add_argument('--groupby', dest='groupby', default='state,year,income_group,age_group,sex,race_ethnicity')
+    parser.add_argument('--supports', dest='supports', default='0.2,0.1,0.05,0.02,0.01')
+    args = parser.parse_args()
+
+    df = load_data(args.src, compact=True)
+    tx = make_transactions(df, disease=args.disease, groupby=args.groupby.split(','))
+    print(f"transactions: {tx.shape[0]} x {tx.shape[1]} items")
+    if tx.empty:
+        print("No transactions survive Rule-of-11 suppression; try a coarser --groupby or a larger dataset.")
+        return
+
+    print(f"{'min_support':>11} " + " ".join(f"{name:>12}" for name in MINING_ALGORITHMS) + "   itemsets")
+    for support in (float(s) for s in args.supports.split(',')):
+        timings = []
+        n_itemsets = None
+        for name, engine in MINING_ALGORITHMS.items():
+            start = time.perf_counter()
+            itemsets = engine(tx, min_support=support, use_colnames=True)
+            timings.append(time.perf_counter() - start)
+            n_itemsets = len(itemsets)
+        print(f"{support:>11.3f} " + " ".join(f"{t * 1e3:>10.1f}ms" for t in timings) + f"   {n_itemsets:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Scaling of the multi-process group-by aggregation.
+Times the shared-memory bincount aggregation behind `aggregate_by_state(workers=...)`, the count cube
+build and the `make_transactions` grouping with 1..N workers on the same dataset (optionally replicated
+to a larger row count), next to the single-threaded pandas groupby they replace.
+
+Usage:
+    python -m streamlit_backend.benchmarks.bench_parallel --max-workers 8 --repeat-rows 20
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from streamlit_backend.data_loader import load_data, aggregate_by_state
+from streamlit_backend.cube import CountCube
+from streamlit_backend.parallel import aggregate_parallel
+
+TRANSACTION_GROUPBY = ['state', 'year', 'income_group', 'age_group', 'sex', 'race_ethnicity']
+
+
+def best_of(fn, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--src', dest='src', default=None)
+    parser.add_argument('--disease', dest='disease', default='diabetes')
+    parser.add_argument('--max-workers', dest='max_workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeat-rows', dest='repeat_rows', type=int, default=1,
+                        help='Concatenate the dataset this many times to simulate larger year ranges')
+    parser.add_argument('--repeats', dest='repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    df = load_data(args.src, compact=True)
+    if args.repeat_rows > 1:
+        df = pd.concat([df] * args.repeat_rows, ignore_index=True)
+    print(f"rows: {len(df):,}  cpus: {os.cpu_count()}")
+
+    tasks = {
+        'state x year': (
+            lambda: aggregate_by_state(df, args.disease),
+            lambda w: aggregate_parallel(df, args.disease, workers=w),
+        ),
+        'transaction groups': (
+            lambda: df.groupby(TRANSACTION_GROUPBY, observed=True)[args.disease].agg(['sum', 'count']),
+            lambda w: aggregate_parallel(df, args.disease, TRANSACTION_GROUPBY, workers=w),
+        ),
+        'count cube': (
+            None,
+            lambda w: CountCube.from_frame(df, workers=w),
+        ),
+    }
+    workers = sorted({1, *range(2, args.max_workers + 1)})
+    print(f"{'task':<20} {'pandas':>9} " + " ".join(f"{w:>9}w" for w in workers))
+    for name, (baseline, task) in tasks.items():
+        task(max(workers))  # start the pool outside the timed region
+        base = f"{best_of(baseline, args.repeats) * 1e3:>7.0f}ms" if baseline else f"{'-':>9}"
+        timings = [best_of(lambda: task(w), args.repeats) for w in workers]
+        print(f"{name:<20} {base} " + " ".join(f"{t * 1e3:>8.0f}ms" for t in timings))
+        print(f"{'  speed-up vs 1w':<20} {'':>9} " + " ".join(f"{timings[0] / t:>9.2f}x" for t in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Peak memory allocated per request-path call.
+Uses tracemalloc (numpy and pandas buffers are tracked) to report the peak bytes each backend
+function allocates on top of the already-loaded dataset, as a multiple of the dataset size.
+
+Usage:
+    python -m streamlit_backend.benchmarks.bench_request_memory --compact
+"""
+import argparse
+import tracemalloc
+
+from streamlit_backend.data_loader import load_data, filter_dataset, aggregate_by_state, apply_rule_of_11
+from streamlit_backend.pattern_mining import make_transactions
+from streamlit_backend.utils import summary_disparity
+
+
+def peak_bytes(fn, *args, **kwargs) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        fn(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--src', dest='src', default=None)
+    parser.add_argument('--compact', dest='compact', action='store_true')
+    args = parser.parse_args()
+
+    df = load_data(args.src, compact=args.compact)
+    dataset_bytes = int(df.memory_usage(index=True, deep=True).sum())
+
+    def filter_request():
+        filtered = filter_dataset(df, disease='diabetes', year=2023, demographics={'Age': '65+'})
+        return apply_rule_of_11(aggregate_by_state(filtered, disease='diabetes'))
+
+    cases = [
+        ('filter_dataset (no predicates)', lambda: filter_dataset(df)),
+        ('filter_dataset (year + age)', lambda: filter_dataset(df, year=2023, demographics={'Age': '65+'})),
+        ('/filter pipeline', filter_request),
+        ('make_transactions (all years)', lambda: make_transactions(df, disease='diabetes')),
+        ('summary_disparity (all years)', lambda: summary_disparity(df, 'diabetes')),
+    ]
+
+    print(f"dataset: {len(df)} rows, {dataset_bytes / 1e6:.1f} MB")
+    for label, fn in cases:
+        peak = peak_bytes(fn)
+        print(f"{label:<32} peak {peak / 1e6:8.2f} MB  ({peak / dataset_bytes:5.2f}x dataset)")
+
+
+if __name__ == '__main__':
+    main()
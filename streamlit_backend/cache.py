@@ -0,0 +1,325 @@
+"""
+Process-wide caching helpers for the ML backend.
+Provides a dataset cache that loads the patient table once per process and reloads it when the
+underlying file changes, so request latency does not depend on CSV parsing, and a bounded
+LRU/TTL result cache that collapses concurrent identical computations into one.
+Rows appended to a CSV dataset (by `DatasetCache.ingest` or the `data_loader ingest` command) are
+folded into the cached dataset and its derived artifacts without re-reading the whole file.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, Any, Hashable, List, Optional, Tuple
+
+import pandas as pd
+
+from streamlit_backend.data_loader import load_data, resolve_data_path, validate_batch, append_batch, append_frame, read_csv_rows
+
+# Bytes at the end of a CSV fingerprinted to recognise a later append to the same file
+TAIL_BYTES = 4096
+
+
+def _tail_digest(path: str, size: int) -> str:
+    with open(path, 'rb') as f:
+        f.seek(max(size - TAIL_BYTES, 0))
+        return hashlib.sha256(f.read(min(size, TAIL_BYTES))).hexdigest()
+
+
+class DatasetCache:
+    """Hold the loaded dataset in memory and reload it when the file's mtime or size changes.
+    The file watched is the one `load_data` actually reads, so converting the CSV to a columnar
+    file (or deleting that file) also triggers a reload.
+
+    `get()` is safe to call from many threads: readers never block on each other, and a reload
+    builds the new DataFrame before swapping it in, so callers always see a complete dataset.
+
+    When a CSV only grew since it was read (its old end is unchanged), just the new rows are parsed and
+    appended, and derived artifacts registered with an `update` function are updated with those rows
+    instead of being rebuilt. `ingest()` appends a batch to the file and applies it the same way.
+
+    `loader` may return something other than the patient table (e.g. a count cube built by streaming
+    the file); `append(loaded, batch)` must then fold appended rows into it.
+    """
+
+    def __init__(self, path: str, loader: Callable[[str], Any] = load_data,
+                 append: Callable[[Any, pd.DataFrame], Any] = append_frame):
+        self.path = Path(path)
+        self._loader = loader
+        self._append = append
+        self._lock = threading.Lock()
+        # (df, file signature, version) swapped as one object so readers never see a torn state
+        self._entry: Optional[Tuple[pd.DataFrame, Optional[Tuple[str, int, int]], int]] = None
+        self._derived: Dict[str, Tuple[int, Any]] = {}
+        self._updaters: Dict[str, Callable[[Any, pd.DataFrame], Any]] = {}
+        self._derived_lock = threading.Lock()
+        # (file signature, digest of the file's last bytes) for the loaded CSV
+        self._tail: Optional[Tuple[Tuple[str, int, int], str]] = None
+        self._last_version = 0
+        self._reload_listeners: List[Callable[[int], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.appends = 0
+
+    @property
+    def version(self) -> int:
+        """Incremented on every (re)load; derived artifacts and result caches key on it."""
+        entry = self._entry
+        return 0 if entry is None else entry[2]
+
+    def _stat_signature(self) -> Optional[Tuple[str, int, int]]:
+        try:
+            resolved = resolve_data_path(str(self.path))
+            st = os.stat(resolved)
+        except FileNotFoundError:
+            return None
+        return (str(resolved), st.st_mtime_ns, st.st_size)
+
+    def _current(self) -> Tuple[pd.DataFrame, Optional[Tuple[str, int, int]], int]:
+        signature = self._stat_signature()
+        entry = self._entry
+        if entry is not None and signature == entry[1]:
+            self.hits += 1
+            return entry
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            entry = self._entry
+            if entry is not None and signature == entry[1]:
+                self.hits += 1
+                return entry
+
+            batch = self._appended_rows(entry, signature)
+            if batch is not None:
+                return self._apply_batch(entry, batch, signature)
+
+            new_df = self._loader(str(self.path))
+            if entry is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+            version = (entry[2] if entry is not None else self._last_version) + 1
+            self._entry = (new_df, signature, version)
+            # A file that changed while it was being read cannot be trusted to have only grown later
+            self._remember_tail(signature if signature == self._stat_signature() else None)
+            for listener in self._reload_listeners:
+                listener(version)
+            return self._entry
+
+    def _remember_tail(self, signature: Optional[Tuple[str, int, int]]) -> None:
+        if signature is None or not signature[0].lower().endswith('.csv'):
+            self._tail = None
+            return
+        self._tail = (signature, _tail_digest(signature[0], signature[2]))
+
+    def _appended_rows(self, entry, signature) -> Optional[pd.DataFrame]:
+        """Rows appended to the loaded CSV since it was read, or None if it changed in any other way."""
+        tail = self._tail
+        if entry is None or signature is None or tail is None or tail[0] != entry[1]:
+            return None
+        path, _, size = tail[0]
+        if signature[0] != path or signature[2] <= size:
+            return None
+        try:
+            if _tail_digest(path, size) != tail[1]:
+                return None
+            return validate_batch(read_csv_rows(path, size))
+        except (ValueError, pd.errors.ParserError):
+            # Not a clean append: fall back to a full reload
+            return None
+
+    def _apply_batch(self, entry, batch: pd.DataFrame, signature) -> Tuple[pd.DataFrame, Optional[Tuple[str, int, int]], int]:
+        """Swap in `entry`'s dataset plus `batch` as a new version, updating derived artifacts. Caller holds the lock."""
+        df, _, old_version = entry
+        version = old_version + 1
+        new_df = self._append(df, batch)
+        with self._derived_lock:
+            derived = {}
+            for name, (built_for, value) in self._derived.items():
+                update = self._updaters.get(name)
+                if update is not None and built_for == old_version:
+                    derived[name] = (version, update(value, batch))
+            self._derived = derived
+            self._entry = (new_df, signature, version)
+        self.appends += 1
+        self._remember_tail(signature)
+        for listener in self._reload_listeners:
+            listener(version)
+        return self._entry
+
+    def ingest(self, batch: pd.DataFrame) -> int:
+        """Validate `batch`, append it to the dataset file and to the cached dataset; returns the new version.
+        Derived artifacts with an `update` function are updated from the batch alone, the rest are rebuilt
+        on next use, and reload listeners are notified as for a reload.
+        Raises ValueError if the batch does not match the dataset schema.
+        """
+        batch = validate_batch(batch)
+        # Bring the cache in line with the file first so the batch is applied to what is on disk
+        self._current()
+        with self._lock:
+            entry = self._entry
+            append_batch(batch, str(self.path))
+            return self._apply_batch(entry, batch, self._stat_signature())[2]
+
+    def on_reload(self, listener: Callable[[int], None]) -> None:
+        """Call `listener(version)` whenever a new dataset version is loaded."""
+        self._reload_listeners.append(listener)
+
+    def get(self) -> pd.DataFrame:
+        """Return the cached dataset, loading or reloading it if the file changed."""
+        return self._current()[0]
+
+    def snapshot(self) -> Tuple[pd.DataFrame, int]:
+        """Return the cached dataset together with its version, read atomically."""
+        df, _, version = self._current()
+        return df, version
+
+    def derived(self, name: str, builder: Callable[[pd.DataFrame], Any],
+                update: Optional[Callable[[Any, pd.DataFrame], Any]] = None) -> Any:
+        """Return `builder(df)` for the current dataset, built once per dataset version.
+        Used for artifacts computed from the patient table such as count cubes and indexes.
+        With `update`, appended rows are applied as `update(artifact, batch)` instead of a rebuild.
+        """
+        if update is not None:
+            self._updaters[name] = update
+        df, _, version = self._current()
+        cached = self._derived.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self._derived_lock:
+            cached = self._derived.get(name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            value = builder(df)
+            self._derived[name] = (version, value)
+            return value
+
+    def clear(self) -> None:
+        """Drop the cached dataset so the next `get()` reloads it from disk."""
+        with self._lock:
+            if self._entry is not None:
+                self._last_version = self._entry[2]
+            self._entry = None
+            self._derived = {}
+            self._tail = None
+
+    def stats(self) -> Dict[str, Any]:
+        entry = self._entry
+        return {
+            'path': str(self.path),
+            'loaded': entry is not None,
+            'version': self.version,
+            'rows': 0 if entry is None else int(len(entry[0])),
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'appends': self.appends,
+            'derived': sorted(self._derived),
+        }
+
+
+class ResultCache:
+    """Thread-safe LRU cache with an optional time-to-live and single-flight computation.
+
+    `get_or_compute(key, fn)` runs `fn` once per missing key: concurrent callers asking for the same
+    key wait for the first caller's result instead of computing it again. Exceptions are passed to
+    every waiting caller and are not cached.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: 'OrderedDict[Hashable, Tuple[Optional[float], Any]]' = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        # Caller holds the lock
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Return the cached value for `key`, computing it with `fn()` at most once at a time."""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = Future()
+                self._inflight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return flight.result()
+
+        try:
+            value = fn()
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            self.set(key, value)
+            flight.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self, *_args) -> None:
+        """Drop every cached entry. Accepts and ignores arguments so it can be used as a listener."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
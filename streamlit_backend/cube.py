@@ -0,0 +1,162 @@
+"""
+Precomputed count cube for state x year x demographic aggregates.
+The cube stores population and per-disease case counts for every combination of the demographic
+dimensions, so filtered state/year aggregates are answered by slicing and summing a small dense
+array instead of scanning patient rows. New patient rows are folded in with `add`, at a cost proportional
+to the batch rather than the full table. Suppression is not applied here; callers run
+`apply_rule_of_11` on the result exactly as they do for `aggregate_by_state`.
+"""
+from typing import Optional, Dict, Any, Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from streamlit_backend.data_loader import DISEASE_COLUMNS, resolve_demographic_column
+from streamlit_backend.parallel import encode_keys, grouped_sums
+
+CUBE_DIMENSIONS = ['state', 'year', 'age_group', 'sex', 'race_ethnicity', 'income_group']
+
+
+class CountCube:
+    """Dense population/case counts indexed by the levels of `CUBE_DIMENSIONS`."""
+
+    def __init__(self, levels: Dict[str, np.ndarray], population: np.ndarray, cases: Dict[str, np.ndarray]):
+        self.levels = levels
+        self.population = population
+        self.cases = cases
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, diseases: Sequence[str] = DISEASE_COLUMNS, workers: int = 1) -> 'CountCube':
+        """Build the cube from a patient-level DataFrame in a single pass (split across `workers` processes).
+        Rows with a missing dimension value cannot be placed in any cell and are skipped.
+        """
+        codes, dim_levels = encode_keys(df, CUBE_DIMENSIONS)
+        levels = dict(zip(CUBE_DIMENSIONS, dim_levels))
+        shape = tuple(len(lvl) for lvl in dim_levels)
+
+        population, sums = grouped_sums(codes, shape, [df[d].to_numpy() for d in diseases], workers=workers,
+                                        state_axis=CUBE_DIMENSIONS.index('state'))
+        cases = {disease: s.reshape(shape) for disease, s in zip(diseases, sums)}
+        return cls(levels, population.reshape(shape), cases)
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[pd.DataFrame], diseases: Sequence[str] = DISEASE_COLUMNS) -> 'CountCube':
+        """Build the cube from patient rows arriving in chunks (e.g. `iter_dataset_chunks`), so only the
+        cube and one chunk are ever held in memory.
+        Raises ValueError if there are no chunks.
+        """
+        cube = None
+        for chunk in chunks:
+            cube = cls.from_frame(chunk, diseases) if cube is None else cube.add(chunk)
+        if cube is None:
+            raise ValueError("No patient rows to build a count cube from")
+        return cube
+
+    def add(self, batch: pd.DataFrame) -> 'CountCube':
+        """A new cube holding these counts plus those of the patient rows in `batch`.
+        Levels first seen in the batch (a new year, a late state) extend the cube; the cost depends on
+        the batch size and the cell count, not on the rows already counted. The cube itself is unchanged.
+        """
+        levels, placement = {}, []
+        for dim in CUBE_DIMENSIONS:
+            current = self.levels[dim]
+            merged = np.union1d(current, np.asarray(batch[dim].dropna().unique()))
+            levels[dim] = merged if len(merged) != len(current) else current
+            placement.append(pd.Index(levels[dim]).get_indexer(current))
+        shape = tuple(len(levels[dim]) for dim in CUBE_DIMENSIONS)
+
+        def extend(arr):
+            if arr.shape == shape:
+                return arr.copy()
+            out = np.zeros(shape, dtype=arr.dtype)
+            out[np.ix_(*placement)] = arr
+            return out
+
+        codes = [pd.Index(levels[dim]).get_indexer(batch[dim]) for dim in CUBE_DIMENSIONS]
+        diseases = list(self.cases)
+        population, sums = grouped_sums(codes, shape, [batch[d].to_numpy() for d in diseases])
+        cases = {d: extend(self.cases[d]) + s.reshape(shape).astype(self.cases[d].dtype) for d, s in zip(diseases, sums)}
+        return CountCube(levels, extend(self.population) + population.reshape(shape).astype(self.population.dtype), cases)
+
+    def __len__(self) -> int:
+        """Number of patient rows counted."""
+        return int(self.population.sum())
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.population.nbytes + sum(arr.nbytes for arr in self.cases.values()))
+
+    def supports(self, demographics: Optional[Dict[str, Any]] = None) -> bool:
+        """True if every demographic filter maps onto a cube dimension."""
+        for k, v in (demographics or {}).items():
+            if v is None:
+                continue
+            if resolve_demographic_column(k, CUBE_DIMENSIONS) not in CUBE_DIMENSIONS:
+                return False
+        return True
+
+    def _selection(self, year: Optional[int], demographics: Optional[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """Boolean mask over the levels of each filtered dimension."""
+        masks = {}
+
+        def restrict(dim, value):
+            match = self.levels[dim] == value
+            masks[dim] = masks[dim] & match if dim in masks else match
+
+        if year is not None:
+            restrict('year', int(year))
+        for k, v in (demographics or {}).items():
+            if v is None:
+                continue
+            dim = resolve_demographic_column(k, CUBE_DIMENSIONS)
+            if dim not in CUBE_DIMENSIONS:
+                raise ValueError(f"Demographic filter key '{k}' is not a cube dimension. Allowed: {CUBE_DIMENSIONS}")
+            restrict(dim, v)
+        return masks
+
+    def query(self, disease: str, year: Optional[int] = None, demographics: Optional[Dict[str, Any]] = None,
+              groupby: List[str] = ['state', 'year']) -> pd.DataFrame:
+        """Return the same frame as `aggregate_by_state(filter_dataset(...), disease, groupby)`:
+        columns groupby..., cases, population, rate for every group with at least one patient.
+        """
+        out = self.query_diseases([disease], year=year, demographics=demographics, groupby=groupby)
+        out = out.rename(columns={f'{disease}_cases': 'cases', f'{disease}_rate': 'rate'})
+        return out[list(groupby) + ['cases', 'population', 'rate']]
+
+    def query_diseases(self, diseases: Sequence[str], year: Optional[int] = None,
+                       demographics: Optional[Dict[str, Any]] = None, groupby: List[str] = ['state', 'year']) -> pd.DataFrame:
+        """Return the same frame as `aggregate_diseases(filter_dataset(...), diseases, groupby)`:
+        the selection and population are computed once and shared by every disease.
+        """
+        unknown = [d for d in diseases if d not in self.cases]
+        if unknown:
+            raise ValueError(f"Unknown disease '{unknown[0]}'. Available: {list(self.cases)}")
+        unknown = [g for g in groupby if g not in CUBE_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Cannot group by {unknown}; cube dimensions are {CUBE_DIMENSIONS}")
+
+        masks = self._selection(year, demographics)
+        arrays = [self.population] + [self.cases[d] for d in diseases]
+        levels = {}
+        for axis, dim in enumerate(CUBE_DIMENSIONS):
+            if dim in masks:
+                idx = np.flatnonzero(masks[dim])
+                arrays = [np.take(arr, idx, axis=axis) for arr in arrays]
+                levels[dim] = self.levels[dim][idx]
+            else:
+                levels[dim] = self.levels[dim]
+
+        kept = [dim for dim in CUBE_DIMENSIONS if dim in groupby]
+        summed = tuple(axis for axis, dim in enumerate(CUBE_DIMENSIONS) if dim not in groupby)
+        population, *cases = [arr.sum(axis=summed) for arr in arrays]
+
+        cells = np.nonzero(population > 0)
+        out = pd.DataFrame({dim: levels[dim][cells[i]] for i, dim in enumerate(kept)})
+        out = out[list(groupby)]
+        out['population'] = population[cells].astype(np.int64)
+        for disease, counts in zip(diseases, cases):
+            out[f'{disease}_cases'] = counts[cells].astype(np.int64)
+            out[f'{disease}_rate'] = out[f'{disease}_cases'] / out['population']
+        if kept != list(groupby):
+            out = out.sort_values(list(groupby), ignore_index=True)
+        return out
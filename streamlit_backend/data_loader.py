@@ -2,138 +2,667 @@
 Data loading and preprocessing utilities.
 Provides functions to load synthetic or real CSV data, aggregate counts by state/year/demographic,
 apply Rule-of-11 suppression, and compute rates used for visualization and summarization.
+Datasets can also be converted to a typed columnar file (Feather/Parquet) which `load_data` picks up
+automatically and memory-maps instead of re-parsing the CSV. Tables too large for memory can be
+aggregated chunk by chunk with `aggregate_streaming`.
+
+New batches of patient rows are validated and appended with `append_batch` (or the `ingest` command).
+
+Usage:
+    python -m streamlit_backend.data_loader convert --src streamlit_backend/data/synthetic_health.csv
+    python -m streamlit_backend.data_loader ingest new_rows.csv
 """
+import argparse
 from pathlib import Path
 import pandas as pd
 import numpy as np
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, List, Union
 
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
 
-def load_data(path: Optional[str] = None) -> pd.DataFrame:
-    """Load dataset from CSV if provided, otherwise look for packaged synthetic CSV.
-    The returned DataFrame uses a canonical schema expected by other modules.
+from streamlit_backend.parallel import aggregate_parallel
+
+EXPECTED_COLUMNS = ['patient_id','state','year','age_group','sex','race_ethnicity','income_group','heart_disease','diabetes','cancer']
+CATEGORICAL_COLUMNS = ['state','age_group','sex','race_ethnicity','income_group']
+DISEASE_COLUMNS = ['heart_disease','diabetes','cancer']
+COLUMNAR_SUFFIXES = ('.feather', '.parquet')
+DEFAULT_DATA_PATH = Path(__file__).parent / 'data' / 'synthetic_health.csv'
+DEFAULT_CHUNK_ROWS = 1_000_000
+RULE_OF_11_THRESHOLD = 11
+
+
+def resolve_data_path(path: Optional[str] = None) -> Path:
+    """Return the file `load_data` would read for `path`.
+    A CSV is transparently replaced by a sibling `.feather`/`.parquet` file that is at least as new,
+    so re-running `convert` after regenerating the CSV is all that's needed to switch formats.
     """
     if path and Path(path).exists():
-        df = pd.read_csv(path)
+        resolved = Path(path)
+    elif DEFAULT_DATA_PATH.exists():
+        resolved = DEFAULT_DATA_PATH
     else:
-        default = Path(__file__).parent / 'data' / 'synthetic_health.csv'
-        if default.exists():
-            df = pd.read_csv(default)
-        else:
-            raise FileNotFoundError(f"No dataset found at {path or default}. Run generate_synthetic.py to create it.")
+        raise FileNotFoundError(f"No dataset found at {path or DEFAULT_DATA_PATH}. Run generate_synthetic.py to create it.")
 
-    # Normalize columns if needed
-    expected = ['patient_id','state','year','age_group','sex','race_ethnicity','income_group','heart_disease','diabetes','cancer']
-    missing = [c for c in expected if c not in df.columns]
-    if missing:
-        raise ValueError(f"Dataset missing expected columns: {missing}")
+    if resolved.suffix.lower() == '.csv':
+        csv_mtime = resolved.stat().st_mtime_ns
+        for suffix in COLUMNAR_SUFFIXES:
+            candidate = resolved.with_suffix(suffix)
+            if candidate.exists() and candidate.stat().st_mtime_ns >= csv_mtime:
+                return candidate
+    return resolved
+
+
+def load_data(path: Optional[str] = None, compact: bool = False) -> pd.DataFrame:
+    """Load dataset from CSV if provided, otherwise look for packaged synthetic CSV.
+    If a converted columnar file sits next to the CSV it is memory-mapped instead (see `resolve_data_path`).
+    The returned DataFrame uses a canonical schema expected by other modules. With `compact=True`
+    a CSV is parsed straight into the compact schema of `compact_dtypes` (columnar files always are).
+    """
+    resolved = resolve_data_path(path)
+    if resolved.suffix.lower() in COLUMNAR_SUFFIXES:
+        df = _read_columnar(resolved)
+        _validate_columns(df)
+        return df
+
+    if compact:
+        dtypes = {col: 'category' for col in CATEGORICAL_COLUMNS}
+        dtypes.update({col: np.uint8 for col in DISEASE_COLUMNS})
+        df = pd.read_csv(resolved, dtype=dtypes)
+        _validate_columns(df)
+        return compact_dtypes(df)
+
+    df = pd.read_csv(resolved)
+    _validate_columns(df)
 
     # Ensure types
     df['year'] = df['year'].astype(int)
     df['state'] = df['state'].astype(str)
-    for col in ['heart_disease','diabetes','cancer']:
+    for col in DISEASE_COLUMNS:
         df[col] = df[col].astype(int)
 
     return df
 
 
-def aggregate_by_state(df: pd.DataFrame, disease: str, groupby: list = ['state','year'], denominator_col: Optional[str]=None) -> pd.DataFrame:
+def _validate_columns(df: pd.DataFrame) -> None:
+    missing = [c for c in EXPECTED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Dataset missing expected columns: {missing}")
+
+
+def _read_columnar(path: Path) -> pd.DataFrame:
+    """Memory-map a Feather/Parquet dataset. Uncompressed Feather columns are handed to pandas
+    without copying; dictionary-encoded columns come back as categoricals.
+    """
+    if not PYARROW_AVAILABLE:
+        raise ImportError(f"pyarrow is required to read {path}. Install it or delete the file to fall back to CSV.")
+    if path.suffix.lower() == '.feather':
+        table = feather.read_table(path, memory_map=True)
+    else:
+        table = pq.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Return `df` with the compact canonical schema: categoricals for the demographic dimensions,
+    uint8 disease flags and the smallest integer type that fits `year` and `patient_id`.
+    """
+    dtypes = {col: 'category' for col in CATEGORICAL_COLUMNS
+              if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype)}
+    dtypes.update({col: np.uint8 for col in DISEASE_COLUMNS if col in df.columns})
+    out = df.astype(dtypes)
+    for col in ('year', 'patient_id'):
+        if col in out.columns:
+            out[col] = pd.to_numeric(out[col], downcast='integer')
+    return out
+
+
+def memory_footprint(df: pd.DataFrame) -> Dict[str, Any]:
+    """Report the in-memory size of `df` per column (deep, i.e. including string payloads)."""
+    usage = df.memory_usage(index=True, deep=True)
+    columns = {
+        col: {'dtype': str(df[col].dtype), 'bytes': int(usage[col])}
+        for col in df.columns
+    }
+    return {
+        'rows': int(len(df)),
+        'total_bytes': int(usage.sum()),
+        'bytes_per_row': float(usage.sum() / len(df)) if len(df) else 0.0,
+        'columns': columns,
+    }
+
+
+def convert_to_columnar(src: Optional[str] = None, out: Optional[str] = None, fmt: str = 'feather', compression: Optional[str] = None) -> Path:
+    """Convert a CSV dataset to a typed columnar file next to it (or at `out`).
+    Feather is written uncompressed by default so `load_data` can memory-map it without copying;
+    pass `compression='zstd'`/`'lz4'` (or use Parquet, zstd by default) to trade that for a smaller file.
+    """
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required to write columnar datasets.")
+    if fmt not in ('feather', 'parquet'):
+        raise ValueError(f"Unsupported columnar format '{fmt}'. Use 'feather' or 'parquet'.")
+
+    src_path = Path(src) if src else DEFAULT_DATA_PATH
+    df = pd.read_csv(src_path)
+    _validate_columns(df)
+    df = compact_dtypes(df[EXPECTED_COLUMNS])
+
+    out_path = Path(out) if out else src_path.with_suffix(f'.{fmt}')
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == 'feather':
+        feather.write_feather(df, out_path, compression=compression or 'uncompressed')
+    else:
+        df.to_parquet(out_path, engine='pyarrow', compression=compression or 'zstd', index=False)
+    return out_path
+
+
+def validate_batch(batch: pd.DataFrame) -> pd.DataFrame:
+    """Check a batch of new patient rows against the `EXPECTED_COLUMNS` schema `load_data` enforces.
+    Returns the batch restricted to the expected columns, in order, with integer `year` and 0/1 disease
+    flags. Raises ValueError for missing columns, missing values, non-integer years or invalid flags.
+    """
+    _validate_columns(batch)
+    batch = batch[EXPECTED_COLUMNS]
+    nulls = [c for c in EXPECTED_COLUMNS if batch[c].isna().any()]
+    if nulls:
+        raise ValueError(f"Batch has missing values in columns: {nulls}")
+
+    converted = {}
+    for col in ['year'] + DISEASE_COLUMNS:
+        values = pd.to_numeric(batch[col], errors='coerce')
+        if values.isna().any() or (values != np.floor(values)).any():
+            raise ValueError(f"Batch column '{col}' must contain integers")
+        converted[col] = values.astype(np.int64)
+    bad_flags = [c for c in DISEASE_COLUMNS if not converted[c].isin([0, 1]).all()]
+    if bad_flags:
+        raise ValueError(f"Disease columns must be 0 or 1: {bad_flags}")
+    return batch.assign(**converted)
+
+
+def append_frame(df: pd.DataFrame, batch: pd.DataFrame) -> pd.DataFrame:
+    """`df` with the (validated) `batch` rows appended, keeping `df`'s dtypes.
+    Categorical columns gain any new values of the batch, with their categories kept sorted.
+    """
+    old, new = {}, {}
+    for col in df.columns:
+        values = batch[col] if col in batch.columns else pd.Series(np.nan, index=batch.index)
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            categories = dtype.categories.union(pd.Index(values.unique()))
+            if len(categories) != len(dtype.categories):
+                dtype = pd.CategoricalDtype(categories)
+            old[col] = df[col].astype(dtype)
+            new[col] = values.astype(dtype)
+        else:
+            old[col] = df[col]
+            new[col] = values.astype(dtype) if pd.api.types.is_numeric_dtype(dtype) and values.notna().all() else values
+    return pd.concat([pd.DataFrame(old), pd.DataFrame(new)], ignore_index=True)
+
+
+def _write_columnar(df: pd.DataFrame, path: Path) -> None:
+    if path.suffix.lower() == '.feather':
+        feather.write_feather(df, path, compression='uncompressed')
+    else:
+        df.to_parquet(path, engine='pyarrow', compression='zstd', index=False)
+
+
+def append_batch(batch: pd.DataFrame, path: Optional[str] = None) -> Path:
+    """Validate `batch` and append it to the dataset `load_data(path)` reads; returns the file written.
+    A CSV is appended to in place and a directory of shards gets a new `part-*` shard, both in time
+    proportional to the batch. A single Feather/Parquet file cannot be appended to and is rewritten;
+    use a shard directory for large columnar datasets.
+    """
+    if path and not Path(path).exists():
+        raise FileNotFoundError(f"No dataset found at {path}")
+    batch = validate_batch(batch)
+    resolved = resolve_data_path(path)
+
+    if resolved.is_dir():
+        files = _dataset_files(resolved)
+        suffix = files[-1].suffix.lower()
+        target = resolved / f'part-{len(files):05d}{suffix}'
+        if suffix == '.csv':
+            batch.to_csv(target, index=False)
+        elif not PYARROW_AVAILABLE:
+            raise ImportError(f"pyarrow is required to write {target}.")
+        else:
+            _write_columnar(compact_dtypes(batch), target)
+        return target
+
+    if resolved.suffix.lower() == '.csv':
+        header = pd.read_csv(resolved, nrows=0).columns
+        with open(resolved, 'rb+') as f:
+            f.seek(0, 2)
+            if f.tell():
+                f.seek(-1, 2)
+                # Never glue the first new row onto an unterminated last line
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+        batch.reindex(columns=header).to_csv(resolved, mode='a', header=False, index=False)
+        return resolved
+
+    if not PYARROW_AVAILABLE:
+        raise ImportError(f"pyarrow is required to write {resolved}.")
+    _write_columnar(append_frame(_read_columnar(resolved), batch), resolved)
+    return resolved
+
+
+def read_csv_rows(path: str, offset: int) -> pd.DataFrame:
+    """Rows of a CSV dataset that start at byte `offset` (e.g. rows appended since the file was read).
+    Column names come from the file's header line.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return pd.read_csv(f, header=None, names=header)
+
+
+def aggregate_by_state(df: pd.DataFrame, disease: str, groupby: list = ['state','year'], denominator_col: Optional[str]=None,
+                       workers: int = 1) -> pd.DataFrame:
     """Aggregate counts and compute rates per state/year or other grouping.
     Returns DataFrame with columns: groupby..., cases, population, rate
     If denominator_col is None we approximate population by counting records.
+    With `workers > 1` the sums are computed on a process pool (see `parallel.aggregate_parallel`).
     """
+    if workers > 1 and denominator_col is None:
+        return aggregate_parallel(df, disease, groupby, workers=workers)
     denom = denominator_col or 'patient_id'
-    agg = df.groupby(groupby).agg(cases=(disease, 'sum'), population=(denom, 'count')).reset_index()
+    agg = df.groupby(groupby, observed=True).agg(cases=(disease, 'sum'), population=(denom, 'count')).reset_index()
+    # Compact uint8 disease flags would otherwise leave an unsigned, value-dependent dtype
+    agg['cases'] = agg['cases'].astype(np.int64)
     agg['rate'] = agg['cases'] / agg['population']
     return agg
 
 
-def apply_rule_of_11(df: pd.DataFrame, case_col: str = 'cases', pop_col: str = 'population') -> pd.DataFrame:
+def aggregate_diseases(df: pd.DataFrame, diseases: List[str] = DISEASE_COLUMNS, groupby: list = ['state','year']) -> pd.DataFrame:
+    """Aggregate several diseases in one groupby pass.
+    Returns DataFrame with columns: groupby..., population, then `<disease>_cases` and `<disease>_rate`
+    for each disease. Run `suppress_diseases` on the result before exposing it.
+    """
+    unknown = [d for d in diseases if d not in df.columns]
+    if unknown:
+        raise ValueError(f"Unknown disease(s) {unknown}. Available: {[c for c in DISEASE_COLUMNS if c in df.columns]}")
+    agg = df.groupby(groupby, observed=True).agg(
+        population=('patient_id', 'count'),
+        **{f'{d}_cases': (d, 'sum') for d in diseases},
+    ).reset_index()
+    agg['population'] = agg['population'].astype(np.int64)
+    for d in diseases:
+        agg[f'{d}_cases'] = agg[f'{d}_cases'].astype(np.int64)
+        agg[f'{d}_rate'] = agg[f'{d}_cases'] / agg['population']
+    return agg[list(groupby) + ['population'] + [c for d in diseases for c in (f'{d}_cases', f'{d}_rate')]]
+
+
+def suppress_diseases(agg: pd.DataFrame, diseases: List[str]) -> pd.DataFrame:
+    """Apply the Rule of 11 to every disease of an `aggregate_diseases` frame independently,
+    adding a `<disease>_suppressed` column after each disease's rate.
+    """
+    out = apply_rule_of_11(agg, case_col=[f'{d}_cases' for d in diseases])
+    columns = [c for c in agg.columns if not c.endswith(('_cases', '_rate', '_suppressed'))]
+    columns += [f'{d}_{part}' for d in diseases for part in ('cases', 'rate', 'suppressed')]
+    return out[columns]
+
+
+def trend_statistics(agg: pd.DataFrame, years: Optional[List[int]] = None, window: int = 3) -> pd.DataFrame:
+    """Per-state time series from a suppressed state/year aggregate (`apply_rule_of_11` output).
+
+    The result has one row per state and year of `years` (default: the years in `agg`), sorted by state
+    and year; cells missing from `agg` have no patients and are marked suppressed. Added columns:
+    `yoy_change` (rate minus the previous year's rate), `rolling_mean` (mean rate over the last `window`
+    years) and `slope` (least-squares rate change per year over the state's visible cells, repeated on
+    each of its rows). Statistics only use visible rates: a change or window touching a suppressed cell
+    is NaN, so no suppressed value can be derived from them.
+    Raises ValueError if `window` is not positive.
+    """
+    if window < 1:
+        raise ValueError(f"window must be a positive number of years, got {window}")
+    states = np.sort(np.asarray(agg['state'].dropna().unique(), dtype=object))
+    years = np.sort(np.asarray(years if years is not None else agg['year'].unique(), dtype=np.int64))
+    shape = (len(states), len(years))
+
+    rows = pd.Index(states).get_indexer(agg['state'])
+    cols = pd.Index(years).get_indexer(agg['year'])
+    placed = (rows >= 0) & (cols >= 0)
+    rows, cols = rows[placed], cols[placed]
+
+    def grid(col, fill):
+        out = np.full(shape, fill, dtype=np.float64)
+        out[rows, cols] = agg[col].to_numpy(dtype=np.float64, na_value=np.nan)[placed]
+        return out
+
+    cases = grid('cases', 0.0)
+    population = grid('population', 0.0)
+    rate = grid('rate', np.nan)
+    suppressed = np.ones(shape, dtype=bool)
+    suppressed[rows, cols] = agg['suppressed'].to_numpy(dtype=bool)[placed]
+    cases[suppressed & (population == 0)] = np.nan
+    rate[suppressed] = np.nan
+
+    visible = ~np.isnan(rate)
+    yoy = np.full(shape, np.nan)
+    yoy[:, 1:] = rate[:, 1:] - rate[:, :-1]
+
+    # Window sums from cumulative sums; a window is valid only when every year in it is visible
+    filled = np.where(visible, rate, 0.0)
+    sums = np.concatenate([np.zeros((shape[0], 1)), np.cumsum(filled, axis=1)], axis=1)
+    counts = np.concatenate([np.zeros((shape[0], 1)), np.cumsum(visible, axis=1)], axis=1)
+    rolling = np.full(shape, np.nan)
+    if window <= shape[1]:
+        window_sum = sums[:, window:] - sums[:, :-window]
+        window_count = counts[:, window:] - counts[:, :-window]
+        rolling[:, window - 1:] = np.where(window_count == window, window_sum / window, np.nan)
+
+    # Least-squares slope over the visible points of each state
+    x = years.astype(np.float64)
+    n = visible.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = (visible * x).sum(axis=1) / n
+        y_mean = filled.sum(axis=1) / n
+        dx = np.where(visible, x - x_mean[:, None], 0.0)
+        slope = (dx * (filled - y_mean[:, None])).sum(axis=1) / (dx ** 2).sum(axis=1)
+    slope[n < 2] = np.nan
+
+    return pd.DataFrame({
+        'state': np.repeat(states, shape[1]),
+        'year': np.tile(years, shape[0]),
+        'cases': cases.ravel(),
+        'population': population.ravel().astype(np.int64),
+        'rate': rate.ravel(),
+        'suppressed': suppressed.ravel(),
+        'yoy_change': yoy.ravel(),
+        'rolling_mean': rolling.ravel(),
+        'slope': np.repeat(slope, shape[1]),
+    })
+
+
+def rule_of_11_mask(cases, population, threshold: int = RULE_OF_11_THRESHOLD) -> np.ndarray:
+    """Boolean mask of cells to suppress: cases or population below `threshold`.
+    Missing values never trigger suppression on their own.
+    """
+    # NaN compares False, so missing values are not suppressed
+    mask = np.less(cases, threshold)
+    mask |= np.less(population, threshold)
+    return mask
+
+
+def _numeric_values(series: pd.Series) -> np.ndarray:
+    """Values of a numeric column as a NumPy array, without copying plain NumPy-backed columns."""
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'iuf':
+        return series.to_numpy()
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _set_column(df: pd.DataFrame, name: str, values: np.ndarray) -> None:
+    # Wrapping the array avoids the defensive copy DataFrame.__setitem__ makes of a bare ndarray
+    df[name] = pd.Series(values, index=df.index, copy=False)
+
+
+def suppression_columns(case_col: Union[str, List[str]] = 'cases', rate_col: Union[str, List[str], None] = None,
+                        suppressed_col: Union[str, List[str], None] = None) -> List[tuple]:
+    """(cases, rate, suppressed) column names for each case column of a suppression call.
+    A list of case columns defaults to `<base>_rate`/`<base>_suppressed` (a trailing `_cases` is stripped);
+    a single case column defaults to `rate`/`suppressed`.
+    """
+    multi = not isinstance(case_col, str)
+    case_cols = list(case_col) if multi else [case_col]
+    bases = [c[:-len('_cases')] if c.endswith('_cases') else c for c in case_cols]
+    if rate_col is None:
+        rate_cols = [f'{b}_rate' for b in bases] if multi else ['rate']
+    else:
+        rate_cols = [rate_col] if isinstance(rate_col, str) else list(rate_col)
+    if suppressed_col is None:
+        suppressed_cols = [f'{b}_suppressed' for b in bases] if multi else ['suppressed']
+    else:
+        suppressed_cols = [suppressed_col] if isinstance(suppressed_col, str) else list(suppressed_col)
+    if not len(case_cols) == len(rate_cols) == len(suppressed_cols):
+        raise ValueError("case_col, rate_col and suppressed_col must name the same number of columns")
+    return list(zip(case_cols, rate_cols, suppressed_cols))
+
+
+def apply_rule_of_11(df: pd.DataFrame, case_col: Union[str, List[str]] = 'cases', pop_col: str = 'population',
+                     rate_col: Union[str, List[str], None] = None, suppressed_col: Union[str, List[str], None] = None,
+                     inplace: bool = False) -> pd.DataFrame:
     """Suppress small counts to comply with Rule of 11.
-    Any cell where cases < 11 or population < 11 will have `suppressed=True` and rate set to NaN.
+    Any cell where cases < 11 or population < 11 will have `suppressed=True` and rate (and cases) set to NaN.
+
+    `case_col` may be a list to suppress several case columns against the same population in one call;
+    rate/suppressed column names default as described in `suppression_columns`.
+
+    By default the input frame is left untouched and a shallow copy with a fresh RangeIndex is returned;
+    only the replaced columns are allocated. With `inplace=True` the columns are replaced on `df` itself,
+    its index is kept, and `df` is returned.
     """
-    df = df.copy()
+    columns = suppression_columns(case_col, rate_col, suppressed_col)
 
-    # If empty, return a minimal-sane DataFrame shape
+    if not inplace:
+        # Shallow copy: columns are shared with `df` until replaced below
+        df = df.copy(deep=False)
+        if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+            df.index = pd.RangeIndex(len(df))
+
+    # If empty, return a minimal-sane DataFrame shape so callers can rely on the columns
     if df.empty:
-        # Ensure expected columns exist so callers can rely on them
-        df = df.copy()
-        if 'rate' not in df.columns:
-            df['rate'] = np.nan
-        df['suppressed'] = pd.Series(dtype=bool)
-        if case_col not in df.columns:
-            df[case_col] = pd.Series(dtype=float)
+        for c, r, flag in columns:
+            if r not in df.columns:
+                df[r] = np.nan
+            df[flag] = pd.Series(dtype=bool)
+            if c not in df.columns:
+                df[c] = pd.Series(dtype=float)
         if pop_col not in df.columns:
             df[pop_col] = pd.Series(dtype=float)
         return df
 
-    # Reset index to avoid assignment errors on exotic indices
-    df = df.reset_index(drop=True)
-
-    # Ensure case/pop columns exist (fallback to zeros if missing)
-    for c in (case_col, pop_col):
+    # Missing case/pop columns count as zero (and are therefore suppressed)
+    n = len(df)
+    for c in [c for c, _, _ in columns] + [pop_col]:
         if c not in df.columns:
             df[c] = 0
+    population = _numeric_values(df[pop_col])
+    for c, r, flag in columns:
+        mask = rule_of_11_mask(_numeric_values(df[c]), population)
+        if not (isinstance(df[c].dtype, np.dtype) and isinstance(df[pop_col].dtype, np.dtype)):
+            # Nullable (extension) columns keep their dtypes, with a nullable boolean flag
+            keep = ~pd.Series(mask, index=df.index, dtype='boolean')
+            df[flag] = ~keep
+            df[r] = df[r].where(keep) if r in df.columns else pd.Series(np.nan, index=df.index)
+            df[c] = df[c].where(keep)
+            continue
+        _set_column(df, flag, mask)
 
-    # Compute suppression mask safely
-    mask = (df[case_col] < 11) | (df[pop_col] < 11)
-    # Fill NA in mask with False
-    mask = mask.fillna(False)
-    df['suppressed'] = mask
+        rate = _numeric_values(df[r]) if r in df.columns else np.full(n, np.nan)
+        _set_column(df, r, np.where(mask, np.nan, rate))
+        # Masked cases become float with NaN; an untouched integer column keeps its dtype
+        if mask.any():
+            _set_column(df, c, np.where(mask, np.nan, _numeric_values(df[c])))
+    return df
 
-    # Use the mask to assign NaN where suppressed
-    if 'rate' not in df.columns:
-        df['rate'] = np.nan
 
-    df.loc[mask, 'rate'] = np.nan
-    # Optionally mask cases/pop for display
-    df.loc[mask, case_col] = np.nan
-    return df
+# Mapping from possible frontend/display demographic keys to the canonical dataframe columns
+DISPLAY_TO_COLUMN = {
+    'age': 'age_group',
+    'agegroup': 'age_group',
+    'age group': 'age_group',
+    'race': 'race_ethnicity',
+    'race_ethnicity': 'race_ethnicity',
+    'race ethnicity': 'race_ethnicity',
+    'income': 'income_group',
+    'income level': 'income_group',
+    'income_group': 'income_group',
+}
 
 
-def filter_dataset(df: pd.DataFrame, disease: Optional[str]=None, year: Optional[int]=None, demographics: Dict[str, Any]=None) -> pd.DataFrame:
+def resolve_demographic_column(key: str, columns) -> Optional[str]:
+    """Map a demographic filter key (frontend display label or column name) to a column in `columns`.
+    Returns None when the key does not match any column.
+    """
+    # normalize key (allow frontend display labels like 'Race' or 'Income Level')
+    key_norm = str(key).strip().lower()
+    if key_norm in DISPLAY_TO_COLUMN:
+        return DISPLAY_TO_COLUMN[key_norm]
+    if key in columns:
+        return key
+    # try case-insensitive column match
+    matches = [c for c in columns if c.lower() == key_norm]
+    return matches[0] if matches else None
+
+
+def filter_dataset(df: pd.DataFrame, disease: Optional[str]=None, year: Optional[int]=None, demographics: Dict[str, Any]=None,
+                   index=None) -> pd.DataFrame:
     """Filter dataset by disease/year/demographics. `demographics` is a dict like {'income_group':'Low'}.
     disease arg is not used for row filtering (diseases are columns) but kept for API symmetry.
+    If `index` is a `RowIndex` built from `df`, predicates are resolved by intersecting its bitmaps and
+    the matching rows are materialized once; otherwise the predicates are combined into one boolean mask.
+    The result may share data with `df` (or be `df` itself when nothing is filtered); do not mutate it.
     """
-    out = df.copy()
+    if index is not None and index.frame is df:
+        rows = index.rows(year=year, demographics=demographics)
+        if rows is not None:
+            return df.take(rows)
+
+    # Combine all predicates into one mask and slice once; with no predicates `df` is returned as-is
+    mask = None
+
+    def restrict(m):
+        return m if mask is None else mask & m
+
     if year is not None:
-        out = out[out['year'] == int(year)]
-
-    # Mapping from possible frontend/display demographic keys to the canonical dataframe columns
-    display_to_col = {
-        'age': 'age_group',
-        'agegroup': 'age_group',
-        'age group': 'age_group',
-        'race': 'race_ethnicity',
-        'race_ethnicity': 'race_ethnicity',
-        'race ethnicity': 'race_ethnicity',
-        'income': 'income_group',
-        'income level': 'income_group',
-        'income_group': 'income_group',
-    }
+        mask = restrict(df['year'] == int(year))
 
     if demographics:
         for k, v in demographics.items():
             if v is None:
                 continue
 
-            # normalize key (allow frontend display labels like 'Race' or 'Income Level')
-            key_norm = str(k).strip().lower()
-            col = None
-            if key_norm in display_to_col:
-                col = display_to_col[key_norm]
-            elif k in out.columns:
-                col = k
-            else:
-                # try case-insensitive column match
-                matches = [c for c in out.columns if c.lower() == key_norm]
-                if matches:
-                    col = matches[0]
-
+            col = resolve_demographic_column(k, df.columns)
             if col is None:
-                allowed = list(display_to_col.keys()) + list(out.columns)
+                allowed = list(DISPLAY_TO_COLUMN.keys()) + list(df.columns)
                 raise ValueError(f"Unknown demographic filter key '{k}'. Allowed keys (examples): {allowed}")
 
-            out = out[out[col] == v]
+            mask = restrict(df[col] == v)
+
+    return df if mask is None else df[mask]
 
+
+def _dataset_files(resolved: Path) -> List[Path]:
+    """The files making up a dataset: the file itself, or the `part-*` shards of a directory."""
+    if resolved.is_dir():
+        files = sorted(p for p in resolved.glob('part-*') if p.suffix.lower() in ('.csv',) + COLUMNAR_SUFFIXES)
+        if not files:
+            raise FileNotFoundError(f"No dataset shards (part-*.csv/.feather/.parquet) found in {resolved}")
+        return files
+    return [resolved]
+
+
+def iter_dataset_chunks(path: Optional[str] = None, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                        columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """Yield the dataset (a file as resolved by `resolve_data_path`, or a directory of shards) in
+    DataFrames of at most `chunk_rows` rows, reading only `columns` if given. Only one chunk is held in
+    memory at a time; CSV chunks are parsed into the compact schema.
+    """
+    for file in _dataset_files(resolve_data_path(path)):
+        suffix = file.suffix.lower()
+        if suffix == '.csv':
+            dtypes = {col: 'category' for col in CATEGORICAL_COLUMNS}
+            dtypes.update({col: np.uint8 for col in DISEASE_COLUMNS})
+            dtypes = {col: dtype for col, dtype in dtypes.items() if columns is None or col in columns}
+            for chunk in pd.read_csv(file, chunksize=chunk_rows, usecols=columns, dtype=dtypes):
+                # Categories are per chunk: combine chunks by value, not by category code
+                yield compact_dtypes(chunk)
+            continue
+
+        if not PYARROW_AVAILABLE:
+            raise ImportError(f"pyarrow is required to read {file}.")
+        if suffix == '.parquet':
+            batches = pq.ParquetFile(file, memory_map=True).iter_batches(batch_size=chunk_rows, columns=columns)
+        else:
+            reader = pa.ipc.open_file(pa.memory_map(str(file)))
+            batches = (
+                batch.slice(offset, chunk_rows)
+                for batch in (reader.get_batch(i) for i in range(reader.num_record_batches))
+                for offset in range(0, batch.num_rows, chunk_rows)
+            )
+        for batch in batches:
+            if columns is not None and suffix != '.parquet':
+                batch = batch.select(columns)
+            yield batch.to_pandas()
+
+
+def aggregate_streaming(path: Optional[str], disease: str, year: Optional[int] = None,
+                        demographics: Optional[Dict[str, Any]] = None, groupby: list = ['state','year'],
+                        chunk_rows: int = DEFAULT_CHUNK_ROWS) -> pd.DataFrame:
+    """Out-of-core equivalent of `aggregate_by_state(filter_dataset(load_data(path), ...), ...)`.
+    Each chunk is filtered and reduced to per-group case/population sums, which are merged into a running
+    total, so memory depends on `chunk_rows` and the number of groups, not on the table size.
+    Suppression is left to the caller: run `apply_rule_of_11` on the merged result.
+    """
+    if disease not in DISEASE_COLUMNS:
+        raise ValueError(f"Unknown disease '{disease}'. Available: {DISEASE_COLUMNS}")
+    # Read only the columns the query touches; unknown filter keys are reported by filter_dataset
+    needed = set(groupby) | {disease, 'year'}
+    for k, v in (demographics or {}).items():
+        if v is not None:
+            needed.add(resolve_demographic_column(k, EXPECTED_COLUMNS) or k)
+    columns = [c for c in EXPECTED_COLUMNS if c in needed]
+    unknown = needed - set(columns)
+    if unknown:
+        raise ValueError(f"Unknown columns {sorted(unknown)}. Allowed keys (examples): {list(DISPLAY_TO_COLUMN.keys()) + EXPECTED_COLUMNS}")
+
+    totals = None
+    for chunk in iter_dataset_chunks(path, chunk_rows=chunk_rows, columns=columns):
+        chunk = filter_dataset(chunk, year=year, demographics=demographics)
+        if chunk.empty:
+            continue
+        partial = chunk.groupby(groupby, observed=True)[disease].agg(['sum', 'size'])
+        # Plain group keys: categorical dictionaries may differ between chunks
+        partial.index = pd.MultiIndex.from_arrays(
+            [np.asarray(partial.index.get_level_values(i)) for i in range(len(groupby))], names=groupby)
+        totals = partial if totals is None else totals.add(partial, fill_value=0)
+
+    if totals is None:
+        out = pd.DataFrame({g: pd.Series(dtype=object) for g in groupby})
+        out['cases'] = pd.Series(dtype=np.int64)
+        out['population'] = pd.Series(dtype=np.int64)
+        out['rate'] = pd.Series(dtype=float)
+        return out
+
+    totals = totals.sort_index()
+    out = totals.index.to_frame(index=False)
+    out['cases'] = totals['sum'].to_numpy().astype(np.int64)
+    out['population'] = totals['size'].to_numpy().astype(np.int64)
+    out['rate'] = out['cases'] / out['population']
     return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest='command', required=True)
+    convert = sub.add_parser('convert', help='Write the dataset to a typed columnar file')
+    convert.add_argument('--src', dest='src', default=str(DEFAULT_DATA_PATH))
+    convert.add_argument('--out', dest='out', default=None)
+    convert.add_argument('--format', dest='fmt', choices=['feather', 'parquet'], default='feather')
+    convert.add_argument('--compression', dest='compression', default=None)
+    ingest = sub.add_parser('ingest', help='Validate a batch of patient rows and append it to the dataset')
+    ingest.add_argument('batch', help='CSV, Feather or Parquet file with the new rows')
+    ingest.add_argument('--dataset', dest='dataset', default=str(DEFAULT_DATA_PATH))
+    footprint = sub.add_parser('footprint', help='Compare memory use of the default and compact schemas')
+    footprint.add_argument('--src', dest='src', default=str(DEFAULT_DATA_PATH))
+    args = parser.parse_args()
+    if args.command == 'convert':
+        path = convert_to_columnar(args.src, out=args.out, fmt=args.fmt, compression=args.compression)
+        print(f"Wrote columnar dataset to {path}")
+    elif args.command == 'ingest':
+        batch_path = Path(args.batch)
+        batch = pd.read_csv(batch_path) if batch_path.suffix.lower() == '.csv' else _read_columnar(batch_path)
+        path = append_batch(batch, args.dataset)
+        print(f"Appended {len(batch)} rows to {path}")
+    elif args.command == 'footprint':
+        for label, compact in (('default', False), ('compact', True)):
+            report = memory_footprint(load_data(args.src, compact=compact))
+            print(f"{label}: {report['total_bytes'] / 1e6:.1f} MB ({report['bytes_per_row']:.1f} bytes/row)")
+            for col, info in report['columns'].items():
+                print(f"  {col:<16} {info['dtype']:<10} {info['bytes'] / 1e6:8.2f} MB")
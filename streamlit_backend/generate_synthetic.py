@@ -5,14 +5,31 @@ multiple states, years, demographic attributes, and disease indicators.
 
 Usage:
     python generate_synthetic.py --out data/synthetic_health.csv --n 200000
+    python generate_synthetic.py --out data/synthetic_health.csv --n 10000000 --chunk-size 1000000
+    python generate_synthetic.py --out data/fixture.parquet --n 1000000000 --workers 16
+    python generate_synthetic.py --out data/fixture_shards --format feather --shards --n 1000000000 --workers 16
 
 The script is intentionally deterministic by default (seeded) for reproducibility.
+Attributes are drawn as whole NumPy arrays; with --chunk-size the rows are streamed to the
+output file chunk by chunk so datasets larger than RAM can be produced. Chunks get independent
+seeds from `SeedSequence(seed).spawn`, so a chunked dataset is the same for any --workers count.
 """
 import argparse
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 from pathlib import Path
 
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
 STATES = [
     'AL','AK','AZ','AR','CA','CO','CT','DE','FL','GA','HI','ID','IL','IN','IA','KS','KY','LA','ME','MD','MA','MI','MN','MS','MO','MT','NE','NV','NH','NJ','NM','NY','NC','ND','OH','OK','OR','PA','RI','SC','SD','TN','TX','UT','VT','VA','WA','WV','WI','WY'
 ]
@@ -23,36 +40,41 @@ RACES = ['White','Black','Hispanic','Asian','Other']
 INCOME = ['Low','Middle','High']
 YEARS = list(range(2015, 2024))
 DISEASES = ['heart_disease','diabetes','cancer']
+COLUMNS = ['patient_id','state','year','age_group','sex','race_ethnicity','income_group','heart_disease','diabetes','cancer']
+
+AGE_P = [0.22,0.27,0.2,0.18,0.13]
+SEX_P = [0.5,0.49,0.01]
+RACE_P = [0.6,0.13,0.15,0.08,0.04]
+INCOME_P = [0.3,0.5,0.2]
+
+# Risk modifiers, aligned with the category lists above
+AGE_RISK = {'0-17':0.0,'18-34':0.0,'35-49':0.03,'50-64':0.08,'65+':0.15}
+RACE_RISK = {'White':0.0,'Black':0.02,'Hispanic':0.01,'Asian':-0.005,'Other':0.0}
+STATE_HOTSPOTS = ['MS','WV','AL','LA','KY']
+
+FORMATS = ('csv', 'parquet', 'feather')
+DEFAULT_CHUNK_SIZE = 1_000_000
 
 
 def generate_patient_record(rng):
     state = rng.choice(STATES)
     year = rng.choice(YEARS)
-    age = rng.choice(AGE_GROUPS, p=[0.22,0.27,0.2,0.18,0.13])
-    sex = rng.choice(SEXES, p=[0.5,0.49,0.01])
-    race = rng.choice(RACES, p=[0.6,0.13,0.15,0.08,0.04])
-    income = rng.choice(INCOME, p=[0.3,0.5,0.2])
+    age = rng.choice(AGE_GROUPS, p=AGE_P)
+    sex = rng.choice(SEXES, p=SEX_P)
+    race = rng.choice(RACES, p=RACE_P)
+    income = rng.choice(INCOME, p=INCOME_P)
 
     # Baseline disease risks by age/income/race to create realistic patterns
-    base_risk = 0.01
-    if age == '50-64':
-        base_risk += 0.08
-    elif age == '65+':
-        base_risk += 0.15
-    elif age == '35-49':
-        base_risk += 0.03
+    base_risk = 0.01 + AGE_RISK[age]
 
     if income == 'Low':
         base_risk += 0.02
 
     # Race-specific small adjustments
-    race_adj = {'White':0.0,'Black':0.02,'Hispanic':0.01,'Asian':-0.005,'Other':0.0}
-    base_risk += race_adj.get(race,0)
+    base_risk += RACE_RISK.get(race,0)
 
     # State-level modifiers (some states elevated risk)
-    state_hotspots = ['MS','WV','AL','LA','KY']
-    state_adj = 0.03 if state in state_hotspots else 0.0
-    base_risk += state_adj
+    base_risk += 0.03 if state in STATE_HOTSPOTS else 0.0
 
     # Disease presence simulated with correlated components
     heart = rng.binomial(1, min(0.6, base_risk + 0.05))
@@ -63,19 +85,174 @@ def generate_patient_record(rng):
                 heart_disease=int(heart), diabetes=int(diabetes), cancer=int(cancer))
 
 
-def generate_dataset(n=100000, seed=42, out_path=None):
-    rng = np.random.default_rng(seed)
-    records = [generate_patient_record(rng) for _ in range(n)]
-    df = pd.DataFrame(records)
+def generate_records(n, rng, start_id=1):
+    """Vectorized equivalent of calling `generate_patient_record` n times.
+    Every attribute is drawn as one array with the same distributions and the risk model is evaluated
+    with array arithmetic, so the output is statistically identical (but not draw-for-draw identical).
+    Demographic columns are categoricals over the full category lists so every chunk shares one
+    dictionary when written to a columnar file.
+    """
+    state_idx = rng.integers(0, len(STATES), size=n)
+    year_idx = rng.integers(0, len(YEARS), size=n)
+    age_idx = rng.choice(len(AGE_GROUPS), size=n, p=AGE_P)
+    sex_idx = rng.choice(len(SEXES), size=n, p=SEX_P)
+    race_idx = rng.choice(len(RACES), size=n, p=RACE_P)
+    income_idx = rng.choice(len(INCOME), size=n, p=INCOME_P)
+
+    low_income = income_idx == INCOME.index('Low')
+    base_risk = (0.01
+                 + np.array([AGE_RISK[a] for a in AGE_GROUPS])[age_idx]
+                 + 0.02 * low_income
+                 + np.array([RACE_RISK.get(r, 0) for r in RACES])[race_idx]
+                 + np.where(np.isin(state_idx, [STATES.index(s) for s in STATE_HOTSPOTS]), 0.03, 0.0))
+
+    # Disease presence simulated with correlated components
+    heart = rng.binomial(1, np.minimum(0.6, base_risk + 0.05))
+    diabetes = rng.binomial(1, np.minimum(0.5, base_risk + 0.03 * low_income))
+    cancer = rng.binomial(1, np.minimum(0.15, base_risk * 0.7))
+
+    return pd.DataFrame({
+        'patient_id': np.arange(start_id, start_id + n),
+        'state': pd.Categorical.from_codes(state_idx, STATES),
+        'year': np.asarray(YEARS, dtype=np.int16)[year_idx],
+        'age_group': pd.Categorical.from_codes(age_idx, AGE_GROUPS),
+        'sex': pd.Categorical.from_codes(sex_idx, SEXES),
+        'race_ethnicity': pd.Categorical.from_codes(race_idx, RACES),
+        'income_group': pd.Categorical.from_codes(income_idx, INCOME),
+        'heart_disease': heart.astype(np.uint8),
+        'diabetes': diabetes.astype(np.uint8),
+        'cancer': cancer.astype(np.uint8),
+    }, columns=COLUMNS)
+
+
+def _infer_format(out_path, fmt=None):
+    fmt = fmt or Path(out_path).suffix.lstrip('.').lower() or 'csv'
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported output format '{fmt}'. Use one of {FORMATS}.")
+    if fmt != 'csv' and not PYARROW_AVAILABLE:
+        raise ImportError(f"pyarrow is required to write {fmt} output.")
+    return fmt
+
+
+def _write_frame(df, path, fmt):
+    if fmt == 'csv':
+        df.to_csv(path, index=False)
+    elif fmt == 'parquet':
+        df.to_parquet(path, engine='pyarrow', compression='zstd', index=False)
+    else:
+        # Uncompressed so data_loader can memory-map it
+        feather.write_feather(df, path, compression='uncompressed')
+
+
+def _chunk_tasks(n, seed, chunk_size):
+    """(seed sequence, size, first patient_id) for every chunk."""
+    sizes = [chunk_size] * (n // chunk_size) + ([n % chunk_size] if n % chunk_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    starts = np.cumsum([1] + sizes[:-1])
+    return [(s, m, int(start)) for s, m, start in zip(seeds, sizes, starts)]
 
-    # Add a patient_id for reference
-    df['patient_id'] = range(1, len(df)+1)
-    cols = ['patient_id','state','year','age_group','sex','race_ethnicity','income_group','heart_disease','diabetes','cancer']
-    df = df[cols]
+
+def _generate_chunk(task):
+    seed_seq, size, start_id = task
+    return generate_records(size, np.random.default_rng(seed_seq), start_id=start_id)
+
+
+def _write_shard(job, fmt):
+    task, path = job
+    _write_frame(_generate_chunk(task), path, fmt)
+    return task[1]
+
+
+def _ordered_results(pool, fn, tasks, workers, *args):
+    """Yield fn(task, *args) in task order with at most 2 * workers tasks in flight,
+    so finished chunks waiting to be written never pile up in memory.
+    """
+    if pool is None:
+        for task in tasks:
+            yield fn(task, *args)
+        return
+    tasks = iter(tasks)
+    pending = deque(pool.submit(fn, task, *args) for task in itertools.islice(tasks, 2 * workers))
+    while pending:
+        result = pending.popleft().result()
+        task = next(tasks, None)
+        if task is not None:
+            pending.append(pool.submit(fn, task, *args))
+        yield result
+
+
+def write_dataset(n, seed=42, out_path='streamlit_backend/data/synthetic_health.csv', chunk_size=DEFAULT_CHUNK_SIZE,
+                  workers=1, fmt=None, shards=False):
+    """Generate `n` records in independently seeded chunks and stream them to `out_path`.
+    Chunks are generated on `workers` processes and written in order as they complete, either appended
+    to one CSV/Parquet/Feather file or, with `shards=True`, as one file per chunk inside the `out_path`
+    directory (written by the workers themselves). Memory is bounded by `chunk_size` x in-flight chunks.
+    Returns the output path.
+    """
+    fmt = _infer_format(out_path, fmt)
+    out = Path(out_path)
+    tasks = _chunk_tasks(n, seed, chunk_size)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if shards:
+            out.mkdir(parents=True, exist_ok=True)
+            for old_shard in out.glob(f'part-*.{fmt}'):
+                old_shard.unlink()
+            paths = [out / f'part-{i:05d}.{fmt}' for i in range(len(tasks))]
+            written = 0
+            for rows in _ordered_results(pool, _write_shard, list(zip(tasks, paths)), workers, fmt):
+                written += rows
+        else:
+            out.parent.mkdir(parents=True, exist_ok=True)
+            written = _append_chunks(_ordered_results(pool, _generate_chunk, tasks, workers), out, fmt)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    print(f"Wrote synthetic dataset to {out} (n={written}, format={fmt}{', sharded' if shards else ''})")
+    return out
+
+
+def _append_chunks(chunks, out, fmt):
+    """Append every chunk to a single output file; returns the number of rows written."""
+    written = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            if fmt == 'csv':
+                chunk.to_csv(out, index=False, mode='w' if written == 0 else 'a', header=written == 0)
+            else:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    if fmt == 'parquet':
+                        writer = pq.ParquetWriter(out, table.schema, compression='zstd')
+                    else:
+                        writer = pa.ipc.new_file(out, table.schema)
+                writer.write_table(table)
+            written += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+def generate_dataset(n=100000, seed=42, out_path=None, chunk_size=None, workers=1, fmt=None, shards=False):
+    """Generate `n` patient records seeded with `seed`.
+    Without `chunk_size` the full DataFrame is returned (and written to `out_path` if given).
+    With `chunk_size`, more than one worker or `shards`, the records are streamed to `out_path` by
+    `write_dataset` so memory stays bounded by the chunk size; nothing is returned in that case.
+    """
+    if out_path and (chunk_size or workers > 1 or shards):
+        write_dataset(n, seed=seed, out_path=out_path, chunk_size=chunk_size or DEFAULT_CHUNK_SIZE,
+                      workers=workers, fmt=fmt, shards=shards)
+        return None
+
+    rng = np.random.default_rng(seed)
+    df = generate_records(n, rng)
 
     if out_path:
         Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-        df.to_csv(out_path, index=False)
+        _write_frame(df, out_path, _infer_format(out_path, fmt))
         print(f"Wrote synthetic dataset to {out_path} (n={len(df)})")
 
     return df
@@ -86,5 +263,12 @@ if __name__ == '__main__':
     parser.add_argument('--out', dest='out', default='streamlit_backend/data/synthetic_health.csv')
     parser.add_argument('--n', dest='n', type=int, default=100000)
     parser.add_argument('--seed', dest='seed', type=int, default=42)
+    parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=None)
+    parser.add_argument('--workers', dest='workers', type=int, default=1)
+    parser.add_argument('--format', dest='fmt', choices=FORMATS, default=None,
+                        help='Output format (defaults to the --out suffix, then csv)')
+    parser.add_argument('--shards', dest='shards', action='store_true',
+                        help='Write one file per chunk into the --out directory')
     args = parser.parse_args()
-    generate_dataset(n=args.n, seed=args.seed, out_path=args.out)
+    generate_dataset(n=args.n, seed=args.seed, out_path=args.out, chunk_size=args.chunk_size,
+                     workers=args.workers, fmt=args.fmt, shards=args.shards)
@@ -0,0 +1,92 @@
+"""
+Bitmap indexes over the patient table.
+Each value of `year` and of every demographic column gets a packed bitmap of the rows holding it,
+so a multi-predicate filter resolves by AND-ing a handful of bitmaps and materializes the matching
+rows once (or not at all when only a count is needed).
+"""
+from typing import Optional, Dict, Any, Sequence
+
+import numpy as np
+import pandas as pd
+
+from streamlit_backend.data_loader import resolve_demographic_column
+
+INDEXED_COLUMNS = ['year', 'state', 'age_group', 'sex', 'race_ethnicity', 'income_group']
+
+
+def popcount(bits: np.ndarray) -> int:
+    """Number of set bits in a packed uint8 bitmap."""
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(bits).sum(dtype=np.int64))
+    return int(np.unpackbits(bits).sum(dtype=np.int64))
+
+
+class RowIndex:
+    """Packed per-value bitmaps for the indexed columns of one DataFrame.
+    The index keeps a reference to the frame it was built from; `filter_dataset` only uses it for
+    that exact frame.
+    """
+
+    def __init__(self, frame: pd.DataFrame, bitmaps: Dict[str, Dict[Any, np.ndarray]]):
+        self.frame = frame
+        self.n_rows = len(frame)
+        self.bitmaps = bitmaps
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns: Sequence[str] = INDEXED_COLUMNS) -> 'RowIndex':
+        bitmaps = {}
+        for col in columns:
+            cat = pd.Categorical(df[col])
+            codes = np.asarray(cat.codes)
+            bitmaps[col] = {
+                value: np.packbits(codes == code)
+                for code, value in enumerate(cat.categories)
+            }
+        return cls(df, bitmaps)
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(bits.nbytes for values in self.bitmaps.values() for bits in values.values()))
+
+    def _predicates(self, year: Optional[int], demographics: Optional[Dict[str, Any]]):
+        """Resolve filters to (column, value) pairs, or None if a filter is not indexed."""
+        predicates = []
+        if year is not None:
+            predicates.append(('year', int(year)))
+        for k, v in (demographics or {}).items():
+            if v is None:
+                continue
+            col = resolve_demographic_column(k, list(self.bitmaps))
+            if col not in self.bitmaps:
+                return None
+            predicates.append((col, v))
+        return predicates
+
+    def bitmap(self, year: Optional[int] = None, demographics: Optional[Dict[str, Any]] = None) -> Optional[np.ndarray]:
+        """Packed bitmap of the rows matching every predicate, or None if a filter is not indexed."""
+        predicates = self._predicates(year, demographics)
+        if predicates is None:
+            return None
+        if not predicates:
+            return np.packbits(np.ones(self.n_rows, dtype=bool))
+
+        empty = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        selected = [self.bitmaps[col].get(value, empty) for col, value in predicates]
+        # AND the sparsest bitmaps first so the working set empties out early
+        selected.sort(key=popcount)
+        result = selected[0].copy()
+        for bits in selected[1:]:
+            np.bitwise_and(result, bits, out=result)
+        return result
+
+    def rows(self, year: Optional[int] = None, demographics: Optional[Dict[str, Any]] = None) -> Optional[np.ndarray]:
+        """Sorted positions of matching rows, or None if a filter is not indexed."""
+        bits = self.bitmap(year, demographics)
+        if bits is None:
+            return None
+        return np.flatnonzero(np.unpackbits(bits, count=self.n_rows))
+
+    def count(self, year: Optional[int] = None, demographics: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        """Number of matching rows without materializing them, or None if a filter is not indexed."""
+        bits = self.bitmap(year, demographics)
+        return None if bits is None else popcount(bits)
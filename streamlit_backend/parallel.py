@@ -0,0 +1,173 @@
+"""
+Multi-core group-by sums over the patient table.
+Group keys are encoded as integer codes and copied, with the value columns, into shared memory once;
+each worker process reduces one partition (a range of rows or a set of states) to dense per-group
+counts and sums with `np.bincount`, and the parent adds the partial arrays together. Used by
+`aggregate_by_state`, `CountCube.from_frame` and the grouping step of `make_transactions` when they
+are given more than one worker.
+"""
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Below this many rows per worker, process start-up and copying cost more than they save
+MIN_ROWS_PER_WORKER = 250_000
+PARTITIONS = ('rows', 'state')
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool shared by every call with the same worker count."""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            _pools[workers] = pool
+        return pool
+
+
+@atexit.register
+def shutdown_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
+
+
+def encode_keys(df: pd.DataFrame, columns: Sequence[str]) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Integer codes (-1 for missing) and sorted levels for each key column.
+    Categorical columns reuse their codes; other columns are factorized.
+    """
+    codes, levels = [], []
+    for col in columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes.append(np.asarray(values.cat.codes))
+            levels.append(np.asarray(values.cat.categories))
+        else:
+            col_codes, uniques = pd.factorize(values, sort=True)
+            codes.append(col_codes)
+            levels.append(np.asarray(uniques))
+    return codes, levels
+
+
+def _reduce(codes: List[np.ndarray], shape: Tuple[int, ...], weights: List[np.ndarray],
+            rows: Optional[slice] = None, states: Optional[Tuple[int, np.ndarray]] = None):
+    """Dense per-group row counts and weight sums for a slice of rows (and optionally a set of states)."""
+    rows = rows if rows is not None else slice(None)
+    codes = [c[rows] for c in codes]
+    weights = [w[rows] for w in weights]
+    keep = np.logical_and.reduce([c >= 0 for c in codes])
+    if states is not None:
+        axis, wanted = states
+        keep &= np.isin(codes[axis], wanted)
+    flat = np.ravel_multi_index([c[keep] for c in codes], shape)
+    size = int(np.prod(shape))
+    counts = np.bincount(flat, minlength=size)
+    sums = [np.bincount(flat, weights=w[keep], minlength=size) for w in weights]
+    return counts, sums
+
+
+def _attach(spec):
+    shm = shared_memory.SharedMemory(name=spec[0])
+    return shm, np.ndarray(spec[2], dtype=spec[1], buffer=shm.buf)
+
+
+def _reduce_shared(task):
+    """Worker entry point: attach to the shared arrays and reduce one partition."""
+    code_specs, weight_specs, shape, rows, states = task
+    handles = [_attach(spec) for spec in list(code_specs) + list(weight_specs)]
+    blocks = [shm for shm, _ in handles]
+    arrays = [arr for _, arr in handles]
+    del handles
+    try:
+        return _reduce(arrays[:len(code_specs)], shape, arrays[len(code_specs):], rows, states)
+    finally:
+        # Views into the buffers must be gone before the blocks can be closed
+        del arrays
+        for shm in blocks:
+            shm.close()
+
+
+class _SharedArrays:
+    """Copy arrays into shared memory blocks for the lifetime of a `with` block."""
+
+    def __init__(self, arrays: Sequence[np.ndarray]):
+        self.arrays = arrays
+        self.blocks = []
+        self.specs = []
+
+    def __enter__(self):
+        for arr in self.arrays:
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            self.blocks.append(shm)
+            self.specs.append((shm.name, arr.dtype.str, arr.shape))
+        return self.specs
+
+    def __exit__(self, *exc):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+
+
+def grouped_sums(codes: List[np.ndarray], shape: Tuple[int, ...], weights: Sequence[np.ndarray] = (),
+                 workers: int = 1, partition: str = 'rows', state_axis: Optional[int] = None):
+    """Per-group row counts and weight sums over the dense key space `shape`.
+    Returns `(counts, [sums...])` as flat arrays of length prod(shape); rows with a missing key are skipped.
+    With `workers > 1` the rows are split into `workers` row ranges (or, with `partition='state'`, the
+    state codes on axis `state_axis` are split into `workers` groups) and reduced on a process pool.
+    """
+    if partition not in PARTITIONS:
+        raise ValueError(f"Unknown partition '{partition}'. Use one of {PARTITIONS}.")
+    if partition == 'state' and state_axis is None:
+        raise ValueError("partition='state' requires 'state' among the group keys")
+    weights = list(weights)
+    n = len(codes[0]) if codes else 0
+    if workers <= 1 or n < MIN_ROWS_PER_WORKER * 2:
+        counts, sums = _reduce(codes, shape, weights)
+        return counts, [s.round().astype(np.int64) for s in sums]
+
+    if partition == 'rows':
+        bounds = np.linspace(0, n, workers + 1).astype(int)
+        parts = [(slice(lo, hi), None) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+    else:
+        groups = np.array_split(np.arange(shape[state_axis]), workers)
+        parts = [(None, (state_axis, g)) for g in groups if len(g)]
+
+    with _SharedArrays(list(codes) + weights) as specs:
+        code_specs, weight_specs = specs[:len(codes)], specs[len(codes):]
+        tasks = [(code_specs, weight_specs, shape, rows, states) for rows, states in parts]
+        results = list(_get_pool(workers).map(_reduce_shared, tasks))
+
+    counts = np.sum([c for c, _ in results], axis=0)
+    sums = [np.sum([s[i] for _, s in results], axis=0).round().astype(np.int64) for i in range(len(weights))]
+    return counts, sums
+
+
+def aggregate_parallel(df: pd.DataFrame, disease: str, groupby: list = ['state', 'year'],
+                       workers: int = 1, partition: str = 'rows') -> pd.DataFrame:
+    """Same frame as `aggregate_by_state(df, disease, groupby)` (groupby..., cases, population, rate),
+    with the group-by sums computed by `grouped_sums` on `workers` processes.
+    """
+    codes, levels = encode_keys(df, groupby)
+    shape = tuple(len(lvl) for lvl in levels)
+    state_axis = list(groupby).index('state') if 'state' in groupby else None
+    counts, (cases,) = grouped_sums(codes, shape, [df[disease].to_numpy()], workers=workers,
+                                    partition=partition, state_axis=state_axis)
+
+    cells = np.nonzero(counts.reshape(shape) > 0)
+    flat = np.ravel_multi_index(cells, shape)
+    out = pd.DataFrame({col: levels[i][cells[i]] for i, col in enumerate(groupby)})
+    out['cases'] = cases[flat]
+    out['population'] = counts[flat].astype(np.int64)
+    out['rate'] = out['cases'] / out['population']
+    return out
@@ -2,77 +2,142 @@
 Pattern mining utilities using mlxtend (apriori) to discover associations between demographic attributes
 and disease presence at the aggregated level. The module exposes functions to transform patient-level
 rows into transaction-style data and run apriori + rule extraction.
+Frequent itemsets can be mined with mlxtend's apriori or FP-Growth, or with a bitset Apriori that
+counts support by popcount over packed transaction bits.
 """
+from itertools import combinations
+import numpy as np
 import pandas as pd
-from mlxtend.frequent_patterns import apriori, association_rules
-from typing import List, Tuple, Dict, Any
+from mlxtend.frequent_patterns import apriori, fpgrowth, association_rules
+from typing import List, Tuple, Dict, Any, Optional
 
 from streamlit_backend.data_loader import apply_rule_of_11
+from streamlit_backend.parallel import aggregate_parallel
 
 
-def make_transactions(df: pd.DataFrame, disease: str, groupby: List[str] = ['state','year','income_group', 'age_group', 'sex', 'race_ethnicity']) -> pd.DataFrame:
+def make_transactions(df: pd.DataFrame, disease: str, groupby: List[str] = ['state','year','income_group', 'age_group', 'sex', 'race_ethnicity'],
+                      workers: int = 1) -> pd.DataFrame:
     """Create a one-hot-encoded transaction table where each row corresponds to a grouped cell (e.g., state-year-income)
     and columns include demographic buckets and disease indicators (e.g., 'income=Low', 'age=65+', 'disease=diabetes').
-    This version incorporates the Rule of 11 for privacy.
+    This version incorporates the Rule of 11 for privacy. With `workers > 1` the grouping runs on a process pool.
     """
-    df = df.copy()
-
     # 1. Aggregate data to get counts for cases and population per group
     group_cols = [col for col in groupby if col in df.columns]
     if not group_cols:
         return pd.DataFrame() # Cannot create transactions without grouping
 
-    agg = df.groupby(group_cols).agg(
-        population=('patient_id', 'count'),
-        cases=(disease, 'sum')
-    ).reset_index()
+    if workers > 1:
+        agg = aggregate_parallel(df, disease, group_cols, workers=workers)
+    else:
+        agg = df.groupby(group_cols, observed=True).agg(
+            population=('patient_id', 'count'),
+            cases=(disease, 'sum')
+        ).reset_index()
 
     # 2. Apply the Rule of 11 to suppress small counts
-    agg_secure = apply_rule_of_11(agg, case_col='cases', pop_col='population')
+    agg_secure = apply_rule_of_11(agg, case_col='cases', pop_col='population', inplace=True)
 
     # 3. Filter out the suppressed groups to ensure privacy
-    safe_groups = agg_secure[agg_secure['suppressed'] == False].copy()
+    safe_groups = agg_secure[agg_secure['suppressed'] == False]
     if safe_groups.empty:
         return pd.DataFrame()
 
     # 4. Create transaction "items" from the safe, aggregated data
     # Each row in safe_groups is now a transaction.
     # The items are the demographic values and whether the disease is present.
-    items = []
-    for _, row in safe_groups.iterrows():
-        itemset = []
-        # Add demographic characteristics as items
-        for col in group_cols:
-            if col not in ['state', 'year']: # state/year are for grouping, not features
-                 itemset.append(f"{col}={row[col]}")
-        
-        # Add disease presence as an item.
-        # We consider the disease "present" for the group if cases > 0.
-        if row['cases'] > 0:
-            itemset.append(f"has_{disease}")
-        
-        items.append(itemset)
-
-    # 5. Convert the list of itemsets into a one-hot encoded DataFrame
-    if not items:
-        return pd.DataFrame()
+    # Each item column is built as one vectorized comparison over the group codes.
+    items = {}
+    for col in group_cols:
+        if col in ['state', 'year']: # state/year are for grouping, not features
+            continue
+        cat = pd.Categorical(safe_groups[col])
+        codes = np.asarray(cat.codes)
+        for code, value in enumerate(cat.categories):
+            items[f"{col}={value}"] = codes == code
 
-    all_items = sorted(list(set(it for itemset in items for it in itemset)))
-    
-    rows = []
-    for itemset in items:
-        presence = {item: (1 if item in itemset else 0) for item in all_items}
-        rows.append(presence)
-        
-    tx = pd.DataFrame(rows, columns=all_items)
+    # Add disease presence as an item.
+    # We consider the disease "present" for the group if cases > 0.
+    items[f"has_{disease}"] = (safe_groups['cases'] > 0).to_numpy()
+
+    # 5. Assemble the boolean one-hot DataFrame mlxtend expects, keeping only items that occur
+    all_items = sorted(item for item, present in items.items() if present.any())
+    tx = pd.DataFrame({item: items[item] for item in all_items}, columns=all_items)
     return tx
 
 
-def run_apriori(transactions: pd.DataFrame, min_support: float = 0.05, min_threshold: float = 0.6):
+def _popcount_rows(bits: np.ndarray) -> np.ndarray:
+    """Set-bit count of each row of a packed uint8 matrix."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bits).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(bits, axis=1).sum(axis=1, dtype=np.int64)
+
+
+def bitset_apriori(transactions: pd.DataFrame, min_support: float = 0.5, use_colnames: bool = False, max_len: Optional[int] = None) -> pd.DataFrame:
+    """Level-wise Apriori over packed transaction bits.
+    Each item is a packed bitmap over transactions; a candidate's support is the popcount of the AND of
+    its items' bitmaps, computed for a whole level at once. Returns the same `support`/`itemsets` frame as
+    `mlxtend.frequent_patterns.apriori`, so it can be fed to `association_rules`.
+    """
+    n_tx, n_items = transactions.shape
+    if n_tx == 0 or n_items == 0:
+        return pd.DataFrame(columns=['support', 'itemsets'])
+
+    item_bits = np.packbits(transactions.to_numpy(dtype=bool).T, axis=1)
+    support = _popcount_rows(item_bits) / n_tx
+
+    # Level 1: frequent single items
+    singles = np.flatnonzero(support >= min_support)
+    level = [(int(i),) for i in singles]
+    level_bits = item_bits[singles]
+    found = [(support[i], (int(i),)) for i in singles]
+
+    k = 1
+    while level and (max_len is None or k < max_len):
+        frequent = set(level)
+        # Join itemsets sharing a (k-1)-prefix, prune candidates with an infrequent k-subset
+        parents, extensions, candidates = [], [], []
+        for pos, itemset in enumerate(level):
+            for other in level[pos + 1:]:
+                if other[:-1] != itemset[:-1]:
+                    break
+                candidate = itemset + other[-1:]
+                if all(sub in frequent for sub in combinations(candidate, k)):
+                    parents.append(pos)
+                    extensions.append(other[-1])
+                    candidates.append(candidate)
+        if not candidates:
+            break
+
+        candidate_bits = level_bits[parents] & item_bits[extensions]
+        candidate_support = _popcount_rows(candidate_bits) / n_tx
+        keep = np.flatnonzero(candidate_support >= min_support)
+        level = [candidates[i] for i in keep]
+        level_bits = candidate_bits[keep]
+        found.extend((candidate_support[i], candidates[i]) for i in keep)
+        k += 1
+
+    names = list(transactions.columns) if use_colnames else list(range(n_items))
+    return pd.DataFrame({
+        'support': [float(sup) for sup, _ in found],
+        'itemsets': [frozenset(names[i] for i in itemset) for _, itemset in found],
+    })
+
+
+MINING_ALGORITHMS = {
+    'apriori': apriori,
+    'fpgrowth': fpgrowth,
+    'bitset': bitset_apriori,
+}
+
+
+def run_apriori(transactions: pd.DataFrame, min_support: float = 0.05, min_threshold: float = 0.6, algorithm: str = 'apriori'):
     """Run apriori and extract association rules. Returns frequent itemsets and rules DataFrames.
     `min_threshold` parameter maps to min_confidence for association_rules.
+    `algorithm` selects the frequent-itemset engine: 'apriori' (mlxtend), 'fpgrowth' (mlxtend) or 'bitset'.
     """
-    frequent_itemsets = apriori(transactions, min_support=min_support, use_colnames=True)
+    if algorithm not in MINING_ALGORITHMS:
+        raise ValueError(f"Unknown mining algorithm '{algorithm}'. Choose one of: {list(MINING_ALGORITHMS)}")
+    frequent_itemsets = MINING_ALGORITHMS[algorithm](transactions, min_support=min_support, use_colnames=True)
     if frequent_itemsets.empty:
         return frequent_itemsets, pd.DataFrame()
     rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_threshold)
@@ -6,66 +6,225 @@ answering when a model is available.
 """
 QA module implementing a transformer-based conversational interface for disparity queries.
 This version uses a pre-trained model from Hugging Face to perform question-answering.
+The model is loaded lazily on the first query, so importing this module stays cheap.
 """
+import os
+import gc
+import re
+import threading
+import time
+import numpy as np
 import pandas as pd
-from transformers import pipeline, AutoTokenizer, AutoModelForQuestionAnswering
-from typing import Optional
+from typing import List, Optional
 
-# Initialize the QA pipeline with a compact model suitable for an MVP
+# Compact model suitable for an MVP
 # Using a smaller, distilled model for faster inference and lower resource usage.
-MODEL_NAME = "distilbert-base-cased-distilled-squad"
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForQuestionAnswering.from_pretrained(MODEL_NAME)
-qa_pipeline = pipeline("question-answering", model=model, tokenizer=tokenizer)
+MODEL_NAME = os.getenv('QA_MODEL_NAME', "distilbert-base-cased-distilled-squad")
+# Release the model after this many idle seconds; 0 keeps it loaded once built
+IDLE_UNLOAD_SECONDS = float(os.getenv('QA_IDLE_UNLOAD_SECONDS', '0'))
 
-def answer_query(df: pd.DataFrame, query: str, default_year: Optional[int]=None) -> str:
-    """
-    Return a human-readable answer to disparity queries using the provided dataset
-    and a transformer-based question-answering model.
-    
-    This version expects a pre-aggregated and privacy-suppressed DataFrame.
+# The pipeline is built on first use (transformers/torch are not imported before then) and shared by
+# all threads. Callers keep their own reference, so unloading never interrupts an in-flight answer.
+_qa_pipeline = None
+_pipeline_lock = threading.Lock()
+_last_used = 0.0
+_idle_timer: Optional[threading.Timer] = None
+
+
+def _build_pipeline():
+    from transformers import pipeline, AutoTokenizer, AutoModelForQuestionAnswering
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModelForQuestionAnswering.from_pretrained(MODEL_NAME)
+    return pipeline("question-answering", model=model, tokenizer=tokenizer)
+
+
+def get_qa_pipeline():
+    """Return the shared question-answering pipeline, building it on first use."""
+    global _qa_pipeline, _last_used
+    _last_used = time.monotonic()
+    qa = _qa_pipeline
+    if qa is not None:
+        return qa
+    with _pipeline_lock:
+        if _qa_pipeline is None:
+            _qa_pipeline = _build_pipeline()
+            _schedule_idle_check(IDLE_UNLOAD_SECONDS)
+        return _qa_pipeline
+
+
+def warm_up() -> None:
+    """Build the pipeline ahead of the first query (e.g. from a startup hook)."""
+    get_qa_pipeline()
+
+
+def is_loaded() -> bool:
+    return _qa_pipeline is not None
+
+
+def unload() -> None:
+    """Drop the shared pipeline so its memory can be reclaimed; the next query rebuilds it."""
+    global _qa_pipeline, _idle_timer
+    with _pipeline_lock:
+        _qa_pipeline = None
+        if _idle_timer is not None:
+            _idle_timer.cancel()
+            _idle_timer = None
+    gc.collect()
+
+
+def _schedule_idle_check(delay: float) -> None:
+    # Caller holds _pipeline_lock
+    global _idle_timer
+    if IDLE_UNLOAD_SECONDS <= 0:
+        return
+    _idle_timer = threading.Timer(delay, _unload_if_idle)
+    _idle_timer.daemon = True
+    _idle_timer.start()
+
+
+def _unload_if_idle() -> None:
+    global _qa_pipeline, _idle_timer
+    with _pipeline_lock:
+        if _qa_pipeline is None:
+            return
+        idle = time.monotonic() - _last_used
+        if idle < IDLE_UNLOAD_SECONDS:
+            _schedule_idle_check(IDLE_UNLOAD_SECONDS - idle)
+            return
+        _qa_pipeline = None
+        _idle_timer = None
+    gc.collect()
+
+
+STATE_NAMES = {
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR', 'california': 'CA',
+    'colorado': 'CO', 'connecticut': 'CT', 'delaware': 'DE', 'florida': 'FL', 'georgia': 'GA',
+    'hawaii': 'HI', 'idaho': 'ID', 'illinois': 'IL', 'indiana': 'IN', 'iowa': 'IA',
+    'kansas': 'KS', 'kentucky': 'KY', 'louisiana': 'LA', 'maine': 'ME', 'maryland': 'MD',
+    'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN', 'mississippi': 'MS', 'missouri': 'MO',
+    'montana': 'MT', 'nebraska': 'NE', 'nevada': 'NV', 'new hampshire': 'NH', 'new jersey': 'NJ',
+    'new mexico': 'NM', 'new york': 'NY', 'north carolina': 'NC', 'north dakota': 'ND', 'ohio': 'OH',
+    'oklahoma': 'OK', 'oregon': 'OR', 'pennsylvania': 'PA', 'rhode island': 'RI', 'south carolina': 'SC',
+    'south dakota': 'SD', 'tennessee': 'TN', 'texas': 'TX', 'utah': 'UT', 'vermont': 'VT',
+    'virginia': 'VA', 'washington': 'WA', 'west virginia': 'WV', 'wisconsin': 'WI', 'wyoming': 'WY',
+}
+_STATE_NAME_RE = re.compile(r'\b(' + '|'.join(sorted(STATE_NAMES, key=len, reverse=True)) + r')\b', re.IGNORECASE)
+_STATE_CODE_RE = re.compile(r'\b([A-Z]{2})\b')
+_YEAR_RE = re.compile(r'\b((?:19|20)\d{2})\b')
+
+NOT_ENOUGH_DATA = "Sorry, there is not enough data to answer this query without violating privacy rules."
+
+
+def mentioned_filters(query: str, states=None):
+    """Return (states, years) named in the query. Two-letter codes only count if they are in `states`."""
+    found_states = {STATE_NAMES[m.lower()] for m in _STATE_NAME_RE.findall(query)}
+    if states is not None:
+        known = set(map(str, states))
+        found_states |= {code for code in _STATE_CODE_RE.findall(query) if code in known}
+    years = {int(y) for y in _YEAR_RE.findall(query)}
+    return found_states, years
+
+
+def build_context(df_safe: pd.DataFrame, query: Optional[str] = None, known_states=None) -> str:
+    """Describe each state-year row as one sentence, using vectorized string operations.
+    If `query` names states or years, only the matching rows are described, which keeps the context
+    inside the model's window; when none match (e.g. a state with no visible row) the context is empty,
+    so the answer never comes from other states' rows. Two-letter state codes are recognized among
+    `known_states` (default: the states of `df_safe`).
     """
-    # Filter out suppressed data before answering
-    df_safe = df[df['suppressed'] == False].copy()
+    if query and not df_safe.empty:
+        if known_states is None and 'state' in df_safe.columns:
+            known_states = df_safe['state'].unique()
+        states, years = mentioned_filters(query, known_states)
+        mask = np.ones(len(df_safe), dtype=bool)
+        if states and 'state' in df_safe.columns:
+            mask &= df_safe['state'].astype(str).isin(states).to_numpy()
+        if years and 'year' in df_safe.columns:
+            mask &= df_safe['year'].isin(years).to_numpy()
+        df_safe = df_safe[mask]
+
     if df_safe.empty:
-        return "Sorry, there is not enough data to answer this query without violating privacy rules."
+        return ""
 
-    # For the model to work, we need to convert our structured data (DataFrame)
-    # into a semi-structured text "context" that the model can read.
-    # We'll create a descriptive paragraph for each row in the DataFrame.
-    
-    context_lines = []
-    for _, row in df_safe.iterrows():
-        # Ensure all data is string and handle potential missing values
-        state = str(row.get('state', 'N/A'))
-        year = str(row.get('year', 'N/A'))
-        cases = f"{row.get('cases', 0):.0f}"
-        population = f"{row.get('population', 0):.0f}"
-        rate = f"{row.get('rate', 0):.3%}"
-        
-        context_lines.append(
-            f"In {state} during the year {year}, there were {cases} cases out of a population of {population}, resulting in a rate of {rate}."
-        )
-    
-    context = " ".join(context_lines)
+    def column(name, default):
+        if name in df_safe.columns:
+            return df_safe[name].to_numpy()
+        return np.full(len(df_safe), default)
+
+    # Ensure all data is string and handle potential missing values
+    state = column('state', 'N/A').astype(str)
+    year = column('year', 'N/A').astype(str)
+    cases = np.char.mod('%.0f', column('cases', 0).astype(float))
+    population = np.char.mod('%.0f', column('population', 0).astype(float))
+    rate = np.char.mod('%.3f%%', column('rate', 0).astype(float) * 100)
 
-    # If the context is too short or empty, we can't answer.
-    if len(context.strip()) < 20:
-        return "I could not find enough specific data to answer your question. Please try a broader query."
+    lines = pd.Series(state, dtype=object)
+    lines = ("In " + lines + " during the year " + year + ", there were " + cases
+             + " cases out of a population of " + population + ", resulting in a rate of " + rate + ".")
+    return " ".join(lines.tolist())
 
-    # Use the QA pipeline to find the answer within the generated context
-    result = qa_pipeline(question=query, context=context)
 
+def _format_answer(result: dict) -> str:
     # Format the answer for display
     answer = result['answer'].strip()
     confidence = result['score']
 
     if confidence < 0.1: # Low confidence threshold
         return f"I'm not very confident, but I believe the answer is: {answer}. (Confidence: {confidence:.2%})"
-    
+
     # Capitalize the first letter of the answer for better readability
     if answer:
         answer = answer[0].upper() + answer[1:]
 
     return f"{answer} (based on the available data with a confidence of {confidence:.2%})"
 
+
+def answer_queries(df: pd.DataFrame, queries: List[str], batch_size: int = 8, max_seq_len: int = 384) -> List[str]:
+    """
+    Answer many disparity queries against the same pre-aggregated, privacy-suppressed DataFrame.
+    Contexts are built per query (restricted to the states/years it mentions) and all answerable
+    queries go through the model in batches of `batch_size`, truncated to `max_seq_len` tokens per window.
+    """
+    # Filter out suppressed data before answering
+    df_safe = df[df['suppressed'] == False]
+    if df_safe.empty:
+        return [NOT_ENOUGH_DATA] * len(queries)
+
+    # Codes of suppressed states still count as mentions, so their questions are not answered from other rows
+    known_states = df['state'].unique() if 'state' in df.columns else None
+    answers: List[Optional[str]] = [None] * len(queries)
+    inputs, positions = [], []
+    for i, query in enumerate(queries):
+        # For the model to work, we need to convert our structured data (DataFrame)
+        # into a semi-structured text "context" that the model can read.
+        context = build_context(df_safe, query, known_states=known_states)
+        # No visible row matches the states/years the query names
+        if not context:
+            answers[i] = NOT_ENOUGH_DATA
+            continue
+        # If the context is too short, we can't answer.
+        if len(context.strip()) < 20:
+            answers[i] = "I could not find enough specific data to answer your question. Please try a broader query."
+            continue
+        inputs.append({'question': query, 'context': context})
+        positions.append(i)
+
+    if inputs:
+        # Use the QA pipeline to find the answers within the generated contexts
+        results = get_qa_pipeline()(inputs, batch_size=batch_size, max_seq_len=max_seq_len)
+        if isinstance(results, dict):
+            results = [results]
+        for i, result in zip(positions, results):
+            answers[i] = _format_answer(result)
+
+    return answers
+
+
+def answer_query(df: pd.DataFrame, query: str, default_year: Optional[int]=None) -> str:
+    """
+    Return a human-readable answer to disparity queries using the provided dataset
+    and a transformer-based question-answering model.
+    
+    This version expects a pre-aggregated and privacy-suppressed DataFrame.
+    """
+    return answer_queries(df, [query], batch_size=1)[0]
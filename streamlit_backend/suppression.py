@@ -0,0 +1,245 @@
+"""
+Complementary (secondary) suppression for aggregate tables.
+Primary suppression (`apply_rule_of_11`) hides small cells, but a hidden cell can still be recovered
+by subtracting the visible cells of any line of the table from that line's total: the national total
+for a year, a state's all-years total, the grand total, and so on. A line is only safe when it holds
+no suppressed cell or at least two of them. This module picks extra cells to hide until every line of
+every marginal is safe.
+
+Cells are indexed once per marginal (an integer line id per cell), so each pass is a handful of
+`np.bincount` calls over the table. The selection is greedy: a line with exactly one suppressed cell
+hides the visible cell that also fixes the most other unsafe lines, then the one with the fewest cases
+(then the smallest population), which keeps the number and the weight of extra cells small without
+solving an integer program.
+
+Protecting each response on its own is not enough when the API serves several breakdowns of the same
+counts: an unfiltered response minus its Female and Male responses recovers the cells hidden in the
+third. `CubeSuppression` therefore decides one pattern per dataset for the whole count cube, including
+the rollups over every demographic dimension, and each response is a slice of it.
+"""
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from streamlit_backend.cube import CountCube, CUBE_DIMENSIONS
+from streamlit_backend.data_loader import resolve_demographic_column, rule_of_11_mask, suppression_columns
+from streamlit_backend.parallel import encode_keys
+
+
+def default_margins(dims: Sequence[str]) -> List[tuple]:
+    """Every non-empty subset of `dims`: each one is a marginal total obtained by summing those dimensions
+    out (e.g. for ['state', 'year']: per-year totals, per-state totals and the grand total).
+    """
+    dims = list(dims)
+    return [subset for k in range(1, len(dims) + 1) for subset in combinations(dims, k)]
+
+
+def line_ids(codes: List[np.ndarray], dims: Sequence[str], margin: Sequence[str]) -> np.ndarray:
+    """Line of each cell for the marginal summing out `margin`: cells sharing the codes of every other
+    dimension add up to the same total.
+    """
+    keep = [i for i, d in enumerate(dims) if d not in margin]
+    if not keep:
+        return np.zeros(len(codes[0]) if codes else 0, dtype=np.int64)
+    # Missing keys (code -1) form a level of their own
+    kept = [codes[i] + 1 for i in keep]
+    shape = tuple(int(c.max()) + 1 if len(c) else 1 for c in kept)
+    return np.ravel_multi_index(kept, shape).astype(np.int64)
+
+
+def complementary_mask(lines: List[np.ndarray], primary, cost=None, tiebreak=None,
+                       max_passes: Optional[int] = None) -> np.ndarray:
+    """Suppression mask that leaves no line with exactly one suppressed cell.
+
+    `lines` holds one line-id array per marginal (see `line_ids`) and `primary` the cells already
+    suppressed. Extra cells are chosen greedily by the number of unsafe lines they fix, then lowest
+    `cost`, then lowest `tiebreak`. Lines of a single cell are ignored: their only cell is the total.
+    """
+    mask = np.array(primary, dtype=bool, copy=True)
+    n = len(mask)
+    if n == 0 or not mask.any() or not lines:
+        return mask
+    cost = np.zeros(n) if cost is None else np.nan_to_num(np.asarray(cost, dtype=np.float64))
+    tiebreak = np.zeros(n) if tiebreak is None else np.nan_to_num(np.asarray(tiebreak, dtype=np.float64))
+    sizes = [np.bincount(ids) for ids in lines]
+    # Suppressed cells per line, kept up to date as cells are added
+    counts = [np.bincount(ids, weights=mask, minlength=len(size)).astype(np.int64) for ids, size in zip(lines, sizes)]
+
+    passes = 0
+    while max_passes is None or passes < max_passes:
+        passes += 1
+        unsafe = [(count == 1) & (size >= 2) for count, size in zip(counts, sizes)]
+        if not any(u.any() for u in unsafe):
+            break
+        # How many unsafe lines (across every marginal) each cell would fix if hidden
+        benefit = np.zeros(n, dtype=np.int64)
+        for ids, u in zip(lines, unsafe):
+            benefit += u[ids]
+        for ids, count, size in zip(lines, counts, sizes):
+            need = (count == 1) & (size >= 2)
+            if not need.any():
+                continue
+            candidates = np.flatnonzero(~mask & need[ids])
+            order = np.lexsort((tiebreak[candidates], cost[candidates], -benefit[candidates], ids[candidates]))
+            ranked = candidates[order]
+            _, first = np.unique(ids[ranked], return_index=True)
+            added = ranked[first]
+            mask[added] = True
+            for other_ids, other_count in zip(lines, counts):
+                np.add.at(other_count, other_ids[added], 1)
+    return mask
+
+
+def apply_complementary_suppression(df: pd.DataFrame, dims: Sequence[str],
+                                    case_col: Union[str, List[str]] = 'cases', pop_col: str = 'population',
+                                    rate_col: Union[str, List[str], None] = None,
+                                    suppressed_col: Union[str, List[str], None] = None,
+                                    margins: Optional[Sequence[Sequence[str]]] = None,
+                                    inplace: bool = False) -> pd.DataFrame:
+    """Extend the primary suppression of an `apply_rule_of_11` frame so no hidden cell can be recovered
+    from the marginal totals over `dims`.
+
+    `margins` lists the dimension groups summed out by published totals (default: every non-empty
+    subset of `dims`). Column arguments and `inplace` behave as in `apply_rule_of_11`; each case column
+    is protected independently against its own suppressed column. Newly hidden cells get
+    `suppressed=True` and NaN rate and cases.
+    """
+    if not inplace:
+        df = df.copy(deep=False)
+    if df.empty:
+        return df
+    margins = default_margins(dims) if margins is None else [tuple(m) for m in margins]
+    codes, _ = encode_keys(df, dims)
+    lines = [line_ids(codes, dims, m) for m in margins]
+    population = df[pop_col].to_numpy(dtype=np.float64, na_value=np.nan) if pop_col in df.columns else None
+
+    for c, r, flag in suppression_columns(case_col, rate_col, suppressed_col):
+        primary = df[flag].to_numpy(dtype=bool)
+        cases = df[c].to_numpy(dtype=np.float64, na_value=np.nan)
+        _hide(df, c, r, flag, complementary_mask(lines, primary, cost=cases, tiebreak=population))
+    return df
+
+
+def _hide(df: pd.DataFrame, case_col: str, rate_col: str, suppressed_col: str, mask: np.ndarray) -> None:
+    """Mark the rows of `mask` suppressed (on top of those already flagged) and null their rate and cases."""
+    primary = df[suppressed_col].to_numpy(dtype=bool)
+    extra = mask & ~primary
+    if not extra.any():
+        return
+    cases = df[case_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    rate = df[rate_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    # Wrapped in a Series so pandas adopts the new arrays instead of copying them
+    df[suppressed_col] = pd.Series(primary | extra, index=df.index, copy=False)
+    df[rate_col] = pd.Series(np.where(extra, np.nan, rate), index=df.index, copy=False)
+    df[case_col] = pd.Series(np.where(extra, np.nan, cases), index=df.index, copy=False)
+
+
+def with_totals(arr: np.ndarray) -> np.ndarray:
+    """`arr` over (state, year, *demographic axes) with an extra last level on each demographic axis
+    holding the total over that axis (so the last position of every demographic axis is 'all').
+    """
+    for axis in range(2, arr.ndim):
+        arr = np.concatenate([arr, arr.sum(axis=axis, keepdims=True)], axis=axis)
+    return arr
+
+
+class CubeSuppression:
+    """Rule of 11 plus complementary suppression decided once over every slice of a count cube.
+
+    `axes` starts with state and year, followed by demographic axes. Each demographic axis gets an extra
+    'all' level (see `with_totals`), so the state x year table served for any combination of demographic
+    filters is one slice of a single extended table. Complements are chosen over that whole table: lines
+    along a demographic axis include its explicit 'all' cell, and lines along state, year and
+    state x year stand for the published totals over them. A hidden cell can then be recovered neither
+    from one response's totals nor by subtracting one response from another.
+    """
+
+    def __init__(self, axes: Sequence[str], levels: Dict[str, np.ndarray], population: np.ndarray,
+                 cases: Dict[str, np.ndarray], complementary: bool = True):
+        self.axes = list(axes)
+        self.levels = {dim: np.asarray(levels[dim]) for dim in self.axes}
+        self.population = with_totals(population)
+        self.cases = {disease: with_totals(counts) for disease, counts in cases.items()}
+
+        flat_population = self.population.ravel()
+        # Cells without patients are absent from every response, so they take no part in the lines
+        present = np.flatnonzero(flat_population > 0)
+        lines = None
+        if complementary:
+            codes = list(np.unravel_index(present, self.population.shape))
+            lines = [line_ids(codes, self.axes, margin) for margin in self.margins()]
+        self.masks = {}
+        for disease, counts in self.cases.items():
+            flat = counts.ravel()
+            hidden = rule_of_11_mask(flat, flat_population)
+            if lines is not None:
+                hidden[present] = complementary_mask(lines, hidden[present], cost=flat[present],
+                                                     tiebreak=flat_population[present])
+            self.masks[disease] = hidden.reshape(counts.shape)
+
+    @classmethod
+    def from_cube(cls, cube: CountCube, diseases: Optional[Sequence[str]] = None,
+                  complementary: bool = True) -> 'CubeSuppression':
+        diseases = list(cube.cases) if diseases is None else list(diseases)
+        return cls(CUBE_DIMENSIONS, cube.levels, cube.population, {d: cube.cases[d] for d in diseases},
+                   complementary=complementary)
+
+    def margins(self) -> List[tuple]:
+        """Marginals whose lines are protected: state, year and state x year, and each demographic axis."""
+        return default_margins(self.axes[:2]) + [(dim,) for dim in self.axes[2:]]
+
+    def slice_index(self, demographics: Optional[Dict[str, Any]] = None) -> Optional[tuple]:
+        """Position on each demographic axis of the slice `demographics` selects: the filtered level, or
+        'all' for an unfiltered axis. None when the filters match no level (the slice has no cells).
+        Raises ValueError for a filter key that is not a demographic axis.
+        """
+        dims = self.axes[2:]
+        index = {dim: len(self.levels[dim]) for dim in dims}
+        for k, v in (demographics or {}).items():
+            if v is None:
+                continue
+            dim = resolve_demographic_column(k, dims)
+            if dim not in index:
+                raise ValueError(f"Demographic filter key '{k}' is not a cube dimension. Allowed: {dims}")
+            match = np.flatnonzero(self.levels[dim] == v)
+            # No such level, or two filters asking for different levels of one axis
+            if len(match) == 0 or index[dim] not in (len(self.levels[dim]), match[0]):
+                return None
+            index[dim] = int(match[0])
+        return tuple(index[dim] for dim in dims)
+
+    def hidden(self, disease: str, states, years, demographics: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """Suppression flags of the (state, year) cells of the slice selected by `demographics`."""
+        if disease not in self.masks:
+            raise ValueError(f"Unknown disease '{disease}'. Available: {list(self.masks)}")
+        index = self.slice_index(demographics)
+        state_idx = pd.Index(self.levels['state']).get_indexer(states)
+        year_idx = pd.Index(self.levels['year']).get_indexer(years)
+        if index is None or (state_idx < 0).any() or (year_idx < 0).any():
+            # Cells the cube never counted cannot be vouched for
+            return np.ones(len(state_idx), dtype=bool)
+        return self.masks[disease][(state_idx, year_idx) + index]
+
+    def apply(self, df: pd.DataFrame, disease: Union[str, List[str]], demographics: Optional[Dict[str, Any]] = None,
+              case_col: Union[str, List[str], None] = None, rate_col: Union[str, List[str], None] = None,
+              suppressed_col: Union[str, List[str], None] = None, inplace: bool = False) -> pd.DataFrame:
+        """Extend the primary suppression of an `apply_rule_of_11` frame of state/year rows, answered for
+        `demographics`, to this pattern. `disease` may be a list, one per case column; case columns
+        default to `cases` for one disease and `<disease>_cases` for a list. Other column arguments and
+        `inplace` behave as in `apply_complementary_suppression`.
+        """
+        diseases = [disease] if isinstance(disease, str) else list(disease)
+        if case_col is None:
+            case_col = 'cases' if isinstance(disease, str) else [f'{d}_cases' for d in diseases]
+        if not inplace:
+            df = df.copy(deep=False)
+        if df.empty:
+            return df
+        columns = suppression_columns(case_col, rate_col, suppressed_col)
+        if len(columns) != len(diseases):
+            raise ValueError("disease and case_col must name the same number of diseases")
+        for d, (c, r, flag) in zip(diseases, columns):
+            _hide(df, c, r, flag, self.hidden(d, df['state'], df['year'], demographics))
+        return df
@@ -1,33 +1,210 @@
 """
 Utility helpers for formatting, suppression-aware summaries, and small helpers used by the Streamlit app.
+Disparity metrics for every (disease, year, demographic slice) are computed in one vectorized pass
+over the count cube by `disparity_table`; `slice_disparity` computes them the same way for any
+combination of filters, and `summary_disparity` and the API's insight summaries read from them.
 """
+import numpy as np
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Sequence, Union
+
+from streamlit_backend.cube import CountCube, CUBE_DIMENSIONS
+from streamlit_backend.data_loader import DISEASE_COLUMNS, rule_of_11_mask
+from streamlit_backend.suppression import CubeSuppression
+
+DISPARITY_DIMENSIONS = ['age_group', 'sex', 'race_ethnicity', 'income_group']
+# `dimension`/`value` of the rows covering every patient of a disease and year
+ALL_PATIENTS = 'all'
+
+
+def disparity_metrics(cases, population, visible) -> Dict[str, np.ndarray]:
+    """Disparity metrics across the units (e.g. states) on the last axis of `cases`/`population`.
+    Only `visible` (unsuppressed) units take part. Returns arrays over the leading axes:
+    units, cases, population, mean_rate (pooled), min_unit/max_unit (positions), min_rate, max_rate,
+    rate_ratio (max/min), disparity_index ((max - min) / max), gini and theil (population-weighted)
+    and between_group_variance (population-weighted variance of unit rates around the pooled rate).
+    Metrics are NaN where no unit is visible.
+    """
+    cases = np.asarray(cases, dtype=np.float64)
+    population = np.asarray(population, dtype=np.float64)
+    visible = np.broadcast_to(np.asarray(visible, dtype=bool), cases.shape)
+    c = np.where(visible, cases, 0.0)
+    p = np.where(visible, population, 0.0)
+    units = visible.sum(axis=-1)
+    total_cases = c.sum(axis=-1)
+    total_population = p.sum(axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = np.where(visible, cases / population, np.nan)
+        mean = total_cases / total_population
+        max_unit = np.where(visible, rate, -np.inf).argmax(axis=-1)
+        min_unit = np.where(visible, rate, np.inf).argmin(axis=-1)
+        max_rate = np.take_along_axis(rate, max_unit[..., None], axis=-1)[..., 0]
+        min_rate = np.take_along_axis(rate, min_unit[..., None], axis=-1)[..., 0]
+        rate_ratio = np.where(min_rate > 0, max_rate / min_rate, np.nan)
+        disparity_index = np.where(max_rate > 0, (max_rate - min_rate) / max_rate, 0.0)
+
+        weight = p / total_population[..., None]
+        filled = np.where(visible, rate, 0.0)
+        between = (weight * (filled - mean[..., None]) ** 2).sum(axis=-1)
+        # Hidden units have zero weight; a ratio of 1 keeps their log term finite
+        relative = np.where(visible & (filled > 0), filled / mean[..., None], 1.0)
+        theil = (weight * relative * np.log(relative)).sum(axis=-1)
+        spread = np.abs(filled[..., :, None] - filled[..., None, :])
+        gini = (weight[..., :, None] * weight[..., None, :] * spread).sum(axis=(-2, -1)) / (2 * mean)
+
+    empty = units == 0
+    out = {
+        'units': units, 'cases': total_cases, 'population': total_population, 'mean_rate': mean,
+        'min_unit': min_unit, 'min_rate': min_rate, 'max_unit': max_unit, 'max_rate': max_rate,
+        'rate_ratio': rate_ratio, 'disparity_index': disparity_index, 'gini': gini, 'theil': theil,
+        'between_group_variance': between,
+    }
+    for name in ('mean_rate', 'min_rate', 'max_rate', 'rate_ratio', 'disparity_index', 'gini', 'theil',
+                 'between_group_variance'):
+        out[name] = np.where(empty, np.nan, out[name])
+    return out
+
+
+def _slice_metrics(cases, population, hidden) -> Dict[str, np.ndarray]:
+    """`disparity_metrics` across the states of (..., state, year) counts, with `hidden` the per-year
+    suppression, for each year and then all years. The all-years column pools each state's counts over
+    every year and applies the Rule of 11 to the pooled counts. Returns arrays over (..., year + 1).
+    """
+    pooled_population = population.sum(axis=-1, keepdims=True)
+    pooled_cases = cases.sum(axis=-1, keepdims=True)
+    population = np.concatenate([population, pooled_population], axis=-1)
+    cases = np.concatenate([cases, pooled_cases], axis=-1)
+    hidden = np.concatenate([hidden, rule_of_11_mask(pooled_cases, pooled_population)], axis=-1)
+    # States last
+    return disparity_metrics(np.swapaxes(cases, -1, -2), np.swapaxes(population, -1, -2), ~np.swapaxes(hidden, -1, -2))
+
+
+def disparity_table(source: Union[pd.DataFrame, CountCube, CubeSuppression], diseases: Optional[Sequence[str]] = None,
+                    dimensions: Sequence[str] = DISPARITY_DIMENSIONS, complementary: bool = True) -> pd.DataFrame:
+    """Disparity across states for every disease, year and demographic slice, in one pass.
+
+    `source` is a patient-level frame, a `CountCube` built from one, or the `CubeSuppression` pattern
+    already decided over such a cube (`complementary` then has no effect). Each slice (every patient,
+    or one level of one of `dimensions`) is the state x year table `/filter` serves for that
+    demographic filter, hidden cells included: one slice of a `CubeSuppression` pattern, with
+    complementary suppression over every slice of the cube when `complementary=True`. Rows with a
+    missing `year` pool each state's counts over every year, with the Rule of 11 applied to the pooled
+    counts. Hidden state cells never contribute to a metric.
+
+    Returns one row per (disease, year, dimension, value) with the columns of `disparity_metrics`
+    (`states` being the number of visible states, `min_state`/`max_state` their names).
+    """
+    if isinstance(source, pd.DataFrame):
+        available = [d for d in DISEASE_COLUMNS if d in source.columns]
+    else:
+        available = list(source.masks if isinstance(source, CubeSuppression) else source.cases)
+    diseases = list(diseases) if diseases is not None else available
+    unknown = [d for d in diseases if d not in available]
+    if unknown:
+        raise ValueError(f"Unknown disease '{unknown[0]}'. Available: {available}")
+    unknown = [d for d in dimensions if d not in CUBE_DIMENSIONS[2:]]
+    if unknown:
+        raise ValueError(f"Cannot slice by {unknown}; demographic dimensions are {CUBE_DIMENSIONS[2:]}")
+    if isinstance(source, pd.DataFrame):
+        source = CountCube.from_frame(source, diseases)
+    if isinstance(source, CountCube):
+        source = CubeSuppression.from_cube(source, diseases, complementary=complementary)
+
+    levels = source.levels
+    states = np.asarray(levels['state'], dtype=object)
+    years = [int(y) for y in levels['year']]
+    # Position of each slice on the demographic axes; len(levels) is the 'all' level
+    every = {dim: len(levels[dim]) for dim in source.axes[2:]}
+    labels = [(ALL_PATIENTS, ALL_PATIENTS)] + [(dim, value) for dim in dimensions for value in levels[dim]]
+    cells = [tuple(every.values())] + [tuple({**every, dim: i}.values())
+                                       for dim in dimensions for i in range(len(levels[dim]))]
+
+    def slices(arr):
+        return np.stack([arr[(slice(None), slice(None)) + cell] for cell in cells])           # (slice, state, year)
+
+    population = slices(source.population).astype(np.float64)
+    cases = np.stack([slices(source.cases[d]) for d in diseases]).astype(np.float64)     # (disease, slice, state, year)
+    hidden = np.stack([slices(source.masks[d]) for d in diseases])
+
+    metrics = _slice_metrics(cases, population, hidden)                                  # (disease, slice, year)
+    shape = metrics['units'].shape
+    d_idx, s_idx, y_idx = (i.ravel() for i in np.indices(shape))
+    year_values = pd.array(years + [None], dtype='Int64')
+
+    out = pd.DataFrame({
+        'disease': np.asarray(diseases, dtype=object)[d_idx],
+        'year': year_values[y_idx],
+        'dimension': [labels[s][0] for s in s_idx],
+        'value': [labels[s][1] for s in s_idx],
+        'states': metrics['units'].ravel().astype(np.int64),
+        'cases': metrics['cases'].ravel().astype(np.int64),
+        'population': metrics['population'].ravel().astype(np.int64),
+        'mean_rate': metrics['mean_rate'].ravel(),
+        'min_state': np.where(metrics['units'] > 0, states[metrics['min_unit']], None).ravel(),
+        'min_rate': metrics['min_rate'].ravel(),
+        'max_state': np.where(metrics['units'] > 0, states[metrics['max_unit']], None).ravel(),
+        'max_rate': metrics['max_rate'].ravel(),
+    })
+    for name in ('rate_ratio', 'disparity_index', 'gini', 'theil', 'between_group_variance'):
+        out[name] = metrics[name].ravel()
+    return out
+
+
+def slice_disparity(suppression: CubeSuppression, disease: str, year: Optional[int] = None,
+                    demographics: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Disparity metrics of the slice any combination of demographic filters selects, as a dict with
+    the columns of a `disparity_table` row computed the same way (all years pooled per state when
+    `year` is None). None when the filters or the year select no cell of the cube.
+    Raises ValueError for an unknown disease or a filter key that is not a cube dimension.
+    """
+    if disease not in suppression.masks:
+        raise ValueError(f"Unknown disease '{disease}'. Available: {list(suppression.masks)}")
+    index = suppression.slice_index(demographics)
+    years = [int(y) for y in suppression.levels['year']]
+    if index is None or (year is not None and int(year) not in years):
+        return None
+    cell = (slice(None), slice(None)) + index
+    metrics = _slice_metrics(suppression.cases[disease][cell].astype(np.float64),
+                             suppression.population[cell].astype(np.float64), suppression.masks[disease][cell])
+    column = len(years) if year is None else years.index(int(year))
+    row = {name: values[column].item() for name, values in metrics.items()}
+    states = suppression.levels['state']
+    row['states'] = row.pop('units')
+    min_unit, max_unit = row.pop('min_unit'), row.pop('max_unit')
+    row['min_state'] = states[min_unit] if row['states'] else None
+    row['max_state'] = states[max_unit] if row['states'] else None
+    return row
+
+
+def disparity_row(table: pd.DataFrame, disease: str, year: Optional[int] = None,
+                  dimension: str = ALL_PATIENTS, value: Any = ALL_PATIENTS) -> Optional[pd.Series]:
+    """The row of a `disparity_table` for one disease, year (None: all years) and slice, or None."""
+    match = (table['disease'] == disease) & (table['dimension'] == dimension) & (table['value'] == value)
+    match &= table['year'].isna() if year is None else (table['year'] == int(year)).fillna(False)
+    rows = table[match]
+    return None if rows.empty else rows.iloc[0]
 
 
 def summary_disparity(df: pd.DataFrame, disease: str, year: int = None) -> Dict[str, Any]:
-    """Compute simple disparity metrics: min/max state rates and disparity index (pct difference).
-    Applies Rule of 11 suppression awareness: rows with NaN rates are ignored in min/max.
+    """Compute disparity metrics across states: min/max state rates, disparity index (pct difference),
+    rate ratio, Gini/Theil indexes and between-state variance. Suppressed states (Rule of 11 and
+    complementary, as served by `/filter` for all patients) are ignored; without a `year`, each state's
+    counts are pooled over every year.
     """
-    sub = df.copy()
-    if year:
-        sub = sub[sub['year']==year]
-    grp = sub.groupby('state')[[disease,'patient_id']].agg(cases=(disease,'sum'), population=('patient_id','count'))
-    grp['rate'] = grp['cases'] / grp['population']
-    grp = grp.dropna(subset=['rate'])
-    if grp.empty:
+    row = disparity_row(disparity_table(df, diseases=[disease], dimensions=[]), disease, year)
+    if row is None or row['states'] == 0:
         return {'message': 'No non-suppressed data available for the selected filters.'}
-    min_idx = grp['rate'].idxmin()
-    max_idx = grp['rate'].idxmax()
-    min_rate = grp.loc[min_idx, 'rate']
-    max_rate = grp.loc[max_idx, 'rate']
-    disparity_index = (max_rate - min_rate) / max_rate if max_rate > 0 else 0
     return {
-        'min_state': min_idx,
-        'min_rate': float(min_rate),
-        'max_state': max_idx,
-        'max_rate': float(max_rate),
-        'disparity_index': float(disparity_index)
+        'min_state': row['min_state'],
+        'min_rate': float(row['min_rate']),
+        'max_state': row['max_state'],
+        'max_rate': float(row['max_rate']),
+        'disparity_index': float(row['disparity_index']),
+        'rate_ratio': float(row['rate_ratio']),
+        'gini': float(row['gini']),
+        'theil': float(row['theil']),
+        'between_group_variance': float(row['between_group_variance']),
     }
 
 